@@ -0,0 +1,155 @@
+'''
+This file contains the golden-output checks of the benchmark suite:
+
+1. check_fast_paths(): fast paths must reproduce the reference implementations on the benchmark data (the batched
+   time-domain kernel against the per-window signal feature functions, the lookahead streaming filter against filtfilt).
+2. write_golden_outputs() / check_golden_outputs(): outputs of the full pipeline on a fixed synthetic recording are
+   stored in benchmarks/golden_outputs.json and every later run must reproduce them, so changes in results between
+   versions are caught. The tracked file was generated with the baseline pipeline, before any fast path was added.
+'''
+import json
+import numpy as np
+import pandas as pd
+from signal_preprocessing import preprocess
+from signal_preprocessing import streaming_filter
+from features import signal_features as sf
+from classifiers import constants
+from classifiers import gait_classifier
+from classifiers import resting_tremor_classifier
+from classifiers import resting_tremor_amplitude_classifier
+from classifiers import hand_movement_classifier
+from classifiers import hand_movement_features
+from benchmarks import synthetic_data
+
+GOLDEN_RECORDING = {'duration': 120.0, 'fs': 100.0, 'random_state': 0}
+
+def _check(name, reference, candidate, rtol, atol):
+    reference = np.asarray(reference, dtype=float)
+    candidate = np.asarray(candidate, dtype=float)
+    if reference.shape != candidate.shape:
+        return {'check': name, 'max_abs_error': np.nan, 'passed': False}
+    max_abs_error = np.nanmax(np.abs(reference - candidate)) if reference.size else 0.0
+    return {'check': name,
+            'max_abs_error': max_abs_error,
+            'passed': bool(np.allclose(reference, candidate, rtol=rtol, atol=atol, equal_nan=True))}
+
+def check_fast_paths(raw_accelerometer_data_df, fs, max_windows=200, streaming_tolerance=0.05):
+    '''
+    Compare fast paths against the reference implementations.
+
+    :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts','x','y','z']
+    :param fs: Sampling rate of raw accelerometer data (float)
+    :param max_windows: Number of 3 second windows used for the per-window comparisons
+    :param streaming_tolerance: Maximum relative RMS error of the lookahead streaming filter against filtfilt
+    :return: Pandas DataFrame with one row per check (max absolute error, passed)
+    '''
+    rows = []
+    channels = preprocess.band_pass_channel_labels(['x', 'y', 'z'], [0.25, 3.5])
+    filtered_df = preprocess.band_pass_filter(raw_accelerometer_data_df[['x', 'y', 'z']].copy(), fs, [0.25, 3.5], 4,
+                                              channels=['x', 'y', 'z'])[channels]
+    bounds = preprocess.window_bounds(filtered_df.shape[0], fs)[:max_windows]
+
+    reference = {'rms': [], 'range': [], 'range_count_per': [], 'magnitude_rms': [], 'magnitude_jerk_ratio': []}
+    for start, stop in bounds:
+        window_df = filtered_df.iloc[start:stop].reset_index(drop=True)
+        reference['rms'].append(sf.signal_rms(window_df, channels).values[0])
+        reference['range'].append(sf.signal_range(window_df, channels).values[0])
+        reference['range_count_per'].append(
+            sf.range_count_percentage(window_df, channels, min_value=-0.1, max_value=0.1).values[0])
+        magnitude_df = pd.DataFrame({'mag': np.sqrt((window_df[channels[0]] ** 2) + (window_df[channels[1]] ** 2) +
+                                                    (window_df[channels[2]] ** 2))})
+        reference['magnitude_rms'].append(np.sqrt(np.mean(np.square(magnitude_df.mag.tolist()))))
+        reference['magnitude_jerk_ratio'].append(sf.jerk_metric(magnitude_df, fs, ['mag']).mag_jerk_ratio.values[0])
+
+    candidate = dict((key, [None] * len(bounds)) for key in reference)
+    for window_indices, channel_windows in sf.stack_windows(filtered_df.values.T.copy(), bounds):
+        features = sf.batched_time_domain_features(channel_windows, fs, min_value=-0.1, max_value=0.1)
+        for idx, win in enumerate(window_indices):
+            for key in ['rms', 'range', 'range_count_per']:
+                candidate[key][win] = features[key][:, idx]
+            for key in ['magnitude_rms', 'magnitude_jerk_ratio']:
+                candidate[key][win] = features[key][idx]
+
+    for key in sorted(reference):
+        rows.append(_check('batched_time_domain_features.' + key, reference[key], candidate[key], rtol=1e-12,
+                           atol=0.0))
+
+    deviation = streaming_filter.compare_with_filtfilt(raw_accelerometer_data_df[['x', 'y', 'z']].values, fs,
+                                                       [3.5, 7.5], 3, mode='lookahead')
+    rows.append({'check': 'streaming_filter.lookahead_relative_rms_error',
+                 'max_abs_error': deviation['max_abs_error'],
+                 'passed': bool(deviation['relative_rms_error'] <= streaming_tolerance)})
+
+    return pd.DataFrame(rows, columns=['check', 'max_abs_error', 'passed'])
+
+def compute_pipeline_outputs(raw_accelerometer_data_df, fs):
+    '''
+    Compute the outputs of every module on a recording.
+
+    :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts','x','y','z']
+    :param fs: Sampling rate of raw accelerometer data (float)
+    :return: Dictionary of output name -> list of values
+    '''
+    outputs = {}
+
+    gait_features = gait_classifier.build_gait_classification_feature_set(raw_accelerometer_data_df.copy(), fs)
+    for feature in constants.GAIT_FEATURE_SELECTION:
+        outputs['gait.' + feature] = gait_features[feature].tolist()
+
+    tremor_features = resting_tremor_classifier.build_rest_tremor_classification_feature_set(
+        raw_accelerometer_data_df.copy(), fs)
+    for feature in constants.TREMOR_FEATURE_SELECTION:
+        outputs['tremor.' + feature] = tremor_features[feature].tolist()
+
+    outputs['tremor_amplitude'] = list(resting_tremor_amplitude_classifier.calculate_tremor_amplitude(
+        raw_accelerometer_data_df.copy(), fs))
+    outputs['hand_movement'] = list(hand_movement_classifier.detect_hand_movement(raw_accelerometer_data_df.copy(), fs))
+    amplitude, jerk = hand_movement_features.calculate_amplitude_and_smoothness_features(
+        raw_accelerometer_data_df.copy(), fs)
+    outputs['hand_movement_amplitude'] = list(amplitude)
+    outputs['hand_movement_jerk'] = list(jerk)
+
+    return dict((name, [None if np.isnan(value) else float(value) for value in values])
+                for name, values in outputs.items())
+
+def _golden_recording():
+    data_df, _ = synthetic_data.generate_wrist_accelerometer_data(GOLDEN_RECORDING['duration'],
+                                                                  GOLDEN_RECORDING['fs'],
+                                                                  random_state=GOLDEN_RECORDING['random_state'])
+    return data_df, GOLDEN_RECORDING['fs']
+
+def write_golden_outputs(filepath, generated_from):
+    '''
+    Store the pipeline outputs of the fixed golden recording.
+
+    :param filepath: Path of JSON file to write
+    :param generated_from: Description of the pipeline version the outputs were generated with (e.g. the commit),
+    stored with the outputs
+    '''
+    data_df, fs = _golden_recording()
+    with open(filepath, 'w') as golden_file:
+        json.dump({'generated_from': generated_from, 'recording': GOLDEN_RECORDING,
+                   'outputs': compute_pipeline_outputs(data_df, fs)}, golden_file, indent=1, sort_keys=True)
+
+def check_golden_outputs(filepath, rtol=1e-9, atol=1e-12):
+    '''
+    Compare the current pipeline outputs of the golden recording with the stored ones.
+
+    :param filepath: Path of JSON file written by write_golden_outputs()
+    :param rtol: Relative tolerance
+    :param atol: Absolute tolerance
+    :return: Pandas DataFrame with one row per output (max absolute error, passed)
+    '''
+    with open(filepath) as golden_file:
+        golden = json.load(golden_file)
+
+    data_df, fs = _golden_recording()
+    outputs = compute_pipeline_outputs(data_df, fs)
+
+    rows = []
+    for name in sorted(golden['outputs']):
+        reference = [np.nan if value is None else value for value in golden['outputs'][name]]
+        candidate = [np.nan if value is None else value for value in outputs.get(name, [])]
+        rows.append(_check('golden.' + name, reference, candidate, rtol=rtol, atol=atol))
+
+    return pd.DataFrame(rows, columns=['check', 'max_abs_error', 'passed'])
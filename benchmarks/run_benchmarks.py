@@ -0,0 +1,327 @@
+'''
+This file contains the benchmark suite. Every public stage of the pipeline is timed on synthetic wrist accelerometer
+data and samples/sec (and windows/sec for per-window stages) and memory are reported. Results are appended to a
+JSON lines history file and compared with the previous run of the same configuration to catch regressions. The
+golden-output checks (benchmarks/golden_outputs.py) verify that fast paths still match the reference and that the
+pipeline still reproduces benchmarks/golden_outputs.json. The history file is local to each machine and not tracked;
+the golden file is tracked and only rewritten with --update-golden.
+
+Example (10 minutes of data at 100 Hz):
+    python -m benchmarks.run_benchmarks --duration 600 --fs 100
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+import datetime
+import numpy as np
+import pandas as pd
+from signal_preprocessing import preprocess
+from signal_preprocessing import quality_gate
+from features import signal_features as sf
+from classifiers import gait_classifier
+from classifiers import resting_tremor_classifier
+from classifiers import resting_tremor_amplitude_classifier
+from classifiers import hand_movement_classifier
+from classifiers import hand_movement_features
+from endpoints import filter_classifier_predictions
+from endpoints import resting_tremor_endpoints
+from endpoints import bradykinesia_endpoints
+from benchmarks import synthetic_data
+from benchmarks import golden_outputs
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+DEFAULT_HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_history.jsonl')
+DEFAULT_GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden_outputs.json')
+
+# Memory measure of the 'memory_bytes' column: 'traced_peak' is the peak memory allocated during the stage
+# (tracemalloc, Python 3). Python 2 has no per-stage measure: 'process_max_rss' is the maximum resident set size of the
+# whole process so far, so every stage after the largest one reports the same value.
+MEMORY_METRIC = 'traced_peak' if tracemalloc is not None else 'process_max_rss'
+
+def _peak_memory(function):
+    if tracemalloc is None:
+        # Python 2: process lifetime maximum resident set size (kB on Linux), not a per-stage peak
+        import resource
+        function()
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def time_stage(name, function, n_samples, n_windows=None, repeat=1, measure_memory=True):
+    '''
+    Time one stage of the pipeline.
+
+    :param name: Name of stage
+    :param function: Callable without arguments running the stage
+    :param n_samples: Number of samples processed by one call
+    :param n_windows: Number of windows processed by one call (None for whole-signal stages)
+    :param repeat: Number of timed calls; the fastest is reported
+    :param measure_memory: Run one additional (untimed) call to measure memory (see MEMORY_METRIC)
+    :return: Dictionary of results
+    '''
+    timings = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        function()
+        timings.append(timeit.default_timer() - start)
+    seconds = min(timings)
+
+    return {'stage': name,
+            'seconds': seconds,
+            'samples': n_samples,
+            'samples_per_second': n_samples / seconds if seconds > 0 else np.nan,
+            'windows': n_windows,
+            'windows_per_second': n_windows / seconds if n_windows and seconds > 0 else None,
+            'memory_bytes': _peak_memory(function) if measure_memory else None,
+            'memory_metric': MEMORY_METRIC if measure_memory else None}
+
+def _window_frames(filtered_df, fs, max_windows):
+    bounds = preprocess.window_bounds(filtered_df.shape[0], fs)[:max_windows]
+    return [filtered_df.iloc[start:stop].reset_index(drop=True) for start, stop in bounds], bounds
+
+def _drop_na(values):
+    return [value for value in values if value != 'NA']
+
+def run_benchmarks(duration=600.0, fs=100.0, max_windows=200, repeat=1, measure_memory=True, random_state=0):
+    '''
+    Time every public stage on a synthetic recording.
+
+    :param duration: Duration (seconds) of synthetic recording
+    :param fs: Sampling rate of synthetic recording
+    :param max_windows: Number of 3 second windows used to time the per-window signal feature functions
+    :param repeat: Number of timed calls per stage; the fastest is reported
+    :param measure_memory: Measure memory of every stage (see MEMORY_METRIC)
+    :param random_state: Seed of synthetic recording
+    :return: Pandas DataFrame with one row per stage
+    '''
+    raw_df, _ = synthetic_data.generate_wrist_accelerometer_data(duration, fs, random_state=random_state)
+    n_samples = raw_df.shape[0]
+    n_windows = len(preprocess.window_bounds(n_samples, fs))
+
+    def run(name, function, samples=n_samples, windows=None):
+        results.append(time_stage(name, function, samples, n_windows=windows, repeat=repeat,
+                                  measure_memory=measure_memory))
+
+    results = []
+
+    # Pre-processing
+    run('preprocess.band_pass_filter',
+        lambda: preprocess.band_pass_filter(raw_df[['x', 'y', 'z']].copy(), fs, [0.25, 3.0], 1, channels=['x', 'y', 'z']))
+    gait_channels = preprocess.band_pass_channel_labels(['x', 'y', 'z'], [0.25, 3.0])
+    filtered_df = preprocess.band_pass_filter(raw_df[['x', 'y', 'z']].copy(), fs, [0.25, 3.0], 1,
+                                              channels=['x', 'y', 'z'])[gait_channels]
+    run('preprocess.get_principal_component',
+        lambda: preprocess.get_principal_component(filtered_df, channels=gait_channels))
+    run('quality_gate.assess_window_quality', lambda: quality_gate.assess_window_quality(raw_df, fs), windows=n_windows)
+    filtered_df = preprocess.get_principal_component(filtered_df, channels=gait_channels)
+
+    # Signal features (per window)
+    window_dfs, bounds = _window_frames(filtered_df, fs, max_windows)
+    window_samples = sum(stop - start for start, stop in bounds)
+    feature_channels = gait_channels + ['PC1']
+    pairs = [[gait_channels[0], gait_channels[1]], [gait_channels[0], gait_channels[2]],
+             [gait_channels[1], gait_channels[2]]]
+    feature_functions = [
+        ('signal_entropy', lambda df: sf.signal_entropy(df, feature_channels)),
+        ('correlation_coefficient', lambda df: sf.correlation_coefficient(df, pairs)),
+        ('signal_rms', lambda df: sf.signal_rms(df, feature_channels)),
+        ('signal_range', lambda df: sf.signal_range(df, feature_channels)),
+        ('iqr_of_autocovariance', lambda df: sf.iqr_of_autocovariance(df, feature_channels)),
+        ('dominant_frequency', lambda df: sf.dominant_frequency(df, fs, 12.0, feature_channels)),
+        ('mean_cross_rate', lambda df: sf.mean_cross_rate(df, feature_channels)),
+        ('range_count_percentage', lambda df: sf.range_count_percentage(df, feature_channels, -0.1, 0.1)),
+        ('jerk_metric', lambda df: sf.jerk_metric(df, fs, feature_channels))]
+    for name, function in feature_functions:
+        run('signal_features.' + name, lambda function=function: [function(df) for df in window_dfs],
+            samples=window_samples, windows=len(window_dfs))
+    channel_data = filtered_df[feature_channels].values.T.copy()
+    run('signal_features.batched_time_domain_features',
+        lambda: [sf.batched_time_domain_features(stack, fs) for _, stack in sf.stack_windows(channel_data, bounds)],
+        samples=window_samples, windows=len(window_dfs))
+
+    # Classifiers
+    run('gait_classifier.build_gait_classification_feature_set',
+        lambda: gait_classifier.build_gait_classification_feature_set(raw_df, fs), windows=n_windows)
+    run('resting_tremor_classifier.build_rest_tremor_classification_feature_set',
+        lambda: resting_tremor_classifier.build_rest_tremor_classification_feature_set(raw_df, fs), windows=n_windows)
+    run('resting_tremor_amplitude_classifier.calculate_tremor_amplitude',
+        lambda: resting_tremor_amplitude_classifier.calculate_tremor_amplitude(raw_df, fs), windows=n_windows)
+    run('hand_movement_classifier.detect_hand_movement',
+        lambda: hand_movement_classifier.detect_hand_movement(raw_df, fs), windows=n_windows)
+    run('hand_movement_features.calculate_amplitude_and_smoothness_features',
+        lambda: hand_movement_features.calculate_amplitude_and_smoothness_features(raw_df, fs), windows=n_windows)
+
+    # Prediction filtering and endpoints (gait and tremor predictions are random since no trained models are included)
+    hand_movement = hand_movement_classifier.detect_hand_movement(raw_df, fs)
+    tremor_amplitude = resting_tremor_amplitude_classifier.calculate_tremor_amplitude(raw_df, fs)
+    amplitude, jerk = hand_movement_features.calculate_amplitude_and_smoothness_features(raw_df, fs)
+    n_predictions = min(len(hand_movement), len(tremor_amplitude), len(amplitude))
+    prediction_random_state = np.random.RandomState(random_state)
+    predictions_df = pd.DataFrame({'hand_movement': hand_movement[:n_predictions],
+                                   'gait': prediction_random_state.randint(0, 2, n_predictions),
+                                   'tremor_constancy': prediction_random_state.randint(0, 2, n_predictions),
+                                   'tremor_amplitude': tremor_amplitude[:n_predictions],
+                                   'hand_movement_amplitude': amplitude[:n_predictions],
+                                   'hand_movement_jerk': jerk[:n_predictions]})
+    run('filter_classifier_predictions.filter_predictions_by_tree',
+        lambda: filter_classifier_predictions.filter_predictions_by_tree(predictions_df), windows=n_predictions)
+    filtered = filter_classifier_predictions.filter_predictions_by_tree(predictions_df)
+
+    tremor_predictions = filtered.tremor_classifier_predictions.tolist()
+    hand_movement_predictions = filtered.hand_movement_predictions.tolist()
+    endpoint_functions = [
+        ('resting_tremor_endpoints.compute_tremor_constancy',
+         lambda: resting_tremor_endpoints.compute_tremor_constancy(tremor_predictions)),
+        ('resting_tremor_endpoints.compute_aggregate_tremor_amplitude',
+         lambda: resting_tremor_endpoints.compute_aggregate_tremor_amplitude(
+             _drop_na(filtered.tremor_amplitude_predictions))),
+        ('bradykinesia_endpoints.compute_aggregate_hand_movement_amplitude',
+         lambda: bradykinesia_endpoints.compute_aggregate_hand_movement_amplitude(
+             _drop_na(filtered.hand_movement_amplitude))),
+        ('bradykinesia_endpoints.compute_aggregate_smoothness_of_hand_movement',
+         lambda: bradykinesia_endpoints.compute_aggregate_smoothness_of_hand_movement(
+             _drop_na(filtered.hand_movement_jerk))),
+        ('bradykinesia_endpoints.compute_aggregate_percentage_of_no_hand_movement',
+         lambda: bradykinesia_endpoints.compute_aggregate_percentage_of_no_hand_movement(hand_movement_predictions)),
+        ('bradykinesia_endpoints.compute_aggregate_length_of_no_hand_movement_bouts',
+         lambda: bradykinesia_endpoints.compute_aggregate_length_of_no_hand_movement_bouts(
+             _drop_na(hand_movement_predictions)))]
+    for name, function in endpoint_functions:
+        run(name, function, samples=n_samples, windows=n_predictions)
+
+    return pd.DataFrame(results, columns=['stage', 'seconds', 'samples', 'samples_per_second', 'windows',
+                                          'windows_per_second', 'memory_bytes', 'memory_metric'])
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _to_json(value):
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return None if np.isnan(value) else float(value)
+    return value
+
+def append_to_history(results, history_file, config):
+    '''
+    Append benchmark results to a JSON lines history file.
+
+    :param results: Pandas DataFrame returned by run_benchmarks()
+    :param history_file: Path of history file
+    :param config: Dictionary of benchmark configuration (duration, fs, ...)
+    :return: Dictionary written to history
+    '''
+    entry = {'timestamp': datetime.datetime.utcnow().isoformat(),
+             'git_commit': _git_commit(),
+             'python': platform.python_version(),
+             'numpy': np.__version__,
+             'pandas': pd.__version__,
+             'config': config,
+             'results': [dict((key, _to_json(value)) for key, value in row.items())
+                         for row in results.to_dict(orient='records')]}
+    with open(history_file, 'a') as history:
+        history.write(json.dumps(entry, sort_keys=True) + '\n')
+    return entry
+
+def load_history(history_file):
+    '''
+    :param history_file: Path of history file
+    :return: list of history entries (oldest first)
+    '''
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file) as history:
+        return [json.loads(line) for line in history if line.strip()]
+
+def compare_with_previous(results, history, config, tolerance=0.2):
+    '''
+    Compare throughput with the most recent history entry of the same configuration.
+
+    :param results: Pandas DataFrame returned by run_benchmarks()
+    :param history: list of history entries (see load_history)
+    :param config: Dictionary of benchmark configuration
+    :param tolerance: Allowed relative drop in samples/sec before a stage is flagged as a regression
+    :return: Pandas DataFrame with previous and current samples/sec, ratio and regression flag per stage (empty if no
+    previous run with the same configuration)
+    '''
+    previous = [entry for entry in history if entry.get('config') == config]
+    if not previous:
+        return pd.DataFrame(columns=['stage', 'previous_samples_per_second', 'samples_per_second', 'ratio',
+                                     'regression'])
+
+    previous_rates = dict((row['stage'], row['samples_per_second']) for row in previous[-1]['results'])
+    rows = []
+    for row in results.itertuples():
+        previous_rate = previous_rates.get(row.stage)
+        ratio = row.samples_per_second / previous_rate if previous_rate else np.nan
+        rows.append({'stage': row.stage,
+                     'previous_samples_per_second': previous_rate,
+                     'samples_per_second': row.samples_per_second,
+                     'ratio': ratio,
+                     'regression': bool(ratio < 1.0 - tolerance)})
+    return pd.DataFrame(rows, columns=['stage', 'previous_samples_per_second', 'samples_per_second', 'ratio',
+                                       'regression'])
+
+if __name__ == "__main__":
+    '''
+    Main runner for the benchmark suite.
+    '''
+    parser = argparse.ArgumentParser(description='Benchmark every stage of the pipeline on synthetic data.')
+    parser.add_argument('--duration', type=float, default=600.0, help='Duration of synthetic recording (seconds)')
+    parser.add_argument('--fs', type=float, default=100.0, help='Sampling rate of synthetic recording')
+    parser.add_argument('--max-windows', type=int, default=200, help='Windows used for per-window feature stages')
+    parser.add_argument('--repeat', type=int, default=1, help='Timed calls per stage (fastest is reported)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip memory measurement')
+    parser.add_argument('--history', default=DEFAULT_HISTORY_FILE, help='JSON lines history file')
+    parser.add_argument('--golden', default=DEFAULT_GOLDEN_FILE, help='Golden outputs file')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='Rewrite the golden outputs file (only after an intended change of results)')
+    parser.add_argument('--generated-from', default=None,
+                        help='Pipeline version stored with rewritten golden outputs (required with --update-golden)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative throughput drop')
+    args = parser.parse_args()
+
+    if not args.update_golden and not os.path.exists(args.golden):
+        parser.error('golden outputs file %s not found. It is tracked in the repository; pass --update-golden only '
+                     'to create a new reference on purpose' % args.golden)
+    if args.update_golden and not args.generated_from:
+        parser.error('--update-golden requires --generated-from describing the pipeline version (e.g. the commit)')
+
+    config = {'duration': args.duration, 'fs': args.fs, 'max_windows': args.max_windows}
+
+    results = run_benchmarks(duration=args.duration, fs=args.fs, max_windows=args.max_windows, repeat=args.repeat,
+                             measure_memory=not args.no_memory)
+    comparison = compare_with_previous(results, load_history(args.history), config, tolerance=args.tolerance)
+    append_to_history(results, args.history, config)
+
+    raw_df, _ = synthetic_data.generate_wrist_accelerometer_data(min(args.duration, 600.0), args.fs, random_state=0)
+    checks = golden_outputs.check_fast_paths(raw_df, args.fs)
+    if args.update_golden:
+        golden_outputs.write_golden_outputs(args.golden, args.generated_from)
+    checks = pd.concat([checks, golden_outputs.check_golden_outputs(args.golden)], ignore_index=True)
+
+    pd.set_option('display.width', 200)
+    print(results.to_string(index=False))
+    if not comparison.empty:
+        print(comparison.to_string(index=False))
+    print(checks.to_string(index=False))
+
+    if comparison['regression'].any() or not checks['passed'].all():
+        sys.exit(1)
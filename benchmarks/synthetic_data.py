@@ -0,0 +1,93 @@
+'''
+This file contains a generator of synthetic wrist accelerometer data (unit = G's) for benchmarking. The signal is a
+sequence of segments, each in one activity state:
+
+rest:           gravity plus sensor noise
+rest_tremor:    rest with a 4-6 Hz tremor oscillation of slowly varying amplitude and frequency
+gait:           arm swing at half the step frequency plus the ~2 Hz step impacts and their harmonic
+free_movement:  band-limited (0.25-3 Hz) random hand movement
+non_wear:       device lying still on a table (constant orientation, very low noise)
+
+The data is synthetic and only suitable for measuring speed and checking that fast paths reproduce reference outputs.
+'''
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+ACTIVITIES = ['rest', 'rest_tremor', 'gait', 'free_movement', 'non_wear']
+
+DEFAULT_ACTIVITY_WEIGHTS = {'rest': 0.3, 'rest_tremor': 0.25, 'gait': 0.2, 'free_movement': 0.25, 'non_wear': 0.0}
+
+def _random_orientation(random_state):
+    orientation = random_state.normal(size=3)
+    return orientation / np.linalg.norm(orientation)
+
+def _segment_signal(activity, n_samples, fs, random_state):
+    t = np.arange(n_samples) / float(fs)
+    gravity = _random_orientation(random_state)
+
+    if activity == 'non_wear':
+        return gravity + random_state.normal(scale=0.0005, size=(n_samples, 3))
+
+    data = gravity + random_state.normal(scale=0.005, size=(n_samples, 3))
+
+    if activity == 'rest_tremor':
+        frequency = random_state.uniform(4.0, 6.0) + 0.1 * np.sin(2 * np.pi * 0.05 * t)
+        amplitude = random_state.uniform(0.02, 0.2) * (1 + 0.3 * np.sin(2 * np.pi * random_state.uniform(0.02, 0.1) * t))
+        phase = 2 * np.pi * np.cumsum(frequency) / fs
+        data += np.outer(amplitude * np.sin(phase), _random_orientation(random_state))
+
+    elif activity == 'gait':
+        step_frequency = random_state.uniform(1.7, 2.2)
+        swing = random_state.uniform(0.1, 0.3) * np.sin(np.pi * step_frequency * t)
+        steps = random_state.uniform(0.1, 0.3) * (np.sin(2 * np.pi * step_frequency * t) +
+                                                  0.4 * np.sin(4 * np.pi * step_frequency * t))
+        data += np.outer(swing, _random_orientation(random_state)) + np.outer(steps, _random_orientation(random_state))
+
+    elif activity == 'free_movement':
+        sos = signal.butter(2, [0.25 * 2.0 / fs, 3.0 * 2.0 / fs], btype='bandpass', output='sos')
+        movement = signal.sosfilt(sos, random_state.normal(size=(n_samples, 3)), axis=0)
+        movement *= random_state.uniform(0.1, 0.3) / (np.std(movement) + 1e-12)
+        data += movement
+
+    return data
+
+def generate_wrist_accelerometer_data(duration, fs, segment_length=30.0, activity_weights=None, random_state=None,
+                                      dtype=np.float64):
+    '''
+    Generate synthetic raw wrist accelerometer data.
+
+    :param duration: Duration of recording in seconds (minutes to 14 days, i.e. 60 - 1209600)
+    :param fs: Sampling rate (float)
+    :param segment_length: Length (in seconds) of each activity segment
+    :param activity_weights: Dictionary of activity -> probability of a segment being that activity
+    (default DEFAULT_ACTIVITY_WEIGHTS)
+    :param random_state: Seed (int) or numpy RandomState for reproducible data
+    :param dtype: dtype of the x, y, z channels
+    :return: Pandas DataFrame with columns ['ts','x','y','z'] (ts in seconds from start), Pandas DataFrame of segments
+    with columns ['start_sample', 'stop_sample', 'activity']
+    '''
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+    if activity_weights is None:
+        activity_weights = DEFAULT_ACTIVITY_WEIGHTS
+
+    total_samples = int(round(duration * fs))
+    segment_samples = int(round(segment_length * fs))
+
+    activities = [activity for activity in ACTIVITIES if activity_weights.get(activity, 0) > 0]
+    probabilities = np.array([activity_weights[activity] for activity in activities], dtype=float)
+    probabilities /= probabilities.sum()
+
+    data = np.empty((total_samples, 3), dtype=dtype)
+    segments = []
+    for start in range(0, total_samples, segment_samples):
+        stop = min(start + segment_samples, total_samples)
+        activity = activities[random_state.choice(len(activities), p=probabilities)]
+        data[start:stop] = _segment_signal(activity, stop - start, fs, random_state)
+        segments.append((start, stop, activity))
+
+    data_df = pd.DataFrame(data, columns=['x', 'y', 'z'])
+    data_df.insert(0, 'ts', np.arange(total_samples) / float(fs))
+
+    return data_df, pd.DataFrame(segments, columns=['start_sample', 'stop_sample', 'activity'])
@@ -4,18 +4,28 @@ Users will have to provide their own data and ground truths to train the model.
 from wearable sensor on wrist location.
 '''
 
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from signal_preprocessing import preprocess
+from signal_preprocessing import channel_store
+from signal_preprocessing import quality_gate
 from features import signal_features as sf
+from features import sliding_window_features
 import constants
+from instrumentation import profiler
 
-def extract_gait_classification_features(window_data_df, channels, fs):
+@profiler.instrument('gait_classifier.extract_gait_classification_features')
+def extract_gait_classification_features(window_data_df, channels, fs, time_domain_df=None):
     '''
     Extract signal features applicable for gait classification for a given 3 second window of raw accelerometer data.
 
     :param window_data_df: Pandas DataFrame with columns ['ts','x','y','z']
     :param channels: Desired channels to run features on (Ex: ['x','y','z'])
     :param fs: Sampling rate of raw accelerometer data (Float)
+    :param time_domain_df: Optional one-row Pandas DataFrame of this window's RMS, range and range count percentage
+    (columns of signal_features.batched_time_domain_feature_set(), range count between -0.1 and 0.1). These features
+    are computed from the window if not given.
     :return: DataFrame of calculated features on 3 second windows for given raw data
     '''
     features = pd.DataFrame()
@@ -28,11 +38,20 @@ def extract_gait_classification_features(window_data_df, channels, fs):
                                                                     ['x_bp_filt_[0.25, 3.0]', 'z_bp_filt_[0.25, 3.0]'],
                                                                     ['y_bp_filt_[0.25, 3.0]', 'z_bp_filt_[0.25, 3.0]']])
 
-    # Compute RMS
-    feat_df_signal_rms = sf.signal_rms(window_data_df, channels)
+    if time_domain_df is None:
+        # Compute RMS
+        feat_df_signal_rms = sf.signal_rms(window_data_df, channels)
 
-    # Compute range
-    feat_df_signal_range = sf.signal_range(window_data_df, channels)
+        # Compute range
+        feat_df_signal_range = sf.signal_range(window_data_df, channels)
+
+        # Compute range count percentage
+        feat_df_range_count_percentage = sf.range_count_percentage(window_data_df, channels, min_value=-0.1,
+                                                                   max_value=0.1)
+    else:
+        feat_df_signal_rms = time_domain_df[[channel + '_rms' for channel in channels]]
+        feat_df_signal_range = time_domain_df[[channel + '_range' for channel in channels]]
+        feat_df_range_count_percentage = time_domain_df[[channel + '_range_count_per' for channel in channels]]
 
     # Compute IQR of Autocovariance
     feat_df_iqr_auto = sf.iqr_of_autocovariance(window_data_df, channels)
@@ -45,9 +64,6 @@ def extract_gait_classification_features(window_data_df, channels, fs):
     # Compute mean cross rate
     feat_df_mean_cross_rate = sf.mean_cross_rate(window_data_df, channels)
 
-    # Compute range count percentage
-    feat_df_range_count_percentage = sf.range_count_percentage(window_data_df, channels, min_value=-0.1, max_value=0.1)
-
     features = features.join(feat_df_signal_entropy, how='outer')
     features = features.join(feat_df_corr_coef, how='outer')
     features = features.join(feat_df_signal_rms, how='outer')
@@ -59,56 +75,123 @@ def extract_gait_classification_features(window_data_df, channels, fs):
 
     return features
 
-def build_gait_classification_feature_set(raw_accelerometer_data_df, fs):
+@profiler.instrument('gait_classifier.build_gait_classification_feature_set')
+def build_gait_classification_feature_set(raw_accelerometer_data_df, fs, multirate=False, min_sampling_rate=25.0,
+                                          memory_limit_bytes=None, excluded_windows=None, hop=None):
     '''
-    Pre-process raw accelerometer data and compute signal based features on data.
+    Pre-process raw accelerometer data and compute signal based features on data. Signal channels are held in a
+    ChannelStore and freed as soon as no later stage needs them; raw_accelerometer_data_df is not modified.
 
     :param raw_accelerometer_data_df: Raw accelerometer data in a Pandas DataFrame wth columns = ['ts','x','y','z']
     :param fs: Sampling rate of raw accelerometer data (Float)
-    :return: Pandas DataFrame of calculated features for given raw accelerometer data
+    :param multirate: If True, decimate the 0.25-3 Hz band-passed signal to at least min_sampling_rate (with an
+    anti-aliasing filter, see preprocess.decimate_array) before PCA and windowing. Some features are rate dependent (see validation/multirate_equivalence.py), so a model must be trained
+    and run in the same mode.
+    :param min_sampling_rate: Lowest sampling rate used in multirate mode. Keep above 24 Hz so the 12 Hz dominant
+    frequency cutoff stays below the Nyquist frequency.
+    :param memory_limit_bytes: Maximum number of bytes of signal channels held at once (None = no limit). A MemoryError
+    is raised if a stage would exceed it.
+    :param excluded_windows: Boolean array-like indexed by window number of windows to skip (Ex:
+    quality_gate.assess_window_quality(raw_accelerometer_data_df, fs).excluded.values)
+    :param hop: If given, compute the selected features (constants.GAIT_FEATURE_SELECTION) of overlapping 3 second
+    windows started every hop seconds instead of all features of non-overlapping windows (see
+    features/sliding_window_features.py). Windows overlapping an excluded window are left out.
+    :return: Pandas DataFrame of calculated features for given raw accelerometer data, indexed by window number
+    (excluded windows and windows with NaN features are left out). With a hop, indexed by sliding window number with
+    the extra columns 'start', 'stop' and 'time'.
     '''
-    # Initialize final DataFrame
-    final_feature_cache = pd.DataFrame()
-
-    # Pre-process data
-    # Bandpass filter between 0.25-3hz
-    filtered_data_df = preprocess.band_pass_filter(raw_accelerometer_data_df, fs, [0.25, 3.0], 1,
-                                                             channels=['x', 'y', 'z'])
-    bp_headers = ['x_bp_filt_[0.25, 3.0]', 'y_bp_filt_[0.25, 3.0]', 'z_bp_filt_[0.25, 3.0]']
-
-    # Perform PCA get 1st principal component for [0.25 - 3] bandpass filtered data
-    filtered_data_df = preprocess.get_principal_component(filtered_data_df, channels=bp_headers)
-    filtered_data_df.rename(columns={'PC1': 'PC1_[0.25, 3.0]'}, inplace=True)
+    raw_headers = ['x', 'y', 'z']
+    bp_headers = preprocess.band_pass_channel_labels(raw_headers, [0.25, 3.0])
     pca_headers = ['PC1_[0.25, 3.0]']
 
     total_data_channels = bp_headers + pca_headers
 
-    # Segment into 3 second windows
-    total_samples = filtered_data_df.shape[0]
-    window_samples = fs * 3.0
-    total_windows = round(total_samples / float(window_samples))
-
-    for win in range(int(total_windows)):
-        # Isolate data into windows
-        current_win_start = int(window_samples * win + 1)
-        current_win_end = int(current_win_start + window_samples - 1)
-        if current_win_end > filtered_data_df.shape[0]:
-            window_data_df = filtered_data_df.loc[current_win_start:, :]
-        else:
-            window_data_df = filtered_data_df.loc[current_win_start:current_win_end, :]
-        window_data_df.reset_index(drop=True, inplace=True)
+    q = preprocess.decimation_factor(fs, min_sampling_rate) if multirate else 1
+    window_fs = fs / float(q) if multirate else fs
+
+    def band_pass(*axes):
+        # Bandpass filter between 0.25-3hz
+        return [preprocess.band_pass_filter_array(axis, fs, [0.25, 3.0], 1) for axis in axes]
+
+    def decimate(*axes):
+        # The first order band-pass leaves content above the decimated Nyquist frequency: anti-alias before slicing
+        return [preprocess.decimate_array(axis, q) for axis in axes]
+
+    def first_principal_component(*axes):
+        return preprocess.principal_component_array(np.column_stack(axes))[:, 0]
+
+    def window_features(*channels):
+        # Initialize final DataFrame
+        final_feature_cache = pd.DataFrame()
+        windows_skipped = 0
+
+        # Segment into 3 second windows
+        bounds = preprocess.window_bounds(len(channels[0]), window_fs)
+        excluded = quality_gate.excluded_window_mask(excluded_windows, len(bounds))
+
+        # RMS, range and range count of all included windows at once (fused kernel on bounded stacks gathered from
+        # the channels)
+        included_windows = np.where(~excluded)[0]
+        time_domain_df = sf.batched_time_domain_feature_set(channels, total_data_channels,
+                                                            [bounds[win] for win in included_windows], window_fs,
+                                                            min_value=-0.1, max_value=0.1)
+        time_domain_df.index = included_windows[time_domain_df.index.values.astype(int)]
+
+        for win, (current_win_start, current_win_stop) in enumerate(bounds):
+            # Skip windows flagged by the quality gate
+            if excluded[win]:
+                windows_skipped += 1
+                continue
+
+            # Isolate data into windows
+            window_data_df = pd.DataFrame(OrderedDict((name, values[current_win_start:current_win_stop])
+                                                      for name, values in zip(total_data_channels, channels)))
+
+            # Extract Bradykinesia Features
+            window_time_domain_df = None
+            if win in time_domain_df.index:
+                window_time_domain_df = time_domain_df.loc[[win]].reset_index(drop=True)
+            features_df = extract_gait_classification_features(window_data_df, total_data_channels, window_fs,
+                                                               time_domain_df=window_time_domain_df)
+
+            # Discard window if NaN's in feature matrix
+            if features_df.isnull().values.any():
+                windows_skipped += 1
+                continue
+
+            # Aggregate features for each window
+            features_df.index = [win]
+            final_feature_cache = final_feature_cache.append(features_df)
+
+        profiler.record_windows('gait_classifier.build_gait_classification_feature_set',
+                                processed=final_feature_cache.shape[0], skipped=windows_skipped)
+        return final_feature_cache
+
+    def sliding_features(*channels):
+        # Channel arrays are passed through (no full-recording copy outside the store)
+        features_df = sliding_window_features.compute_sliding_classification_features(
+            OrderedDict(zip(total_data_channels, channels)), window_fs, constants.GAIT_FEATURE_SELECTION, hop=hop, excluded_windows=excluded_windows)
+
+        # Discard windows with NaN's in feature matrix
+        complete = features_df[constants.GAIT_FEATURE_SELECTION].notnull().all(axis=1)
+        profiler.record_windows('gait_classifier.build_gait_classification_feature_set',
+                                processed=int(complete.sum()), skipped=int((~complete).sum()))
+        return features_df[complete]
 
-        # Extract Bradykinesia Features
-        features_df = extract_gait_classification_features(window_data_df, total_data_channels, fs)
-
-        # Discard window if NaN's in feature matrix
-        if features_df.isnull().values.any():
-            continue
-
-        # Aggregate features for each window
-        final_feature_cache = final_feature_cache.append(features_df, ignore_index=True)
-
-    return final_feature_cache
+    # Pre-process data
+    stages = [channel_store.Stage('band_pass_[0.25, 3.0]', raw_headers, bp_headers, band_pass)]
+    if multirate:
+        stages.append(channel_store.Stage('decimate', bp_headers, bp_headers, decimate))
+    stages += [
+        # Perform PCA get 1st principal component for [0.25 - 3] bandpass filtered data
+        channel_store.Stage('pca_[0.25, 3.0]', bp_headers, pca_headers, first_principal_component),
+        channel_store.Stage('window_features', total_data_channels, [],
+                            window_features if hop is None else sliding_features)]
+
+    store = channel_store.ChannelStore.from_dataframe(raw_accelerometer_data_df, raw_headers,
+                                                      memory_limit_bytes=memory_limit_bytes)
+
+    return channel_store.run_stages(store, stages)['window_features']
 
 def initialize_model():
     '''
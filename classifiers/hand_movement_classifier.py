@@ -6,7 +6,12 @@ device located on the wrist.
 import pandas as pd
 import numpy as np
 from scipy import signal
+from signal_preprocessing import preprocess
+from features import backends
+from signal_preprocessing import quality_gate
+from instrumentation import profiler
 
+@profiler.instrument('hand_movement_classifier.compute_rolling_mean')
 def compute_rolling_mean(x, window_length):
     '''
     Method to compute rolling mean.
@@ -18,17 +23,10 @@ def compute_rolling_mean(x, window_length):
         print "Window length should be an odd number."
         return
 
-    y = np.zeros(len(x))
-    for i in range(len(x)):
-        if i < window_length/2:
-            y[i] = np.mean(x[0:i + window_length / 2])
-        elif len(x) - i < window_length / 2:
-            y[i] = np.mean(x[i - window_length / 2:])
-        else:
-            y[i] = np.mean(x[i - window_length / 2: i + window_length / 2])
-
-    return y
+    # Sample i averages x[max(i - window_length/2, 0):min(i + window_length/2, len(x))] (see features/backends.py)
+    return backends.get_backend().rolling_mean(x, window_length)
 
+@profiler.instrument('hand_movement_classifier.compute_rolling_std')
 def compute_rolling_std(x, window_length):
     '''
     Method to compute rolling standard deviation.
@@ -40,66 +38,133 @@ def compute_rolling_std(x, window_length):
         print "Window length should be an odd number."
         return
 
-    y = np.zeros(len(x))
-    for i in range(len(x)):
-        if i < window_length/2:
-            y[i] = np.std(x[0:i + window_length / 2])
-        elif len(x) - i < window_length / 2:
-            y[i] = np.std(x[i - window_length / 2:])
-        else:
-            y[i] = np.std(x[i - window_length / 2: i + window_length / 2])
-
-    return y
+    # Same windows as compute_rolling_mean
+    return backends.get_backend().rolling_std(x, window_length)
 
-def detect_hand_movement(raw_accelerometer_data_df, fs, window_length=3, threshold=0.01):
+@profiler.instrument('hand_movement_classifier.compute_rolling_cov')
+def compute_rolling_cov(raw_accelerometer_data_df, fs, multirate=False, min_sampling_rate=10.0):
     '''
-    Method for detecting hand movement from raw accelerometer data.
+    Rolling coefficient of variation of the low-pass filtered accelerometer vector magnitude (the signal thresholded by
+    detect_hand_movement).
     :param raw_accelerometer_data_df: Pandas DataFrame with accelerometer axis represented as x, y and z columns
     :param fs: Sampling rate (samples/second) of the accelerometer data
-    :param window_length: Length (in seconds) of the non-overlapping window for hand movement classification
-    :param threshold: Threshold value that is applied to the coefficient of variation to detect hand movement
-    :return: Detected hand movement as numpy array in desired window length
+    :param multirate: If True, decimate the 3 Hz low-passed vector magnitude to at least min_sampling_rate before
+    computing the rolling coefficient of variation (see validation/multirate_equivalence.py for tolerances)
+    :param min_sampling_rate: Lowest sampling rate used in multirate mode
+    :return: Rolling coefficient of variation (numpy array), sampling rate of the rolling coefficient of variation
     '''
     # Calculate the vector magnitude of the accelerometer signal
     accelerometer_vector_magnitude = np.sqrt((raw_accelerometer_data_df.x**2 + raw_accelerometer_data_df.y**2 + raw_accelerometer_data_df.z**2))
 
     # Low-pass filter the accelerometer vector magnitude signal to remove high frequency components
     low_pass_cutoff = 3 # cutoff frequency for the lowpass filter
-    wn = [low_pass_cutoff * 2 / fs]
-    [b, a] = signal.iirfilter(6, wn, btype='lowpass', ftype = 'butter')
-    accelerometer_vector_magnitude_filt = signal.filtfilt(b, a, accelerometer_vector_magnitude)
+    if accelerometer_vector_magnitude.dtype == np.float32:
+        # Single precision: second-order sections (see preprocess.band_pass_filter_array) with the default padding of
+        # filtfilt for this filter (3 * (2 * sections + 1) = 3 * max(len(a), len(b)))
+        sos = preprocess.design_butter_sos(fs, low_pass_cutoff, 6, btype='lowpass')
+        accelerometer_vector_magnitude_filt = preprocess.sosfiltfilt_float32(sos, accelerometer_vector_magnitude.values,
+                                                                             padlen=3 * (2 * len(sos) + 1))
+    else:
+        [b, a] = preprocess.design_butter_ba(fs, low_pass_cutoff, 6, btype='lowpass')
+        accelerometer_vector_magnitude_filt = signal.filtfilt(b, a, accelerometer_vector_magnitude)
+    rolling_window_length = int(fs+1)
+
+    # Multi-rate mode: the signal is band-limited to 3 Hz, so the rolling statistics can run at a lower rate
+    if multirate:
+        q = preprocess.decimation_factor(fs, min_sampling_rate)
+        accelerometer_vector_magnitude_filt = accelerometer_vector_magnitude_filt[::q]
+        fs = fs / float(q)
+        rolling_window_length = int(fs+1)
+        if rolling_window_length % 2 == 0:
+            rolling_window_length += 1
 
     # Calculate the rolling coefficient of variation
-    rolling_mean = compute_rolling_mean(accelerometer_vector_magnitude_filt, int(fs+1))
-    rolling_std = compute_rolling_std(accelerometer_vector_magnitude_filt, int(fs+1))
+    rolling_mean = compute_rolling_mean(accelerometer_vector_magnitude_filt, rolling_window_length)
+    rolling_std = compute_rolling_std(accelerometer_vector_magnitude_filt, rolling_window_length)
     rolling_cov = rolling_std/rolling_mean
 
-    # Detect CoV values about given movement threshold
-    values_above_threshold = (rolling_cov > threshold)*1
+    return rolling_cov, fs
 
-    # Classify non-overlapping windows as either hand movement or no hand movement
+def hand_movement_window_bounds(total_samples, fs, window_length=3):
+    '''
+    Positional bounds of the non-overlapping hand movement classification windows.
+    :param total_samples: Number of samples of the rolling coefficient of variation
+    :param fs: Sampling rate of the rolling coefficient of variation
+    :param window_length: Length (in seconds) of the non-overlapping window for hand movement classification
+    :return: list of (start, stop) positions; window i covers samples start:stop
+    '''
     samples_in_window = window_length * fs
 
-    if len(rolling_cov) / samples_in_window > np.floor(len(rolling_cov) / samples_in_window):
-        number_of_windows = int(round(len(rolling_cov) / samples_in_window))
+    if total_samples / samples_in_window > np.floor(total_samples / samples_in_window):
+        number_of_windows = int(round(total_samples / samples_in_window))
     else:
-        number_of_windows = int(np.floor(len(rolling_cov) / samples_in_window))
+        number_of_windows = int(np.floor(total_samples / samples_in_window))
 
-    window_labels = np.zeros(number_of_windows)
+    bounds = []
     for iwin in range(number_of_windows):
+        win_start = iwin * samples_in_window
+        win_stop = (iwin + 1) * samples_in_window
+        bounds.append((int(win_start), min(int(win_stop), total_samples)))
+
+    return bounds
 
-        if iwin == number_of_windows:
-            win_start = iwin * samples_in_window
-            win_stop = len(rolling_cov)
-        else:
-            win_start = iwin * samples_in_window
-            win_stop = (iwin + 1) * samples_in_window
+@profiler.instrument('hand_movement_classifier.classify_hand_movement_windows')
+def classify_hand_movement_windows(rolling_cov, fs, window_length=3, threshold=0.01, excluded_windows=None):
+    '''
+    Classify non-overlapping windows as hand movement when at least half of the rolling coefficient of variation
+    values lie above a threshold.
+    :param rolling_cov: Rolling coefficient of variation (see compute_rolling_cov)
+    :param fs: Sampling rate of the rolling coefficient of variation
+    :param window_length: Length (in seconds) of the non-overlapping window for hand movement classification
+    :param threshold: Threshold value that is applied to the coefficient of variation to detect hand movement
+    :param excluded_windows: Boolean array-like indexed by window number of windows to skip (see quality_gate.py)
+    :return: Detected hand movement as numpy array in desired window length. Excluded windows are NaN.
+    '''
+    # Detect CoV values about given movement threshold
+    values_above_threshold = (rolling_cov > threshold)*1
 
-            if np.mean(values_above_threshold[int(win_start):int(win_stop)]) >= 0.5:
-                window_labels[iwin] = 1
+    # Classify non-overlapping windows as either hand movement or no hand movement
+    bounds = hand_movement_window_bounds(len(rolling_cov), fs, window_length)
+    number_of_windows = len(bounds)
 
+    window_labels = np.zeros(number_of_windows)
+    excluded = quality_gate.excluded_window_mask(excluded_windows, number_of_windows)
+    window_labels[excluded] = np.nan
+    for iwin, (win_start, win_stop) in enumerate(bounds):
+        # Skip windows flagged by the quality gate
+        if excluded[iwin]:
+            continue
+
+        if np.mean(values_above_threshold[win_start:win_stop]) >= 0.5:
+            window_labels[iwin] = 1
+
+    profiler.record_windows('hand_movement_classifier.classify_hand_movement_windows',
+                            processed=number_of_windows - int(excluded.sum()), skipped=int(excluded.sum()))
     return window_labels
 
+@profiler.instrument('hand_movement_classifier.detect_hand_movement')
+def detect_hand_movement(raw_accelerometer_data_df, fs, window_length=3, threshold=0.01, multirate=False,
+                         min_sampling_rate=10.0, excluded_windows=None):
+    '''
+    Method for detecting hand movement from raw accelerometer data.
+    :param raw_accelerometer_data_df: Pandas DataFrame with accelerometer axis represented as x, y and z columns
+    :param fs: Sampling rate (samples/second) of the accelerometer data
+    :param window_length: Length (in seconds) of the non-overlapping window for hand movement classification
+    :param threshold: Threshold value that is applied to the coefficient of variation to detect hand movement
+    :param multirate: If True, decimate the 3 Hz low-passed vector magnitude to at least min_sampling_rate before
+    computing the rolling coefficient of variation (see validation/multirate_equivalence.py for tolerances)
+    :param min_sampling_rate: Lowest sampling rate used in multirate mode
+    :param excluded_windows: Boolean array-like indexed by window number of windows to skip (see quality_gate.py)
+    :return: Detected hand movement as numpy array in desired window length. Excluded windows are NaN.
+    '''
+    # Calculate the rolling coefficient of variation of the low-passed vector magnitude
+    rolling_cov, cov_fs = compute_rolling_cov(raw_accelerometer_data_df, fs, multirate=multirate,
+                                              min_sampling_rate=min_sampling_rate)
+
+    # Classify non-overlapping windows as either hand movement or no hand movement
+    return classify_hand_movement_windows(rolling_cov, cov_fs, window_length=window_length, threshold=threshold,
+                                          excluded_windows=excluded_windows)
+
 if __name__ == "__main__":
     '''
     Main runner for hand movement detection from accelerometer data located at the wrist location. 
@@ -5,7 +5,9 @@ The features calculated are: 1. hand movement amplitude, 2. smoothness of hand m
 import pandas as pd
 import numpy as np
 from signal_preprocessing import preprocess
+from signal_preprocessing import quality_gate
 from features import signal_features as sf
+from instrumentation import profiler
 
 def compute_rms(data_array):
     '''
@@ -14,55 +16,55 @@ def compute_rms(data_array):
     :param data_array: np.array of data
     :return: rms
     '''
-    return np.sqrt(np.mean(np.square(data_array)))
+    # One window of one channel: the RMS of its vector magnitude (absolute value) is the RMS of the data
+    return sf.batched_magnitude_rms(np.asarray(data_array).reshape(1, 1, -1))[0]
 
-def calculate_amplitude_and_smoothness_features(raw_accelerometer_data_df, fs):
+@profiler.instrument('hand_movement_features.calculate_amplitude_and_smoothness_features')
+def calculate_amplitude_and_smoothness_features(raw_accelerometer_data_df, fs, multirate=False, min_sampling_rate=25.0,
+                                                excluded_windows=None):
     '''
     Function to calculate hand movement amplitude and smoothness of hand movement (jerk metric) from accelerometer data
     collected from a wrist worn wearable device.
 
     :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts', 'x', 'y', 'z']
     :param fs: Sampling rate of raw accelerometer data (Float)
+    :param multirate: If True, decimate the 0.25-3.5 Hz band-passed signal to at least min_sampling_rate before
+    windowing (see validation/multirate_equivalence.py for tolerances)
+    :param min_sampling_rate: Lowest sampling rate used in multirate mode
+    :param excluded_windows: Boolean array-like indexed by window number of windows to skip (see quality_gate.py)
     :return: Computed hand movement amplitude (list) and smoothness of hand movement (jerk metric) (list) in 3 second
-    windows
+    windows. Excluded windows are NaN.
     '''
 
     # Pre-process data
     # Bandpass filter between 0.25-3.5
-    filtered_data_df = preprocess.band_pass_filter(raw_accelerometer_data_df, fs, [0.25, 3.5], 4,
-                                        channels=['x', 'y', 'z'])
-    bp_headers = ['x_bp_filt_[0.25, 3.5]', 'y_bp_filt_[0.25, 3.5]', 'z_bp_filt_[0.25, 3.5]']
-    filtered_data_df = filtered_data_df[bp_headers]
+    filtered_data = np.array([preprocess.band_pass_filter_array(raw_accelerometer_data_df[axis].values, fs, [0.25, 3.5], 4)
+                              for axis in ['x', 'y', 'z']])
 
-    avg_acc_per_window = []
-    jerk_per_window = []
+    if multirate:
+        q = preprocess.decimation_factor(fs, min_sampling_rate)
+        filtered_data = filtered_data[:, ::q].copy()
+        fs = fs / float(q)
 
     # Segment into 3 second windows
-    total_samples = filtered_data_df.shape[0]
-    window_samples = fs * 3.0
-    total_windows = round(total_samples / float(window_samples))
-    for win in range(int(total_windows)):
-        current_win_start = int(window_samples * win + 1)
-        current_win_end = int(current_win_start + window_samples - 1)
-        if current_win_end > filtered_data_df.shape[0]:
-            window_data_df = filtered_data_df.loc[current_win_start:, :]
-        else:
-            window_data_df = filtered_data_df.loc[current_win_start:current_win_end, :]
-        window_data_df.reset_index(drop=True, inplace=True)
-        window_data_df = window_data_df[bp_headers]
+    bounds = preprocess.window_bounds(filtered_data.shape[1], fs)
+    avg_acc_per_window = [np.nan] * len(bounds)
+    jerk_per_window = [np.nan] * len(bounds)
 
-        # Compute Avg RMS -> Amplitude of hand movement
-        window_data_df['mag'] = np.sqrt(
-            (window_data_df['x_bp_filt_[0.25, 3.5]'] ** 2) + (window_data_df['y_bp_filt_[0.25, 3.5]'] ** 2) + (
-            window_data_df['z_bp_filt_[0.25, 3.5]'] ** 2))
-        combined_amplitude = compute_rms(window_data_df.mag.tolist())
-        avg_acc_per_window.append(combined_amplitude)
+    # Skip windows flagged by the quality gate
+    excluded = quality_gate.excluded_window_mask(excluded_windows, len(bounds))
+    included_windows = np.where(~excluded)[0]
 
-        # Compute Jerk -> Smoothness of hand movement
-        computed_jerk_df = sf.jerk_metric(window_data_df, fs, ['mag'])
-        computed_jerk = computed_jerk_df.mag_jerk_ratio.values[0]
-        jerk_per_window.append(computed_jerk)
+    # Compute Avg RMS of vector magnitude -> Amplitude of hand movement and Jerk -> Smoothness of hand movement for
+    # stacks of windows at once
+    for window_indices, channel_windows in sf.stack_windows(filtered_data, [bounds[win] for win in included_windows]):
+        features = sf.batched_time_domain_features(channel_windows, fs)
+        for idx, win in enumerate(included_windows[window_indices]):
+            avg_acc_per_window[win] = features['magnitude_rms'][idx]
+            jerk_per_window[win] = features['magnitude_jerk_ratio'][idx]
 
+    profiler.record_windows('hand_movement_features.calculate_amplitude_and_smoothness_features',
+                            processed=len(included_windows), skipped=int(excluded.sum()))
     return avg_acc_per_window, jerk_per_window
 
 
@@ -0,0 +1,285 @@
+'''
+This file houses a local (in-process) inference server for a model artifact (see model_artifact.py). Many callers,
+e.g. one thread per recording or per live device, submit window feature rows concurrently; a worker thread gathers
+the pending rows into micro-batches and classifies each batch with a single predict (or predict_proba) call, which is
+much cheaper per row than one call per window for a random forest.
+
+A batch is sent to the model when it holds max_batch_size rows or when its oldest request has waited max_latency
+seconds, whichever comes first. A request is never split across batches. If classifying a batch raises (e.g. rows of
+different widths or a failing model), result() of every request in that batch raises the error and the worker goes
+on with the next batch. Once stop() was called, submit() raises a RuntimeError; requests still queued when the worker
+exits fail with a RuntimeError rather than waiting forever.
+
+Usage:
+    artifact = model_artifact.load_model_artifact('models', 'tremor')
+    with InferenceServer(artifact, max_batch_size=512, max_latency=0.01) as server:
+        predictions = server.predict(feature_df)          # blocks until the batch holding the rows was classified
+        pending = server.submit(feature_df)               # or: submit now, collect later
+        predictions = pending.result(timeout=1.0)
+'''
+import threading
+import timeit
+import numpy as np
+import pandas as pd
+from instrumentation import profiler
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+class PendingPrediction(object):
+    '''
+    Result of a submitted request, available once the batch holding it was classified.
+    '''
+
+    def __init__(self, rows, index):
+        '''
+        :param rows: 2-D numpy array of feature rows
+        :param index: index of the feature rows (used for the returned predictions)
+        '''
+        self.rows = rows
+        self.index = index
+        self.submitted = timeit.default_timer()
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+
+    def done(self):
+        '''
+        True once the request was classified (or failed).
+        '''
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        '''
+        Wait for the predictions of the request.
+
+        :param timeout: Maximum number of seconds to wait (None = no limit)
+        :return: Pandas Series (predict) or Pandas DataFrame (predict_proba, one column per class) indexed like the
+        submitted rows
+        '''
+        if not self._event.wait(timeout):
+            raise RuntimeError('Prediction not available after %s seconds' % timeout)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _set_result(self, result):
+        self._result = result
+        self._event.set()
+
+    def _set_error(self, error):
+        self._error = error
+        self._event.set()
+
+class InferenceServer(object):
+    '''
+    Micro-batching inference server for one model artifact.
+    '''
+
+    def __init__(self, artifact, max_batch_size=256, max_latency=0.005, method='predict'):
+        '''
+        :param artifact: model_artifact.ModelArtifact
+        :param max_batch_size: Number of rows at which a batch is sent to the model
+        :param max_latency: Maximum number of seconds a request waits for other requests to join its batch
+        :param method: 'predict' or 'predict_proba'
+        '''
+        if method not in ('predict', 'predict_proba'):
+            raise ValueError("method must be 'predict' or 'predict_proba'")
+        self.artifact = artifact
+        self.max_batch_size = int(max_batch_size)
+        self.max_latency = float(max_latency)
+        self.method = method
+        self.batches = 0
+        self.rows = 0
+        self._requests = queue.Queue()
+        self._held = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def start(self):
+        '''
+        Start the worker thread.
+
+        :return: self
+        '''
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run, name='InferenceServer')
+                self._worker.daemon = True
+                self._worker.start()
+        return self
+
+    def stop(self, timeout=None):
+        '''
+        Stop the worker thread after the pending requests were classified. No new requests are accepted from here on.
+
+        :param timeout: Maximum number of seconds to wait for the worker thread (the worker keeps running after a
+        timeout and exits once the queued requests were classified)
+        '''
+        with self._lock:
+            self._stop.set()
+            worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+            with self._lock:
+                if self._worker is worker and not worker.is_alive():
+                    self._worker = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def submit(self, features):
+        '''
+        Queue feature rows for classification.
+
+        :param features: Pandas DataFrame of features (columns are selected and ordered per the artifact) or 2-D numpy
+        array already in artifact.feature_columns order
+        :return: PendingPrediction
+        '''
+        if self._worker is None or self._stop.is_set():
+            raise RuntimeError('InferenceServer is not running (call start())')
+        if isinstance(features, pd.DataFrame):
+            rows, index = self.artifact.feature_matrix(features), features.index
+        else:
+            rows = np.atleast_2d(np.asarray(features, dtype=np.float64))
+            index = pd.RangeIndex(rows.shape[0])
+            if rows.shape[1] != len(self.artifact.feature_columns):
+                raise ValueError('Expected %d feature columns, got %d' %
+                                 (len(self.artifact.feature_columns), rows.shape[1]))
+
+        request = PendingPrediction(rows, index)
+        if rows.shape[0] == 0:
+            request._set_result(self._format(np.zeros(0), index))
+            return request
+        # Checked again under the lock so that no request is queued after stop() (the worker would never see it)
+        with self._lock:
+            if self._worker is None or self._stop.is_set():
+                raise RuntimeError('InferenceServer is not running (call start())')
+            self._requests.put(request)
+        return request
+
+    def predict(self, features, timeout=None):
+        '''
+        Classify feature rows, batched together with the rows of concurrent callers.
+
+        :param features: See submit()
+        :param timeout: Maximum number of seconds to wait (None = no limit)
+        :return: See PendingPrediction.result()
+        '''
+        return self.submit(features).result(timeout)
+
+    def _next_request(self, timeout):
+        if self._held is not None:
+            request, self._held = self._held, None
+            return request
+        try:
+            return self._requests.get(timeout=timeout) if timeout > 0 else self._requests.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _collect_batch(self):
+        # Wait for a first request, then gather more until the batch is full or the first request is due
+        request = self._next_request(0.05)
+        if request is None:
+            return []
+        batch = [request]
+        n_rows = request.rows.shape[0]
+        deadline = request.submitted + self.max_latency
+        while n_rows < self.max_batch_size:
+            request = self._next_request(deadline - timeit.default_timer())
+            if request is None:
+                break
+            if n_rows + request.rows.shape[0] > self.max_batch_size:
+                # Keep for the next batch; requests are not split
+                self._held = request
+                break
+            batch.append(request)
+            n_rows += request.rows.shape[0]
+        return batch
+
+    def _format(self, predictions, index):
+        if self.method == 'predict_proba':
+            return pd.DataFrame(predictions.reshape(len(index), -1) if len(index) else None, index=index,
+                                columns=getattr(self.artifact.model, 'classes_', None))
+        return pd.Series(predictions, index=index)
+
+    def _classify(self, batch):
+        try:
+            rows = np.vstack([request.rows for request in batch])
+            predictions = getattr(self.artifact.model, self.method)(rows)
+            if len(predictions) != rows.shape[0]:
+                raise ValueError('Model returned %d predictions for %d rows' % (len(predictions), rows.shape[0]))
+
+            results = []
+            offset = 0
+            for request in batch:
+                n_rows = request.rows.shape[0]
+                results.append(self._format(predictions[offset:offset + n_rows], request.index))
+                offset += n_rows
+
+            self.batches += 1
+            self.rows += rows.shape[0]
+            profiler.record_windows('inference_server.batch', processed=rows.shape[0])
+        except Exception as error:
+            # Fail the requests of this batch only; the worker keeps serving the next batches
+            for request in batch:
+                request._set_error(error)
+            return
+
+        for request, result in zip(batch, results):
+            request._set_result(result)
+
+    def _fail_pending(self):
+        # Requests left over when the worker exits (e.g. after an unexpected error) would otherwise wait forever
+        error = RuntimeError('InferenceServer stopped before the request was classified')
+        if self._held is not None:
+            self._held._set_error(error)
+            self._held = None
+        while True:
+            try:
+                self._requests.get_nowait()._set_error(error)
+            except queue.Empty:
+                return
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._collect_batch()
+                if batch:
+                    self._classify(batch)
+                elif self._stop.is_set() and self._held is None and self._requests.empty():
+                    return
+        finally:
+            self._fail_pending()
+
+if __name__ == "__main__":
+    '''
+    Main runner classifying a feature set with concurrent callers (one per chunk of windows).
+    '''
+    from classifiers import model_artifact
+
+    artifacts_root = '' # Insert root directory of the model artifacts
+    features_filepath = '' # Insert file path of a tremor feature set (build_rest_tremor_classification_feature_set())
+    feature_set = pd.read_csv(features_filepath, index_col=0)
+
+    results = {}
+    with InferenceServer(model_artifact.load_model_artifact(artifacts_root, 'tremor'), max_batch_size=512,
+                         max_latency=0.01) as server:
+        def caller(chunk_number, chunk_df):
+            results[chunk_number] = server.predict(chunk_df)
+
+        threads = [threading.Thread(target=caller, args=(i, feature_set.iloc[i::8])) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    print(pd.concat(results.values()).sort_index().to_string())
+    print('%d rows in %d batches' % (server.rows, server.batches))
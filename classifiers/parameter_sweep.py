@@ -0,0 +1,202 @@
+'''
+This file contains the parameter-sweep mode of the heuristic classifiers. Intermediate signals are computed once per
+recording and every configuration of a grid is evaluated with array operations:
+
+sweep_hand_movement():     the rolling coefficient of variation (vector magnitude, 3 Hz low-pass, rolling mean and
+                           standard deviation) is computed once. Per window length, each window is reduced to the value
+                           its CoV must exceed: a window is labelled as hand movement when at least half of its CoV
+                           values lie above the threshold, i.e. when the ceil(n/2)-th largest CoV value is above it.
+                           All thresholds are then one array comparison. Labels are identical to
+                           detect_hand_movement(window_length=..., threshold=...); excluded windows are mapped by time
+                           (see sweep_hand_movement), so at window_length == excluded_window_length they are identical
+                           to detect_hand_movement(..., excluded_windows=...) as well.
+sweep_tremor_amplitude():  one filter pass and one batched RMS pass per (band, order); all percentiles of the
+                           aggregate tremor amplitude in one np.percentile call. Amplitudes are identical to
+                           calculate_tremor_amplitude(bp_cutoff=..., order=...).
+
+Both return tidy (long format) tables: one row per configuration and window, and one row per configuration with the
+endpoint values. Endpoints are computed over all (non-excluded) windows, without filtering by the prediction tree.
+'''
+import numpy as np
+import pandas as pd
+from features import signal_features as sf
+from classifiers import hand_movement_classifier
+from classifiers import resting_tremor_amplitude_classifier
+from signal_preprocessing import quality_gate
+from instrumentation import profiler
+
+def window_decision_values(rolling_cov, bounds):
+    '''
+    Per window, the ceil(n/2)-th largest rolling CoV value. A window is classified as hand movement for every
+    threshold below this value.
+
+    :param rolling_cov: Rolling coefficient of variation (see hand_movement_classifier.compute_rolling_cov)
+    :param bounds: list of (start, stop) window positions (see hand_movement_classifier.hand_movement_window_bounds)
+    :return: numpy array of decision values (-inf for empty windows)
+    '''
+    # NaN's are never above a threshold
+    values = np.where(np.isnan(rolling_cov), -np.inf, rolling_cov)
+    decision_values = np.full(len(bounds), -np.inf)
+
+    for window_indices, windows in sf.stack_windows(values[np.newaxis, :], bounds):
+        n_samples = windows.shape[2]
+        if n_samples == 0:
+            continue
+        k = (n_samples + 1) // 2
+        decision_values[window_indices] = np.partition(windows[0], n_samples - k, axis=1)[:, n_samples - k]
+
+    return decision_values
+
+def _excluded_sample_counts(excluded_windows, excluded_window_length, total_samples, fs):
+    # Cumulative count of excluded samples on the rolling CoV grid; window i of the mask covers the samples of
+    # hand movement window i of length excluded_window_length
+    edges = np.zeros(total_samples + 1)
+    if excluded_windows is not None:
+        bounds = hand_movement_classifier.hand_movement_window_bounds(total_samples, fs, excluded_window_length)
+        excluded = quality_gate.excluded_window_mask(excluded_windows, len(bounds))
+        starts = np.array([start for start, _ in bounds], dtype=int)[excluded]
+        stops = np.array([stop for _, stop in bounds], dtype=int)[excluded]
+        np.add.at(edges, starts, 1)
+        np.add.at(edges, stops, -1)
+    excluded = np.cumsum(edges)[:-1] > 0
+    return np.concatenate(([0], np.cumsum(excluded)))
+
+def _no_hand_movement_endpoints(labels, excluded):
+    # labels: (windows, configurations) booleans; excluded windows end a bout
+    no_movement = ~labels & ~excluded[:, np.newaxis]
+    n_included = np.sum(~excluded)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percentage = np.sum(no_movement, axis=0) / float(n_included) * 100.
+
+    bout_starts = no_movement.copy()
+    bout_starts[1:] &= ~no_movement[:-1]
+    n_bouts = np.sum(bout_starts, axis=0).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_bout_length = np.where(n_bouts > 0, np.sum(no_movement, axis=0) / n_bouts, np.nan)
+    return percentage, mean_bout_length
+
+@profiler.instrument('parameter_sweep.sweep_hand_movement')
+def sweep_hand_movement(raw_accelerometer_data_df, fs, thresholds, window_lengths=[3], multirate=False,
+                        min_sampling_rate=10.0, excluded_windows=None, excluded_window_length=3.0):
+    '''
+    Evaluate detect_hand_movement() on a grid of thresholds and window lengths.
+
+    :param raw_accelerometer_data_df: Pandas DataFrame with accelerometer axis represented as x, y and z columns
+    :param fs: Sampling rate (samples/second) of the accelerometer data
+    :param thresholds: Thresholds applied to the coefficient of variation (list)
+    :param window_lengths: Lengths (in seconds) of the non-overlapping classification windows (list)
+    :param multirate: See detect_hand_movement()
+    :param min_sampling_rate: See detect_hand_movement()
+    :param excluded_windows: Boolean array-like indexed by window number of windows to skip (see quality_gate.py). A
+    classification window of any length is excluded if it overlaps an excluded window; excluded windows are labelled
+    NaN and left out of the endpoints.
+    :param excluded_window_length: Length (in seconds) of the windows of excluded_windows (the window_length of
+    quality_gate.assess_window_quality())
+    :return: Pandas DataFrame of labels with columns ['window_length', 'threshold', 'window', 'hand_movement'] and
+    Pandas DataFrame of endpoints with columns ['window_length', 'threshold', 'windows', 'excluded_windows',
+    'percentage_of_no_hand_movement', 'length_of_no_hand_movement_bouts']
+    '''
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    # Shared intermediate: rolling coefficient of variation
+    rolling_cov, cov_fs = hand_movement_classifier.compute_rolling_cov(raw_accelerometer_data_df, fs,
+                                                                         multirate=multirate,
+                                                                         min_sampling_rate=min_sampling_rate)
+    excluded_counts = _excluded_sample_counts(excluded_windows, excluded_window_length, len(rolling_cov), cov_fs)
+
+    label_dfs = []
+    endpoint_dfs = []
+    for window_length in window_lengths:
+        bounds = hand_movement_classifier.hand_movement_window_bounds(len(rolling_cov), cov_fs, window_length)
+        starts = np.array([start for start, _ in bounds], dtype=int)
+        stops = np.array([stop for _, stop in bounds], dtype=int)
+        excluded = (excluded_counts[stops] - excluded_counts[starts]) > 0
+
+        # All thresholds as one comparison: (windows, thresholds)
+        labels = window_decision_values(rolling_cov, bounds)[:, np.newaxis] > thresholds[np.newaxis, :]
+
+        window_labels = labels.astype(float)
+        window_labels[excluded] = np.nan
+        label_dfs.append(pd.DataFrame({'window_length': window_length,
+                                       'threshold': np.tile(thresholds, len(bounds)),
+                                       'window': np.repeat(np.arange(len(bounds)), len(thresholds)),
+                                       'hand_movement': window_labels.ravel()},
+                                      columns=['window_length', 'threshold', 'window', 'hand_movement']))
+
+        percentage, mean_bout_length = _no_hand_movement_endpoints(labels, excluded)
+        endpoint_dfs.append(pd.DataFrame({'window_length': window_length,
+                                          'threshold': thresholds,
+                                          'windows': len(bounds),
+                                          'excluded_windows': int(excluded.sum()),
+                                          'percentage_of_no_hand_movement': percentage,
+                                          'length_of_no_hand_movement_bouts': mean_bout_length},
+                                         columns=['window_length', 'threshold', 'windows', 'excluded_windows',
+                                                  'percentage_of_no_hand_movement',
+                                                  'length_of_no_hand_movement_bouts']))
+
+    return pd.concat(label_dfs, ignore_index=True), pd.concat(endpoint_dfs, ignore_index=True)
+
+@profiler.instrument('parameter_sweep.sweep_tremor_amplitude')
+def sweep_tremor_amplitude(raw_accelerometer_data_df, fs, bands=[[3.5, 7.5]], orders=[3], percentiles=[85],
+                           excluded_windows=None, window_mask=None):
+    '''
+    Evaluate calculate_tremor_amplitude() and its aggregate endpoint on a grid of tremor bands, filter orders and
+    percentiles.
+
+    :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts','x','y','z']
+    :param fs: Sampling rate of raw accelerometer data (float)
+    :param bands: Tremor bands [low, high] (Hz) of the band-pass filter (list)
+    :param orders: Orders of the band-pass filter (list)
+    :param percentiles: Percentiles of the aggregate tremor amplitude (list)
+    :param excluded_windows: Boolean array-like indexed by window number of windows to skip (see quality_gate.py)
+    :param window_mask: Boolean array-like indexed by window number of windows used for the endpoint (Ex: windows
+    with tremor detected). Default: all windows
+    :return: Pandas DataFrame of amplitudes with columns ['band_low', 'band_high', 'order', 'window',
+    'tremor_amplitude'] and Pandas DataFrame of endpoints with columns ['band_low', 'band_high', 'order', 'percentile',
+    'aggregate_tremor_amplitude']
+    '''
+    percentiles = np.asarray(percentiles, dtype=float)
+
+    amplitude_dfs = []
+    endpoint_dfs = []
+    for band in bands:
+        for order in orders:
+            amplitudes = np.asarray(resting_tremor_amplitude_classifier.calculate_tremor_amplitude(
+                raw_accelerometer_data_df, fs, excluded_windows=excluded_windows, bp_cutoff=list(band), order=order))
+
+            amplitude_dfs.append(pd.DataFrame({'band_low': band[0], 'band_high': band[1], 'order': order,
+                                               'window': np.arange(len(amplitudes)),
+                                               'tremor_amplitude': amplitudes},
+                                              columns=['band_low', 'band_high', 'order', 'window',
+                                                       'tremor_amplitude']))
+
+            used = ~np.isnan(amplitudes)
+            if window_mask is not None:
+                used &= np.concatenate((np.asarray(window_mask, dtype=bool)[:len(amplitudes)],
+                                        np.zeros(max(len(amplitudes) - len(window_mask), 0), dtype=bool)))
+            if used.any():
+                aggregate = np.percentile(amplitudes[used], percentiles)
+            else:
+                aggregate = np.full(len(percentiles), np.nan)
+            endpoint_dfs.append(pd.DataFrame({'band_low': band[0], 'band_high': band[1], 'order': order,
+                                              'percentile': percentiles,
+                                              'aggregate_tremor_amplitude': aggregate},
+                                             columns=['band_low', 'band_high', 'order', 'percentile',
+                                                      'aggregate_tremor_amplitude']))
+
+    return pd.concat(amplitude_dfs, ignore_index=True), pd.concat(endpoint_dfs, ignore_index=True)
+
+if __name__ == "__main__":
+    '''
+    Main runner of a threshold calibration sweep.
+    '''
+    raw_data_filepath = '' # Insert file path of raw accelerometer data
+    raw_data_df = pd.read_csv(raw_data_filepath)
+    sampling_rate = 100.0 # Specify sampling rate of sensor data
+
+    # Quality gate windows of 3 seconds; mapped by time onto the windows of every swept length
+    quality_df = quality_gate.assess_window_quality(raw_data_df, sampling_rate, window_length=3.0)
+    labels_df, endpoints_df = sweep_hand_movement(raw_data_df, sampling_rate, thresholds=np.linspace(0.005, 0.03, 26),
+                                                  window_lengths=[2, 3, 5], excluded_windows=quality_df.excluded.values,
+                                                  excluded_window_length=3.0)
+    print(endpoints_df.to_string())
@@ -6,6 +6,9 @@ located on the wrist.
 import pandas as pd
 import numpy as np
 from signal_preprocessing import preprocess
+from signal_preprocessing import quality_gate
+from features import signal_features as sf
+from instrumentation import profiler
 
 def compute_rms(data_array):
     '''
@@ -14,44 +17,42 @@ def compute_rms(data_array):
     :param data_array: np.array of data
     :return: rms
     '''
-    return np.sqrt(np.mean(np.square(data_array)))
+    # One window of one channel: the RMS of its vector magnitude (absolute value) is the RMS of the data
+    return sf.batched_magnitude_rms(np.asarray(data_array).reshape(1, 1, -1))[0]
 
-def calculate_tremor_amplitude(raw_accelerometer_data_df, fs):
+@profiler.instrument('resting_tremor_amplitude_classifier.calculate_tremor_amplitude')
+def calculate_tremor_amplitude(raw_accelerometer_data_df, fs, excluded_windows=None, bp_cutoff=[3.5, 7.5], order=3):
     '''
     Calculate tremor amplitude from raw accelerometer data collected from wearable sensor at wrist location.
     :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts','x','y','z']
     :param fs: Sampling rate of raw accelerometer data (float)
-    :return: Computed tremor amplitude in 3 second windows (list)
+    :param excluded_windows: Boolean array-like indexed by window number of windows to skip (see quality_gate.py)
+    :param bp_cutoff: Tremor band (Hz) of the band-pass filter
+    :param order: Order of the band-pass filter
+    :return: Computed tremor amplitude in 3 second windows (list). Excluded windows are NaN.
     '''
 
     # Pre-process data
-    # Bandpass filter between 3.5-7.5
-    filtered_data_df = preprocess.band_pass_filter(raw_accelerometer_data_df, fs, [3.5, 7.5], 3,
-                                                             channels=['x', 'y', 'z'])
-    bp_headers = ['x_bp_filt_[3.5, 7.5]', 'y_bp_filt_[3.5, 7.5]', 'z_bp_filt_[3.5, 7.5]']
-    filtered_data_df = filtered_data_df[bp_headers]
-
-    tremor_amplitudes_per_window = []
+    # Bandpass filter between 3.5-7.5 (default tremor band)
+    filtered_data = np.array([preprocess.band_pass_filter_array(raw_accelerometer_data_df[axis].values, fs, bp_cutoff, order)
+                              for axis in ['x', 'y', 'z']])
 
     # Segment into 3 second windows
-    total_samples = filtered_data_df.shape[0]
-    window_samples = fs * 3.0
-    total_windows = round(total_samples / float(window_samples))
-    for win in range(int(total_windows)):
-        current_win_start = int(window_samples * win + 1)
-        current_win_end = int(current_win_start + window_samples - 1)
-        if current_win_end > filtered_data_df.shape[0]:
-            window_data_df = filtered_data_df.loc[current_win_start:, :]
-        else:
-            window_data_df = filtered_data_df.loc[current_win_start:current_win_end, :]
-        window_data_df.reset_index(drop=True, inplace=True)
-        window_data_df = window_data_df[bp_headers]
+    bounds = preprocess.window_bounds(filtered_data.shape[1], fs)
+    tremor_amplitudes_per_window = [np.nan] * len(bounds)
+
+    # Skip windows flagged by the quality gate
+    excluded = quality_gate.excluded_window_mask(excluded_windows, len(bounds))
+    included_windows = np.where(~excluded)[0]
 
-        # Compute Tremor Amplitude
-        window_data_df['mag'] = np.sqrt((window_data_df['x_bp_filt_[3.5, 7.5]']**2)+(window_data_df['y_bp_filt_[3.5, 7.5]']**2)+(window_data_df['z_bp_filt_[3.5, 7.5]']**2))
-        combined_amplitude = compute_rms(window_data_df.mag.tolist())
-        tremor_amplitudes_per_window.append(combined_amplitude)
+    # Compute Tremor Amplitude (RMS of vector magnitude) for stacks of windows at once
+    for window_indices, channel_windows in sf.stack_windows(filtered_data, [bounds[win] for win in included_windows]):
+        combined_amplitudes = sf.batched_magnitude_rms(channel_windows)
+        for win, combined_amplitude in zip(included_windows[window_indices], combined_amplitudes):
+            tremor_amplitudes_per_window[win] = combined_amplitude
 
+    profiler.record_windows('resting_tremor_amplitude_classifier.calculate_tremor_amplitude',
+                            processed=len(included_windows), skipped=int(excluded.sum()))
     return tremor_amplitudes_per_window
 
 if __name__ == "__main__":
@@ -3,26 +3,39 @@ This file is used to extract features for resting tremor classification. Machine
 Users will have to provide their own data and ground truths to train the model. Input data is raw accelerometer data
 from wearable sensor on wrist location.
 '''
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from signal_preprocessing import preprocess
+from signal_preprocessing import channel_store
+from signal_preprocessing import quality_gate
 from features import signal_features as sf
+from features import sliding_window_features
 import constants
+from instrumentation import profiler
 
-def extract_tremor_classification_features(data_df, current_feature_df, data_channels, fs):
+@profiler.instrument('resting_tremor_classifier.extract_tremor_classification_features')
+def extract_tremor_classification_features(data_df, current_feature_df, data_channels, fs, time_domain_df=None):
     '''
     Compute signal features applicable for tremor classification for a given 3 second window.
     :param data_df: Raw accelerometer data as Pandas DataFrame. Columns = ['ts', 'x', 'y', 'z']
     :param current_feature_df: Pandas DataFrame of current features to append new features to.
     :param data_channels: Data channels to run features on. Ex: ['x','y','z']
     :param fs: Sampling rate of raw accelerometer data (float)
+    :param time_domain_df: Optional one-row Pandas DataFrame of this window's range and RMS (columns of
+    signal_features.batched_time_domain_feature_set()). These features are computed from the window if not given.
     :return: Pandas DataFrame of computed features for given window of data.
     '''
-    # Compute signal range
-    feat_df_range = sf.signal_range(data_df, channels=data_channels)
+    if time_domain_df is None:
+        # Compute signal range
+        feat_df_range = sf.signal_range(data_df, channels=data_channels)
+
+        # Compute RMS
+        feat_df_rms = sf.signal_rms(data_df, channels=data_channels)
+    else:
+        feat_df_range = time_domain_df[[channel + '_range' for channel in data_channels]]
+        feat_df_rms = time_domain_df[[channel + '_rms' for channel in data_channels]]
     current_feature_df = current_feature_df.join(feat_df_range, how='outer')
-
-    # Compute RMS
-    feat_df_rms = sf.signal_rms(data_df, channels=data_channels)
     current_feature_df = current_feature_df.join(feat_df_rms, how='outer')
 
     # Compute Dominant Frequency
@@ -36,62 +49,105 @@ def extract_tremor_classification_features(data_df, current_feature_df, data_cha
 
     return current_feature_df
 
-def build_rest_tremor_classification_feature_set(raw_accelerometer_data_df, fs):
+@profiler.instrument('resting_tremor_classifier.build_rest_tremor_classification_feature_set')
+def build_rest_tremor_classification_feature_set(raw_accelerometer_data_df, fs, memory_limit_bytes=None,
+                                                 excluded_windows=None, hop=None):
     '''
-    Pre-process raw accelerometer data and compute signal based features on pre-processed signal data.
+    Pre-process raw accelerometer data and compute signal based features on pre-processed signal data. Signal channels
+    are held in a ChannelStore and freed as soon as no later stage needs them; raw_accelerometer_data_df is not modified.
 
     :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts','x','y','z']
     :param fs: Sampling rate of raw accelerometer data (float)
-    :return: Pandas DataFrame of calculated features in 3 second windows.
+    :param memory_limit_bytes: Maximum number of bytes of signal channels held at once (None = no limit). A MemoryError
+    is raised if a stage would exceed it.
+    :param excluded_windows: Boolean array-like indexed by window number of windows to skip (Ex:
+    quality_gate.assess_window_quality(raw_accelerometer_data_df, fs).excluded.values)
+    :param hop: If given, compute the selected features (constants.TREMOR_FEATURE_SELECTION) of overlapping 3 second
+    windows started every hop seconds instead of all features of non-overlapping windows (see
+    features/sliding_window_features.py). Windows overlapping an excluded window are left out.
+    :return: Pandas DataFrame of calculated features in 3 second windows, indexed by window number (excluded windows
+    are left out). With a hop, indexed by sliding window number with the extra columns 'start', 'stop' and 'time'.
     '''
-    # Initialize final DataFrame
-    final_feature_set = pd.DataFrame()
-
-    # Pre-process data
-    # Bandpass filter between 3.5-7.5 hz
-    filtered_data_df = preprocess.band_pass_filter(raw_accelerometer_data_df, fs, [3.5, 7.5],
-                                                             1, channels=['x', 'y', 'z'])
-    bp1_headers = ['x_bp_filt_[3.5, 7.5]', 'y_bp_filt_[3.5, 7.5]', 'z_bp_filt_[3.5, 7.5]']
-
-    # Bandpass filter between 0.25-3.5 hz
-    filtered_data_df = preprocess.band_pass_filter(filtered_data_df, fs, [0.25, 3.5],
-                                                             1, channels=['x', 'y', 'z'])
-    bp2_headers = ['x_bp_filt_[0.25, 3.5]', 'y_bp_filt_[0.25, 3.5]', 'z_bp_filt_[0.25, 3.5]']
-
-    # Perform PCA get 1st principal component for [3.5 - 7.5] bandpass filtered data
-    filtered_data_df = preprocess.get_principal_component(filtered_data_df, channels=bp1_headers)
-    filtered_data_df.rename(columns={'PC1': 'PC1_[3.5, 7.5]'}, inplace=True)
+    raw_headers = ['x', 'y', 'z']
+    bp1_headers = preprocess.band_pass_channel_labels(raw_headers, [3.5, 7.5])
+    bp2_headers = preprocess.band_pass_channel_labels(raw_headers, [0.25, 3.5])
     pca1_headers = ['PC1_[3.5, 7.5]']
-
-    # Perform PCA get 1st principal component for [0.25 - 3.5] bandpass filtered data
-    filtered_data_df = preprocess.get_principal_component(filtered_data_df, channels=bp2_headers)
-    filtered_data_df.rename(columns={'PC1': 'PC1_[0.25, 3.5]'}, inplace=True)
     pca2_headers = ['PC1_[0.25, 3.5]']
 
     # Obtain all data channels of interest
     total_data_channels = bp1_headers + bp2_headers + pca1_headers + pca2_headers
 
-    # Segment into 3 second windows
-    total_samples = filtered_data_df.shape[0]
-    window_samples = fs * 3.0
-    total_windows = round(total_samples / float(window_samples))
-    for win in range(int(total_windows)):
-        current_win_start = int(window_samples * win + 1)
-        current_win_end = int(current_win_start + window_samples - 1)
-        if current_win_end > filtered_data_df.shape[0]:
-            window_data_df = filtered_data_df.loc[current_win_start:, :]
-        else:
-            window_data_df = filtered_data_df.loc[current_win_start:current_win_end, :]
-        window_data_df.reset_index(drop=True, inplace=True)
-
-        # Create DataFrame for current window of data
-        current_features_df = pd.DataFrame()
-        # Extract signal features for tremor detection
-        current_features_df = extract_tremor_classification_features(window_data_df, current_features_df, total_data_channels, fs)
-        # Aggregate features for each window
-        final_feature_set = final_feature_set.append(current_features_df, ignore_index=True)
-
-    return final_feature_set
+    def band_pass(bp_cutoff):
+        return lambda *axes: [preprocess.band_pass_filter_array(axis, fs, bp_cutoff, 1) for axis in axes]
+
+    def first_principal_component(*axes):
+        return preprocess.principal_component_array(np.column_stack(axes))[:, 0]
+
+    def window_features(*channels):
+        # Initialize final DataFrame
+        final_feature_set = pd.DataFrame()
+
+        # Segment into 3 second windows
+        bounds = preprocess.window_bounds(len(channels[0]), fs)
+        excluded = quality_gate.excluded_window_mask(excluded_windows, len(bounds))
+
+        # Range and RMS of all included windows at once (fused kernel on bounded stacks gathered from the channels)
+        included_windows = np.where(~excluded)[0]
+        time_domain_df = sf.batched_time_domain_feature_set(channels, total_data_channels,
+                                                            [bounds[win] for win in included_windows], fs)
+        time_domain_df.index = included_windows[time_domain_df.index.values.astype(int)]
+
+        for win, (current_win_start, current_win_stop) in enumerate(bounds):
+            # Skip windows flagged by the quality gate
+            if excluded[win]:
+                continue
+
+            window_data_df = pd.DataFrame(OrderedDict((name, values[current_win_start:current_win_stop])
+                                                      for name, values in zip(total_data_channels, channels)))
+
+            # Create DataFrame for current window of data
+            current_features_df = pd.DataFrame()
+            # Extract signal features for tremor detection
+            window_time_domain_df = None
+            if win in time_domain_df.index:
+                window_time_domain_df = time_domain_df.loc[[win]].reset_index(drop=True)
+            current_features_df = extract_tremor_classification_features(window_data_df, current_features_df,
+                                                                         total_data_channels, fs,
+                                                                         time_domain_df=window_time_domain_df)
+            # Aggregate features for each window
+            current_features_df.index = [win]
+            final_feature_set = final_feature_set.append(current_features_df)
+
+        profiler.record_windows('resting_tremor_classifier.build_rest_tremor_classification_feature_set',
+                                processed=final_feature_set.shape[0], skipped=int(excluded.sum()))
+        return final_feature_set
+
+    def sliding_features(*channels):
+        # Channel arrays are passed through (no full-recording copy outside the store)
+        features_df = sliding_window_features.compute_sliding_classification_features(
+            OrderedDict(zip(total_data_channels, channels)), fs, constants.TREMOR_FEATURE_SELECTION, hop=hop, excluded_windows=excluded_windows)
+
+        profiler.record_windows('resting_tremor_classifier.build_rest_tremor_classification_feature_set',
+                                processed=features_df.shape[0])
+        return features_df
+
+    stages = [
+        # Pre-process data
+        # Bandpass filter between 3.5-7.5 hz
+        channel_store.Stage('band_pass_[3.5, 7.5]', raw_headers, bp1_headers, band_pass([3.5, 7.5])),
+        # Bandpass filter between 0.25-3.5 hz
+        channel_store.Stage('band_pass_[0.25, 3.5]', raw_headers, bp2_headers, band_pass([0.25, 3.5])),
+        # Perform PCA get 1st principal component for [3.5 - 7.5] bandpass filtered data
+        channel_store.Stage('pca_[3.5, 7.5]', bp1_headers, pca1_headers, first_principal_component),
+        # Perform PCA get 1st principal component for [0.25 - 3.5] bandpass filtered data
+        channel_store.Stage('pca_[0.25, 3.5]', bp2_headers, pca2_headers, first_principal_component),
+        channel_store.Stage('window_features', total_data_channels, [],
+                            window_features if hop is None else sliding_features)]
+
+    store = channel_store.ChannelStore.from_dataframe(raw_accelerometer_data_df, raw_headers,
+                                                      memory_limit_bytes=memory_limit_bytes)
+
+    return channel_store.run_stages(store, stages)['window_features']
 
 def initialize_model():
     '''
@@ -0,0 +1,275 @@
+'''
+This file houses the training workflow of the gait and tremor classifiers:
+
+1. build_labeled_datasets(): builds the gait and tremor feature sets of many recordings in parallel (joblib) and
+   joins them with window-level labels. Each recording is loaded and quality-gated once and both feature sets are built
+   in the same worker from that copy. Feature sets are cached on disk per recording, keyed by the recording file
+   (path, size, modification time), sampling rate and builder configuration, so re-running after adding subjects only
+   builds the features of the new recordings.
+2. cross_validate_model(): subject-grouped cross-validation (GroupKFold, no subject in both the training and the test
+   folds) with the folds fitted in parallel.
+3. train_model(): fits the model on all windows and optionally saves it as a model artifact (see model_artifact.py).
+   The sampling rate and the feature builder configuration of the artifact are taken from the dataset columns
+   written by build_labeled_datasets() ('fs' and, for gait, 'multirate' and 'min_sampling_rate'); a dataset mixing
+   sampling rates is rejected, since the features are rate dependent.
+
+Inputs:
+    recordings_df:  one row per recording with columns ['recording_id', 'subject', 'filepath', 'fs']
+    labels_df:      one row per labeled window with columns ['recording_id', 'window', 'gait', 'tremor'] (window
+                    number as in preprocess.window_bounds(); NaN where a window has no label for a model)
+'''
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from signal_preprocessing import preprocess
+from signal_preprocessing import quality_gate
+from classifiers import constants
+from classifiers import gait_classifier
+from classifiers import resting_tremor_classifier
+from classifiers import model_artifact
+from instrumentation import profiler
+
+try:
+    from joblib import Parallel, delayed
+except ImportError:
+    from sklearn.externals.joblib import Parallel, delayed
+
+# Increase when the feature builders change so cached feature sets are rebuilt
+FEATURE_CACHE_VERSION = 1
+
+FEATURE_SELECTION = {'gait': constants.GAIT_FEATURE_SELECTION,
+                     'tremor': constants.TREMOR_FEATURE_SELECTION}
+
+INITIALIZE_MODEL = {'gait': gait_classifier.initialize_model,
+                    'tremor': resting_tremor_classifier.initialize_model}
+
+# Feature builder configuration written as dataset columns, per model type (keys of the artifact filter_config)
+BUILD_CONFIG_COLUMNS = {'gait': ['multirate', 'min_sampling_rate'],
+                        'tremor': []}
+
+def _cache_key(filepath, fs, config):
+    status = os.stat(filepath)
+    description = json.dumps({'filepath': os.path.abspath(filepath), 'size': status.st_size,
+                              'mtime': status.st_mtime, 'fs': float(fs), 'config': config,
+                              'version': FEATURE_CACHE_VERSION}, sort_keys=True)
+    return hashlib.sha1(description.encode('utf-8')).hexdigest()[:16]
+
+def _cache_paths(cache_dir, recording_id, key):
+    prefix = os.path.join(cache_dir, '%s-%s' % (recording_id, key))
+    return {'gait': prefix + '-gait.pkl', 'tremor': prefix + '-tremor.pkl'}
+
+def build_recording_features(filepath, fs, use_quality_gate=True, gait_multirate=False, gait_min_sampling_rate=25.0,
+                             cache_dir=None, recording_id=None):
+    '''
+    Build the gait and tremor feature sets of one recording (or load them from the cache).
+
+    :param filepath: path to .CSV file of raw accelerometer data (columns 'ts','x','y','z')
+    :param fs: Sampling rate of raw accelerometer data (float)
+    :param use_quality_gate: Skip windows flagged by quality_gate.assess_window_quality()
+    :param gait_multirate: multirate argument of build_gait_classification_feature_set()
+    :param gait_min_sampling_rate: min_sampling_rate argument of build_gait_classification_feature_set()
+    :param cache_dir: Directory of the feature cache (None = no cache)
+    :param recording_id: Name of the recording in the cache (default: file name)
+    :return: dictionary {'gait': Pandas DataFrame, 'tremor': Pandas DataFrame} of features indexed by window number
+    '''
+    config = {'use_quality_gate': bool(use_quality_gate), 'gait_multirate': bool(gait_multirate),
+              'gait_min_sampling_rate': float(gait_min_sampling_rate)}
+    paths = None
+    if cache_dir is not None:
+        if recording_id is None:
+            recording_id = os.path.splitext(os.path.basename(filepath))[0]
+        paths = _cache_paths(cache_dir, recording_id, _cache_key(filepath, fs, config))
+        if all(os.path.isfile(path) for path in paths.values()):
+            return dict((model_type, pd.read_pickle(path)) for model_type, path in paths.items())
+
+    # Load and quality-gate the recording once for both builders
+    raw_data_df = preprocess.load_accelerometer_data(filepath)
+    excluded_windows = None
+    if use_quality_gate:
+        excluded_windows = quality_gate.assess_window_quality(raw_data_df, fs).excluded.values
+
+    features = {'gait': gait_classifier.build_gait_classification_feature_set(raw_data_df, fs,
+                                                                              multirate=gait_multirate,
+                                                                              min_sampling_rate=gait_min_sampling_rate,
+                                                                              excluded_windows=excluded_windows),
+                'tremor': resting_tremor_classifier.build_rest_tremor_classification_feature_set(
+                    raw_data_df, fs, excluded_windows=excluded_windows)}
+
+    if paths is not None:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        for model_type, path in paths.items():
+            # Write to a temporary file first so an interrupted run leaves no partial cache entry
+            features[model_type].to_pickle(path + '.tmp')
+            os.rename(path + '.tmp', path)
+
+    return features
+
+@profiler.instrument('training.build_labeled_datasets')
+def build_labeled_datasets(recordings_df, labels_df, cache_dir=None, n_jobs=-1, use_quality_gate=True,
+                           gait_multirate=False, gait_min_sampling_rate=25.0):
+    '''
+    Build the labeled gait and tremor datasets of many recordings in parallel.
+
+    :param recordings_df: Pandas DataFrame with columns ['recording_id', 'subject', 'filepath', 'fs']
+    :param labels_df: Pandas DataFrame with columns ['recording_id', 'window', 'gait', 'tremor']
+    :param cache_dir: Directory of the per-recording feature cache (None = no cache)
+    :param n_jobs: Number of parallel workers (joblib; -1 = all cores)
+    :param use_quality_gate: Skip windows flagged by quality_gate.assess_window_quality()
+    :param gait_multirate: multirate argument of build_gait_classification_feature_set()
+    :param gait_min_sampling_rate: min_sampling_rate argument of build_gait_classification_feature_set()
+    :return: dictionary {'gait': Pandas DataFrame, 'tremor': Pandas DataFrame}. Columns: 'recording_id', 'subject',
+    'fs', the feature builder configuration (BUILD_CONFIG_COLUMNS), 'window', the selected features
+    (constants.*_FEATURE_SELECTION) and 'label'. Windows without features (skipped by the builders) or without a label
+    are left out.
+    '''
+    build_config = {'gait': {'multirate': bool(gait_multirate), 'min_sampling_rate': float(gait_min_sampling_rate)},
+                    'tremor': {}}
+    recordings = recordings_df.to_dict('records')
+    recording_features = Parallel(n_jobs=n_jobs)(
+        delayed(build_recording_features)(recording['filepath'], recording['fs'], use_quality_gate=use_quality_gate,
+                                          gait_multirate=gait_multirate, gait_min_sampling_rate=gait_min_sampling_rate,
+                                          cache_dir=cache_dir, recording_id=recording['recording_id'])
+        for recording in recordings)
+
+    datasets = {}
+    for model_type, feature_columns in FEATURE_SELECTION.items():
+        model_labels_df = labels_df[['recording_id', 'window', model_type]].dropna(subset=[model_type])
+        model_labels_df = model_labels_df.rename(columns={model_type: 'label'})
+
+        dataset_dfs = []
+        for recording, features in zip(recordings, recording_features):
+            if features[model_type].shape[0] == 0:
+                continue
+            features_df = features[model_type][feature_columns].copy()
+            features_df.insert(0, 'window', features_df.index.values)
+            for column in reversed(BUILD_CONFIG_COLUMNS[model_type]):
+                features_df.insert(0, column, build_config[model_type][column])
+            features_df.insert(0, 'fs', float(recording['fs']))
+            features_df.insert(0, 'subject', recording['subject'])
+            features_df.insert(0, 'recording_id', recording['recording_id'])
+            dataset_dfs.append(features_df.merge(model_labels_df, on=['recording_id', 'window'], how='inner'))
+
+        datasets[model_type] = pd.concat(dataset_dfs, ignore_index=True) if dataset_dfs else pd.DataFrame(
+            columns=['recording_id', 'subject', 'fs'] + BUILD_CONFIG_COLUMNS[model_type] + ['window'] +
+            list(feature_columns) + ['label'])
+
+    return datasets
+
+@profiler.instrument('training.cross_validate_model')
+def cross_validate_model(dataset_df, model_type, model=None, n_splits=5, n_jobs=-1,
+                         scoring=['accuracy', 'balanced_accuracy', 'f1', 'roc_auc']):
+    '''
+    Subject-grouped cross-validation of a classifier.
+
+    :param dataset_df: Labeled dataset of build_labeled_datasets() (one model type)
+    :param model_type: 'gait' or 'tremor'
+    :param model: Untrained scikit-learn estimator (default: initialize_model() of the classifier)
+    :param n_splits: Number of folds (at most the number of subjects)
+    :param n_jobs: Number of folds fitted in parallel (-1 = all cores)
+    :param scoring: scikit-learn scorer names
+    :return: Pandas DataFrame with one row per fold: fit and score times, test scores and the test subjects
+    '''
+    from sklearn.model_selection import GroupKFold, cross_validate
+
+    if model is None:
+        model = INITIALIZE_MODEL[model_type]()
+    feature_columns = FEATURE_SELECTION[model_type]
+    X = dataset_df[feature_columns].values
+    y = dataset_df['label'].values
+    groups = dataset_df['subject'].values
+
+    cv = GroupKFold(n_splits=min(n_splits, len(np.unique(groups))))
+    scores = cross_validate(model, X, y, groups=groups, cv=cv, n_jobs=n_jobs, scoring=scoring,
+                            return_train_score=False)
+
+    scores_df = pd.DataFrame(scores)
+    scores_df.insert(0, 'fold', np.arange(scores_df.shape[0]))
+    scores_df['test_subjects'] = [sorted(np.unique(groups[test_indices]).tolist())
+                                  for _, test_indices in cv.split(X, y, groups)]
+    return scores_df
+
+def _single_value(dataset_df, column, given=None):
+    # The one value of a dataset column (all windows must share it); given must agree with it
+    values = sorted(set(dataset_df[column].tolist())) if column in dataset_df.columns else []
+    if len(values) > 1:
+        raise ValueError('Training windows have different %s values (%s); build and train one model per value' %
+                         (column, ', '.join(str(value) for value in values)))
+    if not values:
+        return given
+    if given is not None and given != values[0]:
+        raise ValueError('%s = %s given, but the dataset was built with %s' % (column, given, values[0]))
+    return values[0]
+
+def training_configuration(dataset_df, model_type, fs=None):
+    '''
+    Sampling rate and feature builder configuration of a labeled dataset, as saved in the model artifact.
+
+    :param dataset_df: Labeled dataset of build_labeled_datasets() (one model type)
+    :param model_type: 'gait' or 'tremor'
+    :param fs: Sampling rate of the training recordings; required if dataset_df has no 'fs' column, otherwise it must
+    match it
+    :return: sampling rate (float), filter configuration (dictionary, model_artifact.MODEL_TYPES defaults updated with
+    the dataset's BUILD_CONFIG_COLUMNS)
+    '''
+    fs = _single_value(dataset_df, 'fs', None if fs is None else float(fs))
+    if fs is None:
+        raise ValueError('fs must be given for a dataset without an fs column')
+
+    filter_config = dict(model_artifact.MODEL_TYPES[model_type]['filter_config'])
+    for column in BUILD_CONFIG_COLUMNS[model_type]:
+        value = _single_value(dataset_df, column)
+        if value is not None:
+            filter_config[column] = type(filter_config[column])(value)
+    return float(fs), filter_config
+
+@profiler.instrument('training.train_model')
+def train_model(dataset_df, model_type, model=None, artifacts_root=None, model_version=None, fs=None):
+    '''
+    Fit a classifier on all windows of a labeled dataset.
+
+    :param dataset_df: Labeled dataset of build_labeled_datasets() (one model type)
+    :param model_type: 'gait' or 'tremor'
+    :param model: Untrained scikit-learn estimator (default: initialize_model() of the classifier)
+    :param artifacts_root: If given, save the trained model as a model artifact under this directory
+    :param model_version: Version of the saved artifact (required with artifacts_root)
+    :param fs: Sampling rate of the training recordings. Taken from the dataset's 'fs' column by default; a
+    ValueError is raised if the recordings have different sampling rates.
+    :return: trained model
+    '''
+    if artifacts_root is not None:
+        # Validate before fitting: one sampling rate and one builder configuration per artifact
+        fs, filter_config = training_configuration(dataset_df, model_type, fs)
+
+    if model is None:
+        model = INITIALIZE_MODEL[model_type]()
+    feature_columns = FEATURE_SELECTION[model_type]
+    model.fit(dataset_df[feature_columns].values, dataset_df['label'].values)
+
+    if artifacts_root is not None:
+        extra_metadata = {'training_subjects': sorted(str(subject) for subject in dataset_df['subject'].unique()),
+                          'training_windows': int(dataset_df.shape[0])}
+        model_artifact.save_model_artifact(model, artifacts_root, model_type, fs, model_version,
+                                           feature_columns=feature_columns, filter_config=filter_config,
+                                           extra_metadata=extra_metadata)
+    return model
+
+if __name__ == "__main__":
+    '''
+    Main runner building the labeled datasets, cross-validating and training both classifiers.
+    '''
+    recordings_filepath = '' # Insert file path of the recordings table (recording_id, subject, filepath, fs)
+    labels_filepath = '' # Insert file path of the window labels (recording_id, window, gait, tremor)
+    feature_cache_dir = '' # Insert directory of the feature cache
+    artifacts_root = '' # Insert root directory of the model artifacts
+
+    recordings_df = pd.read_csv(recordings_filepath)
+    labels_df = pd.read_csv(labels_filepath)
+
+    datasets = build_labeled_datasets(recordings_df, labels_df, cache_dir=feature_cache_dir)
+    for model_type in ['gait', 'tremor']:
+        print(cross_validate_model(datasets[model_type], model_type).to_string())
+        # Sampling rate and builder configuration are taken from the dataset (one sampling rate per model)
+        train_model(datasets[model_type], model_type, artifacts_root=artifacts_root, model_version='1.0.0')
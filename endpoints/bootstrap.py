@@ -0,0 +1,253 @@
+'''
+This file contains moving block bootstrap confidence intervals for the tremor and bradykinesia endpoints of one
+recording (e.g. one patient-visit).
+
+Consecutive 3 second windows are strongly autocorrelated, so windows are resampled in blocks of block_length
+consecutive windows (moving block bootstrap). All replicates are drawn at once as a (replicates, blocks) matrix of
+block start positions:
+
+- Tremor constancy, percentage of no hand movement and mean hand movement amplitude are ratios of per-window sums.
+  Per-block sums are precomputed with cumulative sums, so each replicate costs one gather of (blocks) values, i.e.
+  thousands of replicates in a few array passes.
+- The tremor amplitude (85th percentile) and smoothness (95th percentile) replicates gather the resampled windows of a
+  chunk of replicates into one array and take the percentile of every row after a single sort.
+- The mean length of no hand movement bouts is computed as calculate_hand_movement_bout_lengths would on every block
+  on its own (block edges end a bout, 'NA' windows are skipped, a bout followed by 'NA' and then hand movement is not
+  counted, excluded windows end a bout). Counted bouts and their windows are precomputed per block start.
+'''
+import numpy as np
+import pandas as pd
+from endpoints import filter_classifier_predictions
+from endpoints import resting_tremor_endpoints
+from endpoints import bradykinesia_endpoints
+from instrumentation import profiler
+
+ENDPOINTS = ['tremor_constancy', 'aggregate_tremor_amplitude', 'aggregate_hand_movement_amplitude',
+             'aggregate_smoothness_of_hand_movement', 'percentage_of_no_hand_movement',
+             'length_of_no_hand_movement_bouts']
+
+def moving_block_starts(n_windows, block_length, n_replicates, random_state=None):
+    '''
+    Draw the block start positions of moving block bootstrap replicates.
+
+    :param n_windows: Number of windows in the recording
+    :param block_length: Number of consecutive windows per block (clipped to n_windows)
+    :param n_replicates: Number of bootstrap replicates
+    :param random_state: Seed (int) or numpy RandomState
+    :return: numpy array of shape (replicates, blocks) of block start positions, block length used
+    '''
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+    block_length = max(1, min(block_length, n_windows))
+    n_blocks = int(np.ceil(n_windows / float(block_length)))
+    starts = random_state.randint(0, n_windows - block_length + 1, size=(n_replicates, n_blocks))
+    return starts, block_length
+
+def _block_sums(values, block_length):
+    # Sum of values[s:s + block_length] for every start s
+    csum = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    return csum[block_length:] - csum[:-block_length]
+
+def bootstrap_ratio(numerator, denominator, starts, block_length):
+    '''
+    Replicates of sum(numerator) / sum(denominator) over the resampled blocks.
+
+    :param numerator: numpy array of per-window numerator values
+    :param denominator: numpy array of per-window denominator values
+    :param starts: block start positions (see moving_block_starts)
+    :param block_length: block length
+    :return: numpy array of replicate values (NaN where the denominator is 0)
+    '''
+    numerator_sums = _block_sums(numerator, block_length)[starts].sum(axis=1)
+    denominator_sums = _block_sums(denominator, block_length)[starts].sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denominator_sums > 0, numerator_sums / denominator_sums, np.nan)
+
+def bootstrap_percentile(values, valid, starts, block_length, percentile, max_chunk_elements=10 ** 7):
+    '''
+    Replicates of the percentile (linear interpolation, as np.percentile) of the valid values in the resampled blocks.
+
+    :param values: numpy array of per-window values
+    :param valid: numpy array of booleans, windows that count for the percentile
+    :param starts: block start positions (see moving_block_starts)
+    :param block_length: block length
+    :param percentile: percentile (0 - 100)
+    :param max_chunk_elements: maximum number of resampled values held at once
+    :return: numpy array of replicate values (NaN for replicates without valid windows)
+    '''
+    # Invalid windows sort to the end of every row
+    filled = np.where(valid, values, np.inf)
+    valid_counts = _block_sums(valid.astype(np.float64), block_length)[starts].sum(axis=1).astype(int)
+
+    n_replicates, n_blocks = starts.shape
+    offsets = np.arange(block_length)
+    chunk_size = max(1, max_chunk_elements // (n_blocks * block_length))
+    replicates = np.full(n_replicates, np.nan)
+    for chunk_start in range(0, n_replicates, chunk_size):
+        chunk = slice(chunk_start, min(chunk_start + chunk_size, n_replicates))
+        indices = (starts[chunk][:, :, np.newaxis] + offsets).reshape(chunk.stop - chunk.start, -1)
+        resampled = np.sort(filled[indices], axis=1)
+
+        counts = valid_counts[chunk]
+        rows = np.arange(len(counts))
+        position = np.maximum(counts - 1, 0) * (percentile / 100.)
+        lower = np.floor(position).astype(int)
+        upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+        fraction = position - lower
+        lower_values = resampled[rows, lower]
+        upper_values = resampled[rows, upper]
+        with np.errstate(invalid='ignore'):
+            chunk_replicates = lower_values + (upper_values - lower_values) * fraction
+        replicates[chunk] = np.where(counts > 0, chunk_replicates, np.nan)
+
+    return replicates
+
+def no_hand_movement_bouts(no_movement, hand_movement_known, break_before):
+    '''
+    Mark the bouts of no hand movement counted by bradykinesia_endpoints.calculate_hand_movement_bout_lengths.
+    Windows with unknown hand movement ('NA') are skipped (they neither end a bout nor add to its length). A bout whose
+    last window is followed by 'NA' windows and then by hand movement is not counted, as in that function; a bout
+    followed directly by hand movement, or only by 'NA' windows up to a break, is.
+
+    :param no_movement: numpy array of booleans, window classified as no hand movement
+    :param hand_movement_known: numpy array of booleans, window has a hand movement prediction (0 or 1)
+    :param break_before: numpy array of booleans, a bout cannot continue into this window (e.g. after an excluded
+    window or at the start of a new recording)
+    :return: numpy arrays bout_starts (1 at the first window of every counted bout) and bout_windows (1 at every no
+    hand movement window of a counted bout). sum(bout_windows) / sum(bout_starts) is the mean bout length.
+    '''
+    known_positions = np.where(hand_movement_known)[0]
+    known_no_movement = no_movement[known_positions]
+    segments = np.cumsum(break_before)[known_positions]
+    same_segment = segments[1:] == segments[:-1]
+
+    # No hand movement and the previous known window without a break in between too -> bout continues
+    continues = np.zeros(len(known_positions), dtype=bool)
+    continues[1:] = known_no_movement[1:] & known_no_movement[:-1] & same_segment
+    starts = known_no_movement & ~continues
+
+    # Last window of a bout: counted unless the next known window of the segment (hand movement) is not adjacent
+    next_adjacent = np.ones(len(known_positions), dtype=bool)
+    next_adjacent[:-1] = ~same_segment | (known_positions[1:] == known_positions[:-1] + 1)
+    ends = known_no_movement & np.concatenate((~continues[1:], [True]))
+    bout_ids = np.cumsum(starts) - 1
+    counted = np.zeros(int(starts.sum()), dtype=bool)
+    counted[bout_ids[ends]] = next_adjacent[ends]
+
+    bout_starts = np.zeros(len(no_movement))
+    bout_starts[known_positions[starts]] = counted[bout_ids[starts]]
+    bout_windows = np.zeros(len(no_movement))
+    bout_windows[known_positions[known_no_movement]] = counted[bout_ids[known_no_movement]]
+    return bout_starts, bout_windows
+
+def _block_bout_sums(no_movement, hand_movement_known, break_before, block_length, max_chunk_elements=10 ** 7):
+    # Per block start: counted bouts and their windows within the block on its own (block edges end a bout)
+    n_block_starts = len(no_movement) - block_length + 1
+    offsets = np.arange(block_length)
+    block_break = np.zeros(block_length, dtype=bool)
+    block_break[0] = True
+    bouts = np.zeros(n_block_starts)
+    bout_windows = np.zeros(n_block_starts)
+    chunk_size = max(1, max_chunk_elements // block_length)
+    for chunk_start in range(0, n_block_starts, chunk_size):
+        block_starts = np.arange(chunk_start, min(chunk_start + chunk_size, n_block_starts))
+        indices = (block_starts[:, np.newaxis] + offsets).ravel()
+        block_ids = np.repeat(np.arange(len(block_starts)), block_length)
+        starts, windows = no_hand_movement_bouts(no_movement[indices], hand_movement_known[indices],
+                                                 break_before[indices] | np.tile(block_break, len(block_starts)))
+        bouts[block_starts] = np.bincount(block_ids, weights=starts, minlength=len(block_starts))
+        bout_windows[block_starts] = np.bincount(block_ids, weights=windows, minlength=len(block_starts))
+    return bouts, bout_windows
+
+def _estimate(endpoint_function, values):
+    values = values[~np.isnan(values)]
+    return endpoint_function(list(values)) if len(values) else np.nan
+
+@profiler.instrument('bootstrap.bootstrap_endpoint_confidence_intervals')
+def bootstrap_endpoint_confidence_intervals(filtered_predictions_df, n_replicates=2000, block_length=100,
+                                            confidence_level=0.95, random_state=None, max_chunk_elements=10 ** 7):
+    '''
+    Moving block bootstrap confidence intervals of every tremor and bradykinesia endpoint of one recording.
+
+    :param filtered_predictions_df: Pandas DataFrame as returned by filter_classifier_predictions.filter_predictions_by_tree()
+    (one row per window, in time order)
+    :param n_replicates: Number of bootstrap replicates
+    :param block_length: Number of consecutive windows per block (100 windows = 5 minutes)
+    :param confidence_level: Confidence level of the percentile intervals
+    :param random_state: Seed (int) or numpy RandomState
+    :param max_chunk_elements: Maximum number of resampled values held at once by the percentile endpoints
+    :return: Pandas DataFrame with one row per endpoint and columns ['endpoint', 'estimate', 'ci_lower', 'ci_upper',
+    'standard_error', 'windows']
+    '''
+    excluded = np.array([filter_classifier_predictions.is_excluded(value)
+                         for value in filtered_predictions_df.hand_movement_predictions], dtype=bool)
+    predictions_df = filtered_predictions_df[~excluded]
+    n_windows = predictions_df.shape[0]
+
+    columns = ['endpoint', 'estimate', 'ci_lower', 'ci_upper', 'standard_error', 'windows']
+    if n_windows == 0:
+        return pd.DataFrame([[endpoint, np.nan, np.nan, np.nan, np.nan, 0] for endpoint in ENDPOINTS], columns=columns)
+
+    # Per window numeric values ('NA' -> NaN)
+    tremor = pd.to_numeric(predictions_df.tremor_classifier_predictions, errors='coerce').values
+    tremor_amplitude = pd.to_numeric(predictions_df.tremor_amplitude_predictions, errors='coerce').values
+    hand_movement = pd.to_numeric(predictions_df.hand_movement_predictions, errors='coerce').values
+    hand_movement_amplitude = pd.to_numeric(predictions_df.hand_movement_amplitude, errors='coerce').values
+    hand_movement_jerk = pd.to_numeric(predictions_df.hand_movement_jerk, errors='coerce').values
+
+    no_movement = hand_movement == 0
+    hand_movement_known = ~np.isnan(hand_movement)
+    # Excluded windows were removed; the window after them starts a new bout
+    break_before = np.concatenate(([False], excluded[:-1]))[~excluded]
+    all_windows = np.ones(n_windows)
+
+    starts, block_length = moving_block_starts(n_windows, block_length, n_replicates, random_state)
+
+    # Mean bout length = windows of counted bouts / counted bouts, each block counted on its own
+    block_bouts, block_bout_windows = _block_bout_sums(no_movement, hand_movement_known, break_before, block_length,
+                                                       max_chunk_elements)
+    bouts = block_bouts[starts].sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bout_replicates = np.where(bouts > 0, block_bout_windows[starts].sum(axis=1) / np.maximum(bouts, 1), np.nan)
+
+    replicates = {
+        'tremor_constancy': bootstrap_ratio((tremor == 1).astype(float), all_windows, starts, block_length) * 100.,
+        'aggregate_tremor_amplitude': bootstrap_percentile(tremor_amplitude, ~np.isnan(tremor_amplitude), starts,
+                                                           block_length, 85, max_chunk_elements),
+        'aggregate_hand_movement_amplitude': bootstrap_ratio(np.nan_to_num(hand_movement_amplitude),
+                                                             (~np.isnan(hand_movement_amplitude)).astype(float),
+                                                             starts, block_length),
+        'aggregate_smoothness_of_hand_movement': bootstrap_percentile(hand_movement_jerk,
+                                                                      ~np.isnan(hand_movement_jerk), starts,
+                                                                      block_length, 95, max_chunk_elements),
+        'percentage_of_no_hand_movement': bootstrap_ratio(no_movement.astype(float), all_windows, starts,
+                                                          block_length) * 100.,
+        'length_of_no_hand_movement_bouts': bout_replicates}
+
+    # Point estimates from the endpoint functions
+    estimates = {
+        'tremor_constancy': resting_tremor_endpoints.compute_tremor_constancy(
+            filtered_predictions_df.tremor_classifier_predictions.tolist()),
+        'aggregate_tremor_amplitude': _estimate(resting_tremor_endpoints.compute_aggregate_tremor_amplitude,
+                                                tremor_amplitude),
+        'aggregate_hand_movement_amplitude': _estimate(bradykinesia_endpoints.compute_aggregate_hand_movement_amplitude,
+                                                       hand_movement_amplitude),
+        'aggregate_smoothness_of_hand_movement': _estimate(
+            bradykinesia_endpoints.compute_aggregate_smoothness_of_hand_movement, hand_movement_jerk),
+        'percentage_of_no_hand_movement': bradykinesia_endpoints.compute_aggregate_percentage_of_no_hand_movement(
+            filtered_predictions_df.hand_movement_predictions.tolist()),
+        'length_of_no_hand_movement_bouts': bradykinesia_endpoints.compute_aggregate_length_of_no_hand_movement_bouts(
+            filtered_predictions_df.hand_movement_predictions.tolist())}
+
+    alpha = 1 - confidence_level
+    rows = []
+    for endpoint in ENDPOINTS:
+        endpoint_replicates = replicates[endpoint][~np.isnan(replicates[endpoint])]
+        if len(endpoint_replicates):
+            ci_lower, ci_upper = np.percentile(endpoint_replicates, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+            standard_error = np.std(endpoint_replicates, ddof=1) if len(endpoint_replicates) > 1 else np.nan
+        else:
+            ci_lower, ci_upper, standard_error = np.nan, np.nan, np.nan
+        rows.append([endpoint, estimates[endpoint], ci_lower, ci_upper, standard_error, n_windows])
+
+    return pd.DataFrame(rows, columns=columns)
@@ -9,37 +9,62 @@ The endpoints are:
 4. Average length of bouts with no hand movement
 '''
 import numpy as np
+from endpoints import filter_classifier_predictions
+from instrumentation import profiler
 
+@profiler.instrument('bradykinesia_endpoints.compute_aggregate_hand_movement_amplitude')
 def compute_aggregate_hand_movement_amplitude(hand_movement_amplitudes):
     '''
     Compute aggregate measures of hand movement amplitude.
     :param hand_movement_amplitudes: Computed hand movement amplitudes (list)
-    :return: Average hand movement amplitude
+    :return: Average hand movement amplitude (excluded windows are left out)
     '''
+    hand_movement_amplitudes = filter_classifier_predictions.drop_excluded(hand_movement_amplitudes)
     return np.mean(hand_movement_amplitudes)
 
+@profiler.instrument('bradykinesia_endpoints.compute_aggregate_smoothness_of_hand_movement')
 def compute_aggregate_smoothness_of_hand_movement(hand_movement_jerk_predictions):
     '''
     Compute aggregate measures of smoothness of hand movement (jerk metric).
     :param hand_movement_jerk_predictions: Computed jerk metrics (list)
-    :return: 95th percentile of jerk
+    :return: 95th percentile of jerk (excluded windows are left out)
     '''
+    hand_movement_jerk_predictions = filter_classifier_predictions.drop_excluded(hand_movement_jerk_predictions)
     return np.percentile(hand_movement_jerk_predictions, 95)
 
+@profiler.instrument('bradykinesia_endpoints.compute_aggregate_percentage_of_no_hand_movement')
 def compute_aggregate_percentage_of_no_hand_movement(hand_movement_predictions):
     '''
     Compute aggregate value of percentage of no hand movement.
     :param hand_movement_predictions: Predicted hand movement - binary predictions (1 = hand movement, 0 = no hand movement).
-    :return: Percentage of no hand movement
+    :return: Percentage of no hand movement (excluded windows are left out)
     '''
+    hand_movement_predictions = filter_classifier_predictions.drop_excluded(hand_movement_predictions)
     return (hand_movement_predictions.count(0)/float(len(hand_movement_predictions)))*100.
 
+@profiler.instrument('bradykinesia_endpoints.calculate_hand_movement_bout_lengths')
 def calculate_hand_movement_bout_lengths(data):
     '''
     Calculate bout lengths of no hand movement and hand movement
-    :param data: Predicted hand movement - binary predictions (1 = hand movement, 0 = no hand movement).
+    :param data: Predicted hand movement - binary predictions (1 = hand movement, 0 = no hand movement). Excluded
+    windows end a bout.
     :return: bout lengths of no hand movement (list), bout lengths of hand movement (list)
     '''
+    if any(filter_classifier_predictions.is_excluded(i) for i in data):
+        # Count bouts separately in each run of windows between excluded windows
+        no_hand_movement_bouts = []
+        hand_movement_bouts = []
+        segment = []
+        for i in list(data) + [filter_classifier_predictions.EXCLUDED]:
+            if filter_classifier_predictions.is_excluded(i):
+                segment_bouts = calculate_hand_movement_bout_lengths(segment)
+                no_hand_movement_bouts += segment_bouts[0]
+                hand_movement_bouts += segment_bouts[1]
+                segment = []
+            else:
+                segment.append(i)
+        return no_hand_movement_bouts, hand_movement_bouts
+
     count_0 = 0
     count_1 = 0
     no_hand_movement_bouts = []
@@ -66,6 +91,7 @@ def calculate_hand_movement_bout_lengths(data):
 
     return no_hand_movement_bouts, hand_movement_bouts
 
+@profiler.instrument('bradykinesia_endpoints.compute_aggregate_length_of_no_hand_movement_bouts')
 def compute_aggregate_length_of_no_hand_movement_bouts(hand_movement_predictions):
     '''
     Compute aggregate length of no hand movement bouts
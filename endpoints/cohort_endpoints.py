@@ -0,0 +1,168 @@
+'''
+This file contains the cohort-scale endpoint engine. It computes every tremor and bradykinesia endpoint for every group
+(e.g. subject x visit x day) of one long-format table of filtered predictions in a single vectorized group-by pass,
+instead of calling the endpoint functions per recording.
+
+Input table: one row per window with the group columns, a window time column and the columns returned by
+filter_classifier_predictions.filter_predictions_by_tree() ('NA' and 'excluded' entries as produced there):
+
+    subject | visit | window_time | tremor_classifier_predictions | tremor_amplitude_predictions |
+    hand_movement_predictions | hand_movement_amplitude | hand_movement_jerk
+
+The table can be passed as an iterable of chunks (e.g. pd.read_csv(filepath, chunksize=10 ** 6)) ordered by group.
+Each chunk is processed on its own and only the rows of the last (possibly incomplete) group are carried over to the
+next chunk, so memory follows the chunk size and the largest group rather than the size of the study.
+
+Endpoint definitions follow resting_tremor_endpoints and bradykinesia_endpoints: constancy and percentage of no hand
+movement over all non-excluded windows, tremor amplitude, hand movement amplitude and smoothness over the windows
+with a value, bouts of no hand movement as counted by calculate_hand_movement_bout_lengths ('NA' windows skipped, a
+bout followed by 'NA' and then hand movement not counted) ending at excluded windows and group edges.
+validation/endpoint_equivalence.py checks every endpoint group by group against the per-recording functions.
+'''
+import numpy as np
+import pandas as pd
+from endpoints import filter_classifier_predictions
+from endpoints import bootstrap
+from instrumentation import profiler
+
+ENDPOINT_COLUMNS = ['windows', 'excluded_windows', 'tremor_constancy', 'aggregate_tremor_amplitude',
+                    'aggregate_hand_movement_amplitude', 'aggregate_smoothness_of_hand_movement',
+                    'percentage_of_no_hand_movement', 'length_of_no_hand_movement_bouts',
+                    'number_of_no_hand_movement_bouts', 'max_length_of_no_hand_movement_bouts']
+
+def grouped_percentile(values, group_codes, n_groups, percentile):
+    '''
+    Percentile (linear interpolation, as np.percentile) of the non-NaN values of every group after one sort.
+
+    :param values: numpy array of values
+    :param group_codes: numpy array of group codes (0 ... n_groups - 1) of values
+    :param n_groups: number of groups
+    :param percentile: percentile (0 - 100)
+    :return: numpy array of percentiles per group (NaN for groups without values)
+    '''
+    valid = ~np.isnan(values)
+    values = values[valid]
+    group_codes = group_codes[valid]
+
+    order = np.lexsort((values, group_codes))
+    sorted_values = values[order]
+    counts = np.bincount(group_codes, minlength=n_groups)
+    offsets = np.cumsum(counts) - counts
+
+    result = np.full(n_groups, np.nan)
+    has_values = counts > 0
+    position = (counts[has_values] - 1) * (percentile / 100.)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, counts[has_values] - 1)
+    fraction = position - lower
+    lower_values = sorted_values[offsets[has_values] + lower]
+    upper_values = sorted_values[offsets[has_values] + upper]
+    result[has_values] = lower_values + (upper_values - lower_values) * fraction
+    return result
+
+def _ratio(numerator, denominator):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1e-300), np.nan)
+
+def _chunk_endpoints(chunk_df, group_columns, time_column):
+    sort_columns = group_columns + ([time_column] if time_column in chunk_df.columns else [])
+    chunk_df = chunk_df.sort_values(sort_columns, kind='mergesort')
+
+    group_codes = chunk_df.groupby(group_columns, sort=False).ngroup().values
+    groups_df = chunk_df[group_columns].drop_duplicates().reset_index(drop=True)
+    n_groups = groups_df.shape[0]
+
+    # Excluded windows: EXCLUDED or NaN (filter_classifier_predictions.is_excluded)
+    excluded = (chunk_df.hand_movement_predictions.isin([filter_classifier_predictions.EXCLUDED]).values |
+                chunk_df.hand_movement_predictions.isnull().values)
+    tremor = pd.to_numeric(chunk_df.tremor_classifier_predictions, errors='coerce').values
+    tremor_amplitude = pd.to_numeric(chunk_df.tremor_amplitude_predictions, errors='coerce').values
+    hand_movement = pd.to_numeric(chunk_df.hand_movement_predictions, errors='coerce').values
+    hand_movement_amplitude = pd.to_numeric(chunk_df.hand_movement_amplitude, errors='coerce').values
+    hand_movement_jerk = pd.to_numeric(chunk_df.hand_movement_jerk, errors='coerce').values
+
+    def group_sum(weights):
+        return np.bincount(group_codes, weights=weights.astype(np.float64), minlength=n_groups)
+
+    windows = np.bincount(group_codes, minlength=n_groups).astype(np.float64)
+    excluded_windows = group_sum(excluded)
+    included_windows = windows - excluded_windows
+
+    endpoints_df = groups_df
+    endpoints_df['windows'] = windows.astype(int)
+    endpoints_df['excluded_windows'] = excluded_windows.astype(int)
+    endpoints_df['tremor_constancy'] = _ratio(group_sum(tremor == 1), included_windows) * 100.
+    endpoints_df['aggregate_tremor_amplitude'] = grouped_percentile(tremor_amplitude, group_codes, n_groups, 85)
+    endpoints_df['aggregate_hand_movement_amplitude'] = _ratio(group_sum(np.nan_to_num(hand_movement_amplitude)),
+                                                               group_sum(~np.isnan(hand_movement_amplitude)))
+    endpoints_df['aggregate_smoothness_of_hand_movement'] = grouped_percentile(hand_movement_jerk, group_codes,
+                                                                               n_groups, 95)
+    no_movement = hand_movement == 0
+    endpoints_df['percentage_of_no_hand_movement'] = _ratio(group_sum(no_movement), included_windows) * 100.
+
+    # Bouts of no hand movement counted by calculate_hand_movement_bout_lengths: a new group or an excluded window
+    # ends a bout
+    break_before = np.ones(len(group_codes), dtype=bool)
+    break_before[1:] = (group_codes[1:] != group_codes[:-1]) | excluded[:-1]
+    bout_starts, bout_windows = bootstrap.no_hand_movement_bouts(no_movement, ~np.isnan(hand_movement), break_before)
+    number_of_bouts = group_sum(bout_starts)
+    endpoints_df['length_of_no_hand_movement_bouts'] = _ratio(group_sum(bout_windows), number_of_bouts)
+    endpoints_df['number_of_no_hand_movement_bouts'] = number_of_bouts.astype(int)
+
+    # Bout lengths: windows per counted bout (bouts are numbered in row order)
+    bout_ids = np.cumsum(bout_starts).astype(int) - 1
+    bout_lengths = np.bincount(bout_ids[bout_windows == 1], minlength=int(number_of_bouts.sum()))
+    bout_groups = group_codes[bout_starts == 1]
+    max_bout_lengths = pd.Series(bout_lengths).groupby(bout_groups).max().reindex(np.arange(n_groups))
+    endpoints_df['max_length_of_no_hand_movement_bouts'] = max_bout_lengths.values
+
+    return endpoints_df
+
+@profiler.instrument('cohort_endpoints.compute_cohort_endpoints')
+def compute_cohort_endpoints(predictions, group_columns=['subject', 'visit'], time_column='window_time'):
+    '''
+    Compute all tremor and bradykinesia endpoints for every group of a long-format table of filtered predictions.
+
+    :param predictions: Pandas DataFrame or iterable of Pandas DataFrame chunks (ordered by group) with the group
+    columns, time_column and the columns of filter_classifier_predictions.filter_predictions_by_tree()
+    :param group_columns: Columns identifying a group (Ex: ['subject', 'visit', 'day'])
+    :param time_column: Column ordering the windows of a group (input order is kept if the column is missing)
+    :return: Pandas DataFrame with one row per group: group columns + ENDPOINT_COLUMNS
+    '''
+    if isinstance(predictions, pd.DataFrame):
+        predictions = [predictions]
+
+    results = []
+    carry_df = None
+    for chunk_df in predictions:
+        if carry_df is not None:
+            chunk_df = pd.concat([carry_df, chunk_df], ignore_index=True)
+        if chunk_df.shape[0] == 0:
+            continue
+
+        # Hold back the last group of the chunk; it may continue in the next chunk (the chunks are ordered by group, so
+        # only the previous chunk's last group can continue and no set of completed groups is kept)
+        last_key = tuple(chunk_df[group_columns].iloc[-1].values)
+        is_last_group = (chunk_df[group_columns].values == np.array(last_key, dtype=object)).all(axis=1)
+        carry_df = chunk_df[is_last_group]
+        complete_df = chunk_df[~is_last_group]
+
+        if complete_df.shape[0]:
+            results.append(_chunk_endpoints(complete_df, group_columns, time_column))
+
+    if carry_df is not None and carry_df.shape[0]:
+        results.append(_chunk_endpoints(carry_df, group_columns, time_column))
+
+    if not results:
+        return pd.DataFrame(columns=group_columns + ENDPOINT_COLUMNS)
+    return pd.concat(results, ignore_index=True)[group_columns + ENDPOINT_COLUMNS]
+
+if __name__ == "__main__":
+    '''
+    Main runner of the cohort endpoint engine on a long-format .CSV file of filtered predictions.
+    '''
+    predictions_filepath = '' # Insert file path of filtered predictions (one row per window)
+
+    cohort_endpoints_df = compute_cohort_endpoints(pd.read_csv(predictions_filepath, chunksize=10 ** 6),
+                                                   group_columns=['subject', 'visit'])
+    print(cohort_endpoints_df.to_string())
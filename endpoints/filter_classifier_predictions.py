@@ -10,14 +10,43 @@ gait classifier   tremor classifier
     |NO             |YES
 bradykinesia      tremor
 assessment        assessment
+
+Windows flagged by the signal-quality gate (signal_preprocessing/quality_gate.py) are reported as EXCLUDED in every
+output and left out by the endpoint functions. Per-window NaN's (how detect_hand_movement(), the amplitude functions and
+the parameter sweep return skipped windows) are treated as excluded as well, so unfiltered outputs can be passed to the
+endpoint functions directly.
 '''
+import numpy as np
 import pandas as pd
+from instrumentation import profiler
+
+# Prediction of windows skipped by the signal-quality gate (non-wear, clipping, flat line, gap)
+EXCLUDED = 'excluded'
+
+def is_excluded(prediction):
+    '''
+    :param prediction: filtered prediction of one window
+    :return: True if the window was excluded by the signal-quality gate (EXCLUDED or a float NaN)
+    '''
+    if isinstance(prediction, (float, np.floating)):
+        return bool(np.isnan(prediction))
+    return isinstance(prediction, type(EXCLUDED)) and prediction == EXCLUDED
+
+def drop_excluded(predictions):
+    '''
+    :param predictions: filtered predictions (list)
+    :return: predictions without the excluded windows (list)
+    '''
+    return [prediction for prediction in predictions if not is_excluded(prediction)]
 
+@profiler.instrument('filter_classifier_predictions.filter_predictions_by_tree')
 def filter_predictions_by_tree(algorithm_predictions):
     '''
     Filter out predictions based on context.
 
     :param algorithm_predictions: Pandas DataFrame with following columns = ['hand_movement', 'gait', 'tremor_constancy', 'tremor_amplitude', 'hand_movement_amplitude', 'hand_movement_jerk']
+    and optionally 'excluded' (quality_gate.assess_window_quality(...).excluded). Windows with excluded = True or a NaN
+    hand movement prediction are reported as EXCLUDED.
     :return: Pandas DataFrame of filtered predictions based on context.
     '''
     t_c_filtered = []
@@ -34,7 +63,13 @@ def filter_predictions_by_tree(algorithm_predictions):
         brady_amp_p = row.hand_movement_amplitude
         brady_j_p = row.hand_movement_jerk
 
-        if hm_p == 0:
+        if getattr(row, 'excluded', False) or (isinstance(hm_p, float) and np.isnan(hm_p)):
+            t_c_filtered.append(EXCLUDED)
+            t_a_filtered.append(EXCLUDED)
+            h_m_filtered.append(EXCLUDED)
+            b_a_filtered.append(EXCLUDED)
+            b_j_filtered.append(EXCLUDED)
+        elif hm_p == 0:
             b_a_filtered.append('NA')
             b_j_filtered.append('NA')
             h_m_filtered.append(hm_p)
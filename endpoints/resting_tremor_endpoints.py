@@ -4,19 +4,25 @@ This file contains code to generate endpoints from resting tremor classifiers. T
 2. Tremor Amplitude
 '''
 import numpy as np
+from endpoints import filter_classifier_predictions
+from instrumentation import profiler
 
+@profiler.instrument('resting_tremor_endpoints.compute_tremor_constancy')
 def compute_tremor_constancy(tremor_classification_predictions):
     '''
     Compute tremor constancy for a given set of tremor predictions.
     :param tremor_classification_predictions: Tremor predictions as determined by tremor classifier. Binary predictions (1 = tremor, 0 = no tremor)
-    :return: Percentage of detected tremor
+    :return: Percentage of detected tremor (excluded windows are left out)
     '''
+    tremor_classification_predictions = filter_classifier_predictions.drop_excluded(tremor_classification_predictions)
     return tremor_classification_predictions.count(1)/float(len(tremor_classification_predictions))*100.
 
+@profiler.instrument('resting_tremor_endpoints.compute_aggregate_tremor_amplitude')
 def compute_aggregate_tremor_amplitude(tremor_amplitude_predictions):
     '''
     Compute an aggregate measure of tremor amplitude for a given set of tremor amplitude predictions.
     :param tremor_amplitude_predictions: Computed tremor amplitude
-    :return: 85th percentile of tremor amplitude predictions.
+    :return: 85th percentile of tremor amplitude predictions (excluded windows are left out).
     '''
+    tremor_amplitude_predictions = filter_classifier_predictions.drop_excluded(tremor_amplitude_predictions)
     return np.percentile(tremor_amplitude_predictions, 85)
\ No newline at end of file
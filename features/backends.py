@@ -0,0 +1,214 @@
+'''
+This file houses the compute backends of the feature kernels that do not vectorize cleanly: the histogram entropy
+estimate of signal_entropy(), the sign-change count of mean_cross_rate() and the rolling mean / standard deviation
+(with shrinking windows at the edges) used by the hand movement classifier.
+
+numpy: portable reference implementation (default)
+numba: the same kernels as JIT-compiled loops, available when numba is installed
+
+The backend is selected at runtime with set_backend('numpy' | 'numba' | 'auto') or the FEATURE_BACKEND environment
+variable ('auto' picks numba when installed). validation/backend_conformance.py checks every kernel of every available
+backend against the original per-sample loops.
+'''
+from collections import OrderedDict
+import os
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+def _edge_bounds(n_samples, window_length):
+    # Window of sample i is x[max(i - half, 0):min(i + half, n)]
+    half = window_length // 2
+    idx = np.arange(n_samples)
+    return np.maximum(idx - half, 0), np.minimum(idx + half, n_samples)
+
+class NumpyBackend(object):
+    '''
+    Vectorized NumPy implementation of the feature kernels.
+    '''
+    name = 'numpy'
+
+    def histogram_entropy(self, h, lowerbound, upperbound):
+        '''
+        Bias corrected (and range stretched) entropy estimate of a histogram.
+
+        :param h: numpy array of histogram bin counts
+        :param lowerbound: lower edge of histogram
+        :param upperbound: upper edge of histogram
+        :return: entropy estimate
+        '''
+        h = np.asarray(h, dtype=np.float64)
+        ncell = len(h)
+        count = h.sum()
+
+        logf = np.zeros(ncell)
+        logf[h != 0] = np.log(h[h != 0])
+        estimate = -np.sum(h * logf)
+
+        nbias = -(float(ncell) - 1) / (2 * count)
+        estimate = estimate / count
+        estimate = estimate + np.log(count) + np.log((upperbound - lowerbound) / ncell) - nbias
+
+        # Scale the entropy estimate to stretch the range
+        return np.exp(estimate ** 2) - np.exp(0) - 1
+
+    def sign_change_count(self, x):
+        '''
+        :param x: 1-D numpy array
+        :return: number of consecutive samples with a different sign (NaN's count as a change)
+        '''
+        x = np.asarray(x)
+        signs = np.sign(x)
+        return int(np.count_nonzero(signs[:-1] != signs[1:]))
+
+    def rolling_mean(self, x, window_length):
+        '''
+        :param x: 1-D numpy array
+        :param window_length: odd window length; sample i averages x[max(i - half, 0):min(i + half, len(x))]
+        :return: numpy array of rolling mean values
+        '''
+        x = np.asarray(x, dtype=np.float64)
+        lo, hi = _edge_bounds(len(x), window_length)
+        # Cumulative sums of the mean removed signal keep the round-off small on long recordings
+        offset = np.mean(x) if len(x) else 0.0
+        csum = np.concatenate(([0.0], np.cumsum(x - offset)))
+        return (csum[hi] - csum[lo]) / (hi - lo) + offset
+
+    def rolling_std(self, x, window_length):
+        '''
+        :param x: 1-D numpy array
+        :param window_length: odd window length; same windows as rolling_mean
+        :return: numpy array of rolling (population) standard deviation values
+        '''
+        x = np.asarray(x, dtype=np.float64)
+        lo, hi = _edge_bounds(len(x), window_length)
+        offset = np.mean(x) if len(x) else 0.0
+        centered = x - offset
+        csum = np.concatenate(([0.0], np.cumsum(centered)))
+        csum_squared = np.concatenate(([0.0], np.cumsum(centered ** 2)))
+        counts = hi - lo
+        mean = (csum[hi] - csum[lo]) / counts
+        variance = (csum_squared[hi] - csum_squared[lo]) / counts - mean ** 2
+        return np.sqrt(np.maximum(variance, 0.0))
+
+_BACKENDS = OrderedDict([('numpy', NumpyBackend())])
+
+if numba is not None:
+
+    @numba.njit(cache=True)
+    def _numba_histogram_entropy(h, lowerbound, upperbound):
+        ncell = h.shape[0]
+        estimate = 0.0
+        count = 0.0
+        for n in range(ncell):
+            if h[n] != 0:
+                estimate -= h[n] * np.log(h[n])
+            count += h[n]
+
+        nbias = -(ncell - 1.0) / (2 * count)
+        estimate = estimate / count
+        estimate = estimate + np.log(count) + np.log((upperbound - lowerbound) / ncell) - nbias
+        return np.exp(estimate ** 2) - np.exp(0.0) - 1
+
+    @numba.njit(cache=True)
+    def _numba_sign_change_count(x):
+        changes = 0
+        for i in range(x.shape[0] - 1):
+            if np.sign(x[i]) != np.sign(x[i + 1]):
+                changes += 1
+        return changes
+
+    @numba.njit(cache=True)
+    def _numba_rolling_moments(x, window_length, compute_std):
+        n = x.shape[0]
+        half = window_length // 2
+        offset = 0.0
+        for i in range(n):
+            offset += x[i]
+        if n > 0:
+            offset /= n
+
+        y = np.empty(n)
+        total = 0.0
+        total_squared = 0.0
+        lo = 0
+        hi = 0
+        for i in range(n):
+            new_lo = max(i - half, 0)
+            new_hi = min(i + half, n)
+            # Windows only move forward: add the samples entering and remove the samples leaving
+            while hi < new_hi:
+                value = x[hi] - offset
+                total += value
+                total_squared += value * value
+                hi += 1
+            while lo < new_lo:
+                value = x[lo] - offset
+                total -= value
+                total_squared -= value * value
+                lo += 1
+
+            count = hi - lo
+            mean = total / count if count > 0 else np.nan
+            if compute_std:
+                variance = total_squared / count - mean * mean if count > 0 else np.nan
+                y[i] = np.sqrt(variance) if variance > 0 else (0.0 if count > 0 else np.nan)
+            else:
+                y[i] = mean + offset
+        return y
+
+    class NumbaBackend(NumpyBackend):
+        '''
+        JIT-compiled loop implementation of the feature kernels (compiled on first call, cached on disk).
+        '''
+        name = 'numba'
+
+        def histogram_entropy(self, h, lowerbound, upperbound):
+            return _numba_histogram_entropy(np.asarray(h, dtype=np.float64), float(lowerbound), float(upperbound))
+
+        def sign_change_count(self, x):
+            return int(_numba_sign_change_count(np.ascontiguousarray(x, dtype=np.float64)))
+
+        def rolling_mean(self, x, window_length):
+            return _numba_rolling_moments(np.ascontiguousarray(x, dtype=np.float64), int(window_length), False)
+
+        def rolling_std(self, x, window_length):
+            return _numba_rolling_moments(np.ascontiguousarray(x, dtype=np.float64), int(window_length), True)
+
+    _BACKENDS['numba'] = NumbaBackend()
+
+def available_backends():
+    '''
+    :return: names of the backends that can be used in this environment
+    '''
+    return list(_BACKENDS.keys())
+
+def get_backend(name=None):
+    '''
+    :param name: backend name (default: currently selected backend)
+    :return: backend object with the kernels histogram_entropy, sign_change_count, rolling_mean and rolling_std
+    '''
+    if name is None:
+        return _ACTIVE_BACKEND
+    if name == 'auto':
+        return _BACKENDS['numba'] if 'numba' in _BACKENDS else _BACKENDS['numpy']
+    if name not in _BACKENDS:
+        raise ValueError('Feature backend %s is not available (available: %s)' % (name, ', '.join(_BACKENDS)))
+    return _BACKENDS[name]
+
+def set_backend(name):
+    '''
+    Select the backend used by the feature functions.
+
+    :param name: 'numpy', 'numba' or 'auto'
+    :return: selected backend object
+    '''
+    global _ACTIVE_BACKEND
+    _ACTIVE_BACKEND = get_backend(name)
+    return _ACTIVE_BACKEND
+
+_ACTIVE_BACKEND = _BACKENDS['numpy']
+set_backend(os.environ.get('FEATURE_BACKEND', 'numpy'))
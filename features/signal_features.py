@@ -2,12 +2,17 @@
 This file houses functions to compute signal features based on accelerometer data.
 '''
 
+from collections import OrderedDict
 from statsmodels.tsa.stattools import acf
 from scipy import stats
 import tsfresh as tsf
 import numpy as np
 import pandas as pd
+from signal_preprocessing import preprocess
+from features import backends
+from instrumentation import profiler
 
+@profiler.instrument('signal_features.histogram')
 def histogram(signal_x):
     '''
     Calculate histogram of sensor signal.
@@ -32,6 +37,7 @@ def histogram(signal_x):
 
     return h[0], descriptor
 
+@profiler.instrument('signal_features.signal_entropy')
 def signal_entropy(signal_df, channels):
     '''
     Calculate signal entropy of sensor signals.
@@ -48,33 +54,15 @@ def signal_entropy(signal_df, channels):
 
         lowerbound = d[0]
         upperbound = d[1]
-        ncell = int(d[2])
 
-        estimate = 0
-        sigma = 0
-        count = 0
-
-        for n in range(ncell):
-            if h[n] != 0:
-                logf = np.log(h[n])
-            else:
-                logf = 0
-            count = count + h[n]
-            estimate = estimate - h[n] * logf
-            sigma = sigma + h[n] * logf ** 2
-
-        nbias = -(float(ncell) - 1) / (2 * count)
-
-        estimate = estimate / count
-        estimate = estimate + np.log(count) + np.log((upperbound - lowerbound) / ncell) - nbias
-
-        # Scale the entropy estimate to stretch the range
-        estimate = np.exp(estimate ** 2) - np.exp(0) - 1
+        # Bias corrected entropy estimate of the histogram (see features/backends.py)
+        estimate = backends.get_backend().histogram_entropy(h, lowerbound, upperbound)
 
         signal_entropy_df[channel + '_signal_entropy'] = [estimate]
 
     return signal_entropy_df
 
+@profiler.instrument('signal_features.correlation_coefficient')
 def correlation_coefficient(signal_df, channels):
     '''
     Calculate correlation coefficient of sensor signals.
@@ -92,6 +80,7 @@ def correlation_coefficient(signal_df, channels):
     return corr_coef_df
 
 
+@profiler.instrument('signal_features.signal_rms')
 def signal_rms(signal_df, channels):
     '''
     Calculate root mean square of sensor signals.
@@ -107,6 +96,7 @@ def signal_rms(signal_df, channels):
 
     return rms_df
 
+@profiler.instrument('signal_features.signal_range')
 def signal_range(signal_df, channels):
     '''
     Calculate range of sensor signals.
@@ -122,6 +112,7 @@ def signal_range(signal_df, channels):
 
     return range_df
 
+@profiler.instrument('signal_features.iqr_of_autocovariance')
 def iqr_of_autocovariance(signal_df, channels):
     '''
     Calculate interquartile range of autocovariance of sensor signals.
@@ -139,6 +130,7 @@ def iqr_of_autocovariance(signal_df, channels):
 
     return autocov_range_df
 
+@profiler.instrument('signal_features.dominant_frequency')
 def dominant_frequency(signal_df, sampling_rate, cutoff, channels):
     '''
     Calculate dominant frequency of sensor signals.
@@ -154,16 +146,11 @@ def dominant_frequency(signal_df, sampling_rate, cutoff, channels):
     for channel in channels:
         signal_x = signal_df[channel]
 
-        padfactor = 1
-        dim = signal_x.shape
-        nfft = 2 ** ((dim[0] * padfactor).bit_length())
-
-        freq_hat = np.fft.fftfreq(nfft) * sampling_rate
-        freq = freq_hat[0:nfft / 2]
-
-        idx1 = freq <= cutoff
-        idx_cutoff = np.argwhere(idx1)
-        freq = freq[idx_cutoff]
+        # FFT length and frequency bins are cached per (window samples, sampling rate, cutoff)
+        fft_plan = preprocess.get_fft_plan(signal_x.shape[0], sampling_rate, cutoff)
+        nfft = fft_plan.nfft
+        idx_cutoff = fft_plan.cutoff_indices
+        freq = fft_plan.frequencies
 
         sp_hat = np.fft.fft(signal_x, nfft)
         sp = sp_hat[0:nfft / 2] * np.conjugate(sp_hat[0:nfft / 2])
@@ -200,6 +187,7 @@ def dominant_frequency(signal_df, sampling_rate, cutoff, channels):
 
     return dominant_freq_df
 
+@profiler.instrument('signal_features.mean_cross_rate')
 def mean_cross_rate(signal_df, channels):
     '''
     Compute mean cross rate of sensor signals.
@@ -212,11 +200,7 @@ def mean_cross_rate(signal_df, channels):
     signal_df_mean = signal_df[channels] - signal_df[channels].mean()
 
     for channel in channels:
-        MCR = 0
-
-        for i in range(len(signal_df_mean) - 1):
-            if np.sign(signal_df_mean.loc[i, channel]) != np.sign(signal_df_mean.loc[i + 1, channel]):
-                MCR += 1
+        MCR = backends.get_backend().sign_change_count(signal_df_mean[channel].values)
 
         MCR = float(MCR) / len(signal_df_mean)
 
@@ -224,6 +208,7 @@ def mean_cross_rate(signal_df, channels):
 
     return mean_cross_rate_df
 
+@profiler.instrument('signal_features.range_count_percentage')
 def range_count_percentage(signal_df, channels, min_value=-1, max_value=1):
     '''
     Calculate range count percentage of sensor signals.
@@ -243,6 +228,7 @@ def range_count_percentage(signal_df, channels, min_value=-1, max_value=1):
 
     return range_count_df
 
+@profiler.instrument('signal_features.jerk_metric')
 def jerk_metric(signal_df, sampling_rate, channels):
     '''
     Calculate jerk of sensor signals.
@@ -269,4 +255,114 @@ def jerk_metric(signal_df, sampling_rate, channels):
 
         jerk_ratio_df[channel + '_jerk_ratio'] = [mean_squared_jerk / scale]
 
-    return jerk_ratio_df
\ No newline at end of file
+    return jerk_ratio_df
+
+def stack_windows(channel_data, bounds, max_windows=4096):
+    '''
+    Group windows of equal length into stacks that can be passed to the batched feature kernels.
+
+    :param channel_data: numpy array of shape (channels, samples) or sequence of 1-D numpy arrays (one per channel).
+    Only the samples of each stack are copied, at the dtype of the channels.
+    :param bounds: list of (start, stop) window positions (see preprocess.window_bounds)
+    :param max_windows: maximum number of windows per stack (bounds the memory of each stack)
+    :return: generator of (window indices, numpy array of shape (channels, windows, window samples))
+    '''
+    windows_by_length = OrderedDict()
+    for idx, (start, stop) in enumerate(bounds):
+        windows_by_length.setdefault(stop - start, []).append(idx)
+
+    for length, window_indices in windows_by_length.items():
+        for batch_start in range(0, len(window_indices), max_windows):
+            batch = window_indices[batch_start:batch_start + max_windows]
+            starts = np.array([bounds[idx][0] for idx in batch])
+            sample_indices = starts[:, np.newaxis] + np.arange(length)
+            if isinstance(channel_data, np.ndarray):
+                yield batch, channel_data[:, sample_indices]
+            else:
+                yield batch, np.array([values[sample_indices] for values in channel_data])
+
+def _vector_magnitude(channel_windows):
+    magnitude_squared = channel_windows[0] ** 2
+    for channel in range(1, channel_windows.shape[0]):
+        magnitude_squared = magnitude_squared + channel_windows[channel] ** 2
+    return np.sqrt(magnitude_squared)
+
+@profiler.instrument('signal_features.batched_magnitude_rms')
+def batched_magnitude_rms(channel_windows):
+    '''
+    RMS of the vector magnitude over all channels for a stack of windows. Same values as 'magnitude_rms' of
+    batched_time_domain_features() without the other features.
+
+    :param channel_windows: numpy array of shape (channels, windows, samples)
+    :return: numpy array of shape (windows,)
+    '''
+    return np.sqrt(np.mean(np.square(_vector_magnitude(channel_windows)), axis=1))
+
+@profiler.instrument('signal_features.batched_time_domain_features')
+def batched_time_domain_features(channel_windows, sampling_rate, min_value=-1, max_value=1):
+    '''
+    Fused time-domain features for a stack of windows. Gives the same values as signal_rms, signal_range,
+    range_count_percentage, the RMS of the vector magnitude and jerk_metric of the vector magnitude on each window,
+    for windows without NaN's.
+
+    :param channel_windows: numpy array of shape (channels, windows, samples)
+    :param sampling_rate: sampling rate of sensor signals
+    :param min_value: minimum value for range count
+    :param max_value: maximum value for range count
+    :return: dictionary of numpy arrays. 'rms', 'range' and 'range_count_per' have shape (channels, windows).
+    'magnitude_rms' and 'magnitude_jerk_ratio' (of the vector magnitude over all channels) have shape (windows,).
+    '''
+    n_samples = channel_windows.shape[2]
+
+    # Per channel RMS (standard deviation of mean removed signal), range and range count
+    centered = channel_windows - np.mean(channel_windows, axis=2, keepdims=True)
+    rms = np.std(centered, axis=2)
+    signal_range = np.max(channel_windows, axis=2) - np.min(channel_windows, axis=2)
+    range_count = np.sum((channel_windows >= min_value) & (channel_windows < max_value), axis=2) * 1.0 / n_samples
+
+    # Vector magnitude
+    magnitude = _vector_magnitude(channel_windows)
+    magnitude_rms = np.sqrt(np.mean(np.square(magnitude), axis=1))
+
+    # Jerk ratio of vector magnitude (first difference is 0 so the sum matches the NaN skipping sum in jerk_metric)
+    dt = 1. / sampling_rate
+    duration = n_samples * dt
+    amplitude = np.max(np.abs(magnitude), axis=1)
+    jerk_squared = np.zeros(magnitude.shape, dtype=magnitude.dtype)
+    jerk_squared[:, 1:] = (np.diff(magnitude, axis=1) / dt) ** 2
+    jerk_squared_sum = np.sum(jerk_squared, axis=1)
+    scale = 360 * amplitude ** 2 / duration
+    mean_squared_jerk = jerk_squared_sum * dt / (duration * 2)
+
+    return {'rms': rms,
+            'range': signal_range,
+            'range_count_per': range_count,
+            'magnitude_rms': magnitude_rms,
+            'magnitude_jerk_ratio': mean_squared_jerk / scale}
+
+def batched_time_domain_feature_set(channel_data, channels, bounds, sampling_rate, min_value=-1, max_value=1):
+    '''
+    Per channel RMS, range and range count percentage of many windows with batched_time_domain_features(), in the
+    layout of signal_rms(), signal_range() and range_count_percentage().
+
+    :param channel_data: numpy array of shape (channels, samples) or sequence of 1-D numpy arrays (see stack_windows)
+    :param channels: channel names (rows of channel_data)
+    :param bounds: list of (start, stop) window positions (see preprocess.window_bounds)
+    :param sampling_rate: sampling rate of sensor signals
+    :param min_value: minimum value for range count
+    :param max_value: maximum value for range count
+    :return: Pandas DataFrame indexed by position in bounds with columns channel + '_rms', '_range' and
+    '_range_count_per'. Windows containing NaN's are left out (the per-window functions skip NaN's).
+    '''
+    columns = [channel + suffix for suffix in ['_rms', '_range', '_range_count_per'] for channel in channels]
+    feature_blocks = []
+    for window_indices, channel_windows in stack_windows(channel_data, bounds):
+        complete = ~np.isnan(channel_windows).any(axis=(0, 2))
+        features = batched_time_domain_features(channel_windows[:, complete], sampling_rate, min_value, max_value)
+        feature_blocks.append(pd.DataFrame(np.vstack([features['rms'], features['range'],
+                                                      features['range_count_per']]).T,
+                                           index=np.asarray(window_indices)[complete], columns=columns))
+
+    if not feature_blocks:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(feature_blocks)
@@ -0,0 +1,460 @@
+'''
+This file houses features of overlapping (sliding) windows advanced by a configurable hop, e.g. 3 second windows
+every 0.5 seconds to resolve the onset and offset of tremor and movement bouts to 0.5 seconds.
+
+1. compute_sliding_window_features(): time-domain and tremor band statistics that are updated from the previous window
+   instead of being recomputed, in vectorized form:
+
+   sums, sums of squares:  prefix (cumulative) sums; a window is the difference of two prefix sums, so moving a window
+                           by one hop costs O(hop) instead of O(window)
+   min / max:              sliding extremes over every sample position with the van Herk / Gil-Werman block scheme
+                           (O(1) per sample, same results as a monotonic deque), sampled at the window starts
+   tremor band spectrum:   sliding DFT of the band bins only. Bin k of the window starting at s is
+                           e^(2 pi i k s / N) * (C_k[s + N] - C_k[s]) with C_k the prefix sum of x[m] e^(-2 pi i k m / N),
+                           computed in chunks so rounding errors do not accumulate over the recording
+
+   The cost of these is O(samples x band bins) and hardly depends on the hop.
+
+2. compute_sliding_classification_features(): the features the gait and tremor classifiers select
+   (constants.*_FEATURE_SELECTION), with the same definitions as features/signal_features.py, for overlapping windows.
+   Used by build_gait_classification_feature_set() and build_rest_tremor_classification_feature_set() when a hop is
+   given. Windows are processed in chunks of max_windows; RMS, range and range count use the prefix sums and sliding
+   extremes above on the samples spanned by each chunk. The spectral features (zero padded FFT), signal entropy
+   (histogram per window), correlation coefficient and mean cross rate (crossings of the window mean) depend on the
+   whole window and have no incremental update; they are computed on stacks of windows with no per-window Python loop,
+   so their cost grows with window_length / hop.
+
+|Feature | Relation to the non-overlapping features | Incremental (both functions) |
+| --- | --- | --- |
+| _rms, _range, _range_count_per | Same values as signal_rms, signal_range, range_count_percentage on each window | Yes |
+| magnitude_rms, magnitude_jerk_ratio | Same values as batched_time_domain_features() on each window | Yes |
+| _band_rms, _band_power_ratio, _band_dom_freq | New tremor band features: DFT of length N = window samples (bins fs / N apart), no zero padding | Yes |
+| _mean_cross_rate | Same values as mean_cross_rate on each window | No |
+| _signal_entropy, _corr_coef | Same values as signal_entropy, correlation_coefficient on each window | No |
+| _dom_freq_value, _dom_freq_magnitude, _dom_freq_ratio, _spectral_flatness, _spectral_entropy | Same values as dominant_frequency on each window | No |
+| _iqr_of_autocovariance, _jerk_ratio | No sliding version (not selected by either classifier); requesting them raises a ValueError | - |
+
+Windows are complete windows of int(fs * window_length) samples that start at the same samples as the
+non-overlapping windows (preprocess.sliding_window_bounds()). With hop == window_length and an integer number of
+samples per window they are the non-overlapping windows without a trailing partial window
+(validation/sliding_equivalence.py checks this). Windows containing NaN's get NaN features.
+'''
+import numpy as np
+import pandas as pd
+from signal_preprocessing import preprocess
+from signal_preprocessing import quality_gate
+from instrumentation import profiler
+
+def sliding_extreme(x, window_samples, maximum=True):
+    '''
+    Maximum (or minimum) of every run of window_samples consecutive samples, ignoring NaN's.
+
+    :param x: 1-D numpy array
+    :param window_samples: number of samples per window
+    :param maximum: True for the maximum, False for the minimum
+    :return: numpy array of length len(x) - window_samples + 1; element i is the extreme of x[i:i + window_samples]
+    '''
+    n = len(x)
+    if n < window_samples:
+        return np.zeros(0)
+    combine = np.fmax if maximum else np.fmin
+    fill = -np.inf if maximum else np.inf
+
+    # Prefix and suffix extremes within blocks of window_samples; every window spans at most two blocks
+    n_blocks = -(-n // window_samples)
+    blocks = np.full(n_blocks * window_samples, fill)
+    blocks[:n] = x
+    blocks = blocks.reshape(n_blocks, window_samples)
+    prefix = combine.accumulate(blocks, axis=1).ravel()
+    suffix = combine.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    positions = np.arange(n - window_samples + 1)
+    return combine(suffix[positions], prefix[positions + window_samples - 1])
+
+def _window_sums(values, starts, stops):
+    csum = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    return csum[stops] - csum[starts]
+
+def _incremental_time_domain(x, starts, stops, window_samples, min_value, max_value):
+    # RMS (standard deviation), range and range count percentage of windows of x from prefix sums and sliding
+    # extremes; NaN's count as 0 (windows containing NaN's are set to NaN by the callers)
+    x = np.asarray(x, dtype=np.float64)
+    missing = np.isnan(x)
+    x_filled = np.where(missing, 0.0, x)
+
+    # Sums and sums of squares of the mean removed signal (less cancellation in the variance)
+    centered = x_filled - np.mean(x_filled) if len(x_filled) else x_filled
+    mean = _window_sums(centered, starts, stops) / window_samples
+    variance = np.maximum(_window_sums(centered ** 2, starts, stops) / window_samples - mean ** 2, 0.0)
+
+    if len(starts):
+        window_range = (sliding_extreme(x, window_samples)[starts] -
+                        sliding_extreme(x, window_samples, maximum=False)[starts])
+    else:
+        window_range = np.zeros(0)
+    in_range = (x_filled >= min_value) & (x_filled < max_value)
+    return {'_rms': np.sqrt(variance),
+            '_range': window_range,
+            '_range_count_per': _window_sums(in_range, starts, stops) * 1.0 / window_samples,
+            'has_nan': _window_sums(missing, starts, stops) > 0}
+
+def window_stack(x, starts, window_samples):
+    '''
+    Samples of windows of equal length as the rows of a matrix.
+
+    :param x: 1-D numpy array
+    :param starts: numpy array of window start positions
+    :param window_samples: number of samples per window
+    :return: numpy array of shape (windows, window_samples) (a copy)
+    '''
+    return np.asarray(x)[np.asarray(starts, dtype=int)[:, np.newaxis] + np.arange(window_samples)]
+
+def _chunks(n_windows, max_windows):
+    # Slices of at most max_windows windows (bounds the memory of the window stacks)
+    return [slice(first, min(first + max_windows, n_windows)) for first in range(0, n_windows, max_windows)]
+
+def _mean_cross_rate(windows):
+    # Sign changes of the window mean removed signal per sample, as mean_cross_rate()
+    signs = np.sign(windows - np.mean(windows, axis=1)[:, np.newaxis])
+    return np.sum(signs[:, 1:] != signs[:, :-1], axis=1) * 1.0 / windows.shape[1]
+
+def sliding_band_spectrum(x, starts, window_samples, bins, max_chunk_samples=2 ** 18):
+    '''
+    DFT bins of windows of equal length with the sliding DFT.
+
+    :param x: 1-D numpy array (NaN's must be replaced beforehand)
+    :param starts: numpy array of window start positions (ascending)
+    :param window_samples: number of samples per window (DFT length)
+    :param bins: numpy array of DFT bin numbers
+    :param max_chunk_samples: number of samples per chunk of prefix sums (bounds memory and rounding error)
+    :return: complex numpy array of shape (windows, bins); equals np.fft.fft(x[s:s + window_samples])[bins]
+    '''
+    spectrum = np.zeros((len(starts), len(bins)), dtype=np.complex128)
+    if len(starts) == 0 or len(bins) == 0:
+        return spectrum
+
+    frequency = 2j * np.pi * np.asarray(bins)[np.newaxis, :] / window_samples
+    first = 0
+    while first < len(starts):
+        # Windows of this chunk; at least one window
+        last = max(np.searchsorted(starts, starts[first] + max_chunk_samples - window_samples, side='right'),
+                   first + 1)
+        lo = starts[first]
+        hi = starts[last - 1] + window_samples
+
+        # Twiddle factors only depend on the position modulo the DFT length
+        positions = np.arange(lo, hi)
+        weighted = x[lo:hi, np.newaxis] * np.exp(-frequency * (positions % window_samples)[:, np.newaxis])
+        prefix = np.zeros((hi - lo + 1, len(bins)), dtype=np.complex128)
+        np.cumsum(weighted, axis=0, out=prefix[1:])
+
+        chunk_starts = starts[first:last]
+        spectrum[first:last] = ((prefix[chunk_starts - lo + window_samples] - prefix[chunk_starts - lo]) *
+                                np.exp(frequency * (chunk_starts % window_samples)[:, np.newaxis]))
+        first = last
+
+    return spectrum
+
+@profiler.instrument('sliding_window_features.compute_sliding_window_features')
+def compute_sliding_window_features(data_df, fs, channels, window_length=3.0, hop=0.5, band=[3.5, 7.5],
+                                    min_value=-1, max_value=1, max_windows=1024):
+    '''
+    Time-domain and tremor band features of overlapping windows.
+
+    :param data_df: Pandas DataFrame housing desired sensor signals (Ex: band-pass filtered channels)
+    :param fs: Sampling rate of the signals (float)
+    :param channels: channels of signal to compute features on. The vector magnitude features use all channels.
+    :param window_length: Length (in seconds) of the windows
+    :param hop: Time (in seconds) between the starts of consecutive windows
+    :param band: [low, high] (Hz) frequency band of the band features
+    :param min_value: minimum value for range count
+    :param max_value: maximum value for range count
+    :param max_windows: number of windows per stack of the mean cross rate (bounds memory)
+    :return: Pandas DataFrame indexed by window number with columns 'start', 'stop' (sample positions), 'time' (start
+    in seconds) and per channel '_rms', '_range', '_range_count_per', '_mean_cross_rate', '_band_rms',
+    '_band_power_ratio', '_band_dom_freq', plus 'magnitude_rms' and 'magnitude_jerk_ratio'
+    '''
+    starts, stops = preprocess.sliding_window_bounds(data_df.shape[0], fs, window_length, hop)
+    window_samples = int(preprocess.get_window_plan(fs, window_length).window_samples)
+    bins = np.arange(int(np.ceil(band[0] * window_samples / fs)), int(np.floor(band[1] * window_samples / fs)) + 1)
+    bins = bins[(bins > 0) & (2 * bins < window_samples)]
+    bin_frequencies = bins * fs / window_samples
+
+    features = pd.DataFrame({'start': starts, 'stop': stops, 'time': starts / float(fs)},
+                            columns=['start', 'stop', 'time'])
+    magnitude_squared = np.zeros(data_df.shape[0])
+    any_nan = np.zeros(len(starts), dtype=bool)
+
+    for channel in channels:
+        x = data_df[channel].values.astype(np.float64)
+        time_domain = _incremental_time_domain(x, starts, stops, window_samples, min_value, max_value)
+        has_nan = time_domain['has_nan']
+        any_nan |= has_nan
+        x_filled = np.where(np.isnan(x), 0.0, x)
+        magnitude_squared += x_filled ** 2
+        variance = time_domain['_rms'] ** 2
+
+        # Crossings of the window mean (depends on the mean of each window, so no incremental update)
+        mean_cross_rate = np.zeros(len(starts))
+        for chunk in _chunks(len(starts), max_windows):
+            mean_cross_rate[chunk] = _mean_cross_rate(window_stack(x_filled, starts[chunk], window_samples))
+
+        # Tremor band: power of the band bins (both sides of the spectrum) relative to the total power (Parseval)
+        band_spectrum = np.abs(sliding_band_spectrum(x_filled, starts, window_samples, bins)) ** 2
+        band_power = 2 * np.sum(band_spectrum, axis=1)
+        total_power = window_samples * window_samples * variance
+        with np.errstate(invalid='ignore', divide='ignore'):
+            band_power_ratio = np.where(total_power > 0, band_power / total_power, np.nan)
+        if len(bins):
+            band_dom_freq = bin_frequencies[np.argmax(band_spectrum, axis=1)]
+        else:
+            band_dom_freq = np.full(len(starts), np.nan)
+
+        channel_features = {'_rms': time_domain['_rms'],
+                            '_range': time_domain['_range'],
+                            '_range_count_per': time_domain['_range_count_per'],
+                            '_mean_cross_rate': mean_cross_rate,
+                            '_band_rms': np.sqrt(band_power) / window_samples,
+                            '_band_power_ratio': band_power_ratio,
+                            '_band_dom_freq': band_dom_freq}
+        for suffix in ['_rms', '_range', '_range_count_per', '_mean_cross_rate', '_band_rms', '_band_power_ratio',
+                       '_band_dom_freq']:
+            values = np.asarray(channel_features[suffix], dtype=np.float64)
+            values[has_nan] = np.nan
+            features[channel + suffix] = values
+
+    # Vector magnitude: RMS and jerk ratio (sum of squared first differences within the window)
+    magnitude = np.sqrt(magnitude_squared)
+    dt = 1. / fs
+    duration = window_samples * dt
+    magnitude_rms = np.sqrt(_window_sums(magnitude_squared, starts, stops) / window_samples)
+    jerk_squared = np.concatenate(([0.0], (np.diff(magnitude) / dt) ** 2))
+    jerk_squared_sum = _window_sums(jerk_squared, starts + 1, stops)
+    amplitude = sliding_extreme(magnitude, window_samples)[starts] if len(starts) else np.zeros(0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        jerk_ratio = (jerk_squared_sum * dt / (duration * 2)) / (360 * amplitude ** 2 / duration)
+    features['magnitude_rms'] = np.where(any_nan, np.nan, magnitude_rms)
+    features['magnitude_jerk_ratio'] = np.where(any_nan, np.nan, jerk_ratio)
+
+    profiler.record_windows('sliding_window_features.compute_sliding_window_features', processed=len(starts))
+    return features
+
+def _histogram_counts(values, min_value, max_value, ncell):
+    # Per-row histogram with the bin edges and edge rules of np.histogram(row, ncell, range=(min, max))
+    rows = np.arange(values.shape[0])[:, np.newaxis]
+    step = (max_value - min_value) / ncell
+    edges = np.arange(ncell + 1)[np.newaxis, :] * step[:, np.newaxis] + min_value[:, np.newaxis]
+    edges[:, -1] = max_value
+
+    indices = np.clip(((values - min_value[:, np.newaxis]) / (max_value - min_value)[:, np.newaxis] *
+                       ncell).astype(int), 0, ncell - 1)
+    indices -= values < edges[rows, indices]
+    indices += (values >= edges[rows, indices + 1]) & (indices != ncell - 1)
+
+    counts = np.bincount((rows * ncell + indices).ravel(), minlength=values.shape[0] * ncell)
+    return counts.reshape(values.shape[0], ncell).astype(np.float64)
+
+def _signal_entropy(windows):
+    # signal_entropy(): bias corrected entropy estimate of the histogram of the normalized window
+    n_samples = windows.shape[1]
+    ncell = int(np.ceil(np.sqrt(n_samples)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        data_norm = windows / np.std(windows, axis=1)[:, np.newaxis]
+    valid = np.all(np.isfinite(data_norm), axis=1)
+    data_norm = data_norm[valid]
+
+    entropy = np.full(windows.shape[0], np.nan)
+    if not len(data_norm):
+        return entropy
+    max_value = np.max(data_norm, axis=1)
+    min_value = np.min(data_norm, axis=1)
+    delta = (max_value - min_value) / (n_samples - 1)
+    lowerbound = min_value - delta / 2
+    upperbound = max_value + delta / 2
+
+    # Same estimate as backends.NumpyBackend.histogram_entropy() for every row
+    h = _histogram_counts(data_norm, min_value, max_value, ncell)
+    count = np.sum(h, axis=1)
+    logf = np.zeros(h.shape)
+    logf[h != 0] = np.log(h[h != 0])
+    estimate = -np.sum(h * logf, axis=1)
+    nbias = -(float(ncell) - 1) / (2 * count)
+    estimate = estimate / count
+    estimate = estimate + np.log(count) + np.log((upperbound - lowerbound) / ncell) - nbias
+    entropy[valid] = np.exp(estimate ** 2) - np.exp(0) - 1
+    return entropy
+
+def _correlation_coefficient(windows_a, windows_b):
+    # Pearson correlation of two channels per window, as correlation_coefficient()
+    centered_a = windows_a - np.mean(windows_a, axis=1)[:, np.newaxis]
+    centered_b = windows_b - np.mean(windows_b, axis=1)[:, np.newaxis]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sum(centered_a * centered_b, axis=1) / np.sqrt(np.sum(centered_a ** 2, axis=1) *
+                                                                 np.sum(centered_b ** 2, axis=1))
+
+def _spectral_features(windows, fs, cutoff):
+    # dominant_frequency(): zero padded FFT of every window, spectrum normalized below the cutoff
+    fft_plan = preprocess.get_fft_plan(windows.shape[1], fs, cutoff)
+    nfft = fft_plan.nfft
+    freq = fft_plan.frequencies[:, 0]
+
+    sp_hat = np.fft.fft(windows, nfft, axis=1)[:, 0:nfft // 2]
+    sp = (sp_hat * np.conjugate(sp_hat)).real[:, fft_plan.cutoff_indices[:, 0]]
+    rows = np.arange(windows.shape[0])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sp_norm = sp / np.sum(sp, axis=1)[:, np.newaxis]
+        peak = np.argmax(sp_norm, axis=1)
+        max_freq = freq[peak]
+        near_peak = (freq > max_freq[:, np.newaxis] - 0.5) & (freq < max_freq[:, np.newaxis] + 0.5)
+        log_sp_norm = np.log(sp_norm)
+        spectral_flatness = 10.0 * np.log10(np.exp(np.mean(log_sp_norm, axis=1)) / np.mean(sp_norm, axis=1))
+        spectral_entropy = -np.sum(np.where(sp_norm != 0, sp_norm * log_sp_norm / np.log(2), 0.0), axis=1)
+
+    return {'_dom_freq_value': max_freq,
+            '_dom_freq_magnitude': sp_norm[rows, peak],
+            '_dom_freq_ratio': np.sum(np.where(near_peak, sp_norm, 0.0), axis=1),
+            '_spectral_flatness': spectral_flatness,
+            '_spectral_entropy': spectral_entropy / np.log2(sp_norm.shape[1])}
+
+# Per channel features of compute_sliding_classification_features(), by family
+SLIDING_CLASSIFICATION_FEATURES = ['_rms', '_range', '_range_count_per', '_mean_cross_rate', '_signal_entropy',
+                                   '_dom_freq_value', '_dom_freq_magnitude', '_dom_freq_ratio', '_spectral_flatness',
+                                   '_spectral_entropy']
+
+def _parse_feature_columns(feature_columns, channels):
+    # Map feature names to (channel, suffix) or ((channel_a, channel_b), '_corr_coef')
+    parsed = {}
+    unsupported = []
+    for column in feature_columns:
+        for channel in channels:
+            if column.startswith(channel + '_') and column[len(channel):] in SLIDING_CLASSIFICATION_FEATURES:
+                parsed[column] = (channel, column[len(channel):])
+                break
+            if column.endswith('_corr_coef') and column.startswith(channel + '_') and \
+                    column[len(channel) + 1:-len('_corr_coef')] in channels:
+                parsed[column] = ((channel, column[len(channel) + 1:-len('_corr_coef')]), '_corr_coef')
+                break
+        else:
+            unsupported.append(column)
+    if unsupported:
+        raise ValueError('No sliding window version of features: %s' % ', '.join(unsupported))
+    return parsed
+
+# Features computed from prefix sums and sliding extremes (no window stacks)
+INCREMENTAL_CLASSIFICATION_FEATURES = ['_rms', '_range', '_range_count_per']
+
+@profiler.instrument('sliding_window_features.compute_sliding_classification_features')
+def compute_sliding_classification_features(data_df, fs, feature_columns, window_length=3.0, hop=0.5, cutoff=12.0,
+                                            min_value=-1, max_value=1, excluded_windows=None, max_windows=1024):
+    '''
+    Classification features (signal_features.py definitions) of overlapping windows.
+
+    :param data_df: Pandas DataFrame or dictionary of 1-D numpy arrays (Ex: the arrays of a ChannelStore) housing the
+    pre-processed channels (Ex: band-pass filtered and PC1 channels). Arrays are not copied: only the samples spanned
+    by each chunk of windows are converted to float64.
+    :param fs: Sampling rate of the signals (float)
+    :param feature_columns: feature names as produced by the classifiers, Ex: 'x_bp_filt_[0.25, 3.0]_rms' or
+    'x_bp_filt_[0.25, 3.0]_y_bp_filt_[0.25, 3.0]_corr_coef' (Ex: constants.GAIT_FEATURE_SELECTION)
+    :param window_length: Length (in seconds) of the windows
+    :param hop: Time (in seconds) between the starts of consecutive windows
+    :param cutoff: highest frequency (Hz) of the spectral features (dominant_frequency() cutoff)
+    :param min_value: minimum value for range count
+    :param max_value: maximum value for range count
+    :param excluded_windows: Boolean array-like indexed by non-overlapping window number (Ex:
+    quality_gate.assess_window_quality(raw_accelerometer_data_df, fs).excluded.values). Windows overlapping an
+    excluded window are left out.
+    :param max_windows: number of windows per chunk (bounds memory)
+    :return: Pandas DataFrame indexed by sliding window number with columns 'start', 'stop' (sample positions), 'time'
+    (start in seconds) and feature_columns
+    '''
+    if isinstance(data_df, pd.DataFrame):
+        channels = list(data_df.columns)
+        signals = dict((channel, data_df[channel].values) for channel in channels)
+    else:
+        channels = list(data_df.keys())
+        signals = data_df
+    total_samples = len(signals[channels[0]]) if channels else 0
+    parsed = _parse_feature_columns(feature_columns, channels)
+    starts, stops = preprocess.sliding_window_bounds(total_samples, fs, window_length, hop)
+    window_samples = int(preprocess.get_window_plan(fs, window_length).window_samples)
+
+    # Leave out windows that overlap an excluded non-overlapping window
+    keep = np.ones(len(starts), dtype=bool)
+    if excluded_windows is not None:
+        bounds = preprocess.window_bounds(total_samples, fs, window_length)
+        excluded_counts = np.concatenate(([0], np.cumsum(quality_gate.excluded_window_mask(excluded_windows,
+                                                                                           len(bounds)))))
+        # Non-overlapping windows first:last overlap each sliding window
+        first = np.searchsorted(np.array([stop for _, stop in bounds], dtype=int), starts, side='right')
+        last = np.searchsorted(np.array([start for start, _ in bounds], dtype=int), stops, side='left')
+        keep = excluded_counts[np.maximum(last, first)] - excluded_counts[first] == 0
+    window_numbers = np.where(keep)[0]
+    starts, stops = starts[keep], stops[keep]
+
+    used_channels = []
+    for channel, suffix in parsed.values():
+        for name in (channel if suffix == '_corr_coef' else (channel,)):
+            if name not in used_channels:
+                used_channels.append(name)
+    stacked_channels = [name for name in used_channels
+                        if any(suffix not in INCREMENTAL_CLASSIFICATION_FEATURES and
+                               name in (channel if suffix == '_corr_coef' else (channel,))
+                               for channel, suffix in parsed.values())]
+
+    values = dict((column, np.zeros(len(starts))) for column in feature_columns)
+    has_nan = np.zeros(len(starts), dtype=bool)
+    for chunk in _chunks(len(starts), max_windows):
+        # Samples spanned by the windows of this chunk
+        first, last = starts[chunk][0], stops[chunk][-1]
+        chunk_starts, chunk_stops = starts[chunk] - first, stops[chunk] - first
+        segments = dict((channel, np.asarray(signals[channel][first:last], dtype=np.float64))
+                        for channel in used_channels)
+        windows = dict((channel, window_stack(segments[channel], chunk_starts, window_samples))
+                       for channel in stacked_channels)
+
+        computed = {}
+        for channel in used_channels:
+            time_domain = _incremental_time_domain(segments[channel], chunk_starts, chunk_stops, window_samples,
+                                                   min_value, max_value)
+            has_nan[chunk] |= time_domain.pop('has_nan')
+            for suffix, suffix_values in time_domain.items():
+                computed[channel, suffix] = suffix_values
+
+        for column in feature_columns:
+            channel, suffix = parsed[column]
+            if suffix == '_corr_coef':
+                values[column][chunk] = _correlation_coefficient(windows[channel[0]], windows[channel[1]])
+                continue
+            if (channel, suffix) not in computed:
+                channel_windows = windows[channel]
+                if suffix == '_mean_cross_rate':
+                    computed[channel, suffix] = _mean_cross_rate(channel_windows)
+                elif suffix == '_signal_entropy':
+                    computed[channel, suffix] = _signal_entropy(channel_windows)
+                else:
+                    for spectral_suffix, spectral_values in _spectral_features(channel_windows, fs, cutoff).items():
+                        computed[channel, spectral_suffix] = spectral_values
+            values[column][chunk] = computed[channel, suffix]
+
+    features = pd.DataFrame({'start': starts, 'stop': stops, 'time': starts / float(fs)}, index=window_numbers,
+                            columns=['start', 'stop', 'time'])
+    for column in feature_columns:
+        features[column] = np.where(has_nan, np.nan, values[column])
+
+    profiler.record_windows('sliding_window_features.compute_sliding_classification_features',
+                            processed=len(starts), skipped=int((~keep).sum()))
+    return features
+
+if __name__ == "__main__":
+    '''
+    Main runner computing 3 second tremor band features every 0.5 seconds.
+    '''
+    raw_data_filepath = '' # Insert file path of raw accelerometer data
+    raw_data_df = pd.read_csv(raw_data_filepath)
+    sampling_rate = 100.0 # Specify sampling rate of sensor data
+
+    filtered_df = pd.DataFrame({channel + '_bp_filt_[3.5, 7.5]': preprocess.band_pass_filter_array(
+        raw_data_df[channel].values, sampling_rate, [3.5, 7.5], 1) for channel in ['x', 'y', 'z']})
+    sliding_features_df = compute_sliding_window_features(filtered_df, sampling_rate, list(filtered_df.columns),
+                                                          window_length=3.0, hop=0.5)
+    print(sliding_features_df.head().to_string())
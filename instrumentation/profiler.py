@@ -0,0 +1,188 @@
+'''
+This file houses opt-in instrumentation of the pipeline stages. Public functions of preprocess, signal_features, the
+classifier builders and the endpoints are wrapped with @instrument(stage_name). While profiling is disabled (the
+default) the wrapper only checks a module flag before calling the function.
+
+Usage:
+    from instrumentation import profiler
+    profiler.enable(track_memory=True, trace=True)
+    ... run pipeline ...
+    profiler.write_report('report.json', trace_filepath='trace.json')  # trace.json opens in chrome://tracing
+    profiler.disable()
+
+Per stage the report holds call count, total wall time, windows processed and skipped (recorded by the window loops
+through record_windows) and, with track_memory, bytes allocated (peak traced memory above the level at stage entry,
+summed over calls). Memory tracking needs tracemalloc.reset_peak() (Python 3.9+); on older versions enable() warns and
+records timings only (the report shows track_memory = false).
+'''
+import functools
+import json
+import os
+import threading
+import timeit
+import warnings
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+_ENABLED = False
+_TRACK_MEMORY = False
+_TRACE = False
+_STARTED_TRACEMALLOC = False
+_START_TIME = 0.0
+_STAGES = {}
+_TRACE_EVENTS = []
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+def enable(track_memory=False, trace=False):
+    '''
+    Start recording stage statistics. Clears previously recorded statistics.
+
+    :param track_memory: Record allocated bytes per stage (uses tracemalloc.reset_peak(), Python 3.9+; slows down the
+    run). Ignored with a RuntimeWarning on older Python versions.
+    :param trace: Keep one trace event per stage call for write_report(trace_filepath=...)
+    '''
+    global _ENABLED, _TRACK_MEMORY, _TRACE, _STARTED_TRACEMALLOC, _START_TIME
+    reset()
+    _TRACK_MEMORY = bool(track_memory) and hasattr(tracemalloc, 'reset_peak')
+    if track_memory and not _TRACK_MEMORY:
+        warnings.warn('track_memory needs tracemalloc.reset_peak() (Python 3.9+); recording timings only',
+                      RuntimeWarning)
+    _STARTED_TRACEMALLOC = _TRACK_MEMORY and not tracemalloc.is_tracing()
+    if _STARTED_TRACEMALLOC:
+        tracemalloc.start()
+    _TRACE = trace
+    _START_TIME = timeit.default_timer()
+    _ENABLED = True
+
+def disable():
+    '''
+    Stop recording stage statistics. Recorded statistics are kept until the next enable() or reset().
+    '''
+    global _ENABLED, _STARTED_TRACEMALLOC
+    _ENABLED = False
+    if _STARTED_TRACEMALLOC:
+        tracemalloc.stop()
+        _STARTED_TRACEMALLOC = False
+
+def is_enabled():
+    '''
+    :return: True if stage statistics are being recorded
+    '''
+    return _ENABLED
+
+def reset():
+    '''
+    Clear recorded statistics.
+    '''
+    with _LOCK:
+        _STAGES.clear()
+        del _TRACE_EVENTS[:]
+
+def _stage(name):
+    if name not in _STAGES:
+        _STAGES[name] = {'calls': 0, 'wall_time': 0.0, 'windows_processed': 0, 'windows_skipped': 0,
+                         'allocated_bytes': 0}
+    return _STAGES[name]
+
+def record_windows(stage_name, processed=0, skipped=0):
+    '''
+    Record windows processed and skipped by a stage. Does nothing while profiling is disabled.
+
+    :param stage_name: Name of stage
+    :param processed: Number of windows processed
+    :param skipped: Number of windows skipped
+    '''
+    if not _ENABLED:
+        return
+    with _LOCK:
+        stage = _stage(stage_name)
+        stage['windows_processed'] += processed
+        stage['windows_skipped'] += skipped
+
+def _memory_stack():
+    if not hasattr(_LOCAL, 'memory_stack'):
+        _LOCAL.memory_stack = []
+    return _LOCAL.memory_stack
+
+def _profiled_call(stage_name, function, args, kwargs):
+    track_memory = _TRACK_MEMORY and tracemalloc.is_tracing()
+    if track_memory:
+        memory_stack = _memory_stack()
+        current, peak = tracemalloc.get_traced_memory()
+        if memory_stack:
+            # Keep the peak of the enclosing stage before resetting it for this stage
+            memory_stack[-1]['peak'] = max(memory_stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        memory_stack.append({'start': current, 'peak': current})
+
+    start = timeit.default_timer()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        end = timeit.default_timer()
+
+        allocated = 0
+        if track_memory:
+            frame = memory_stack.pop()
+            frame_peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            allocated = frame_peak - frame['start']
+            if memory_stack:
+                memory_stack[-1]['peak'] = max(memory_stack[-1]['peak'], frame_peak)
+
+        with _LOCK:
+            stage = _stage(stage_name)
+            stage['calls'] += 1
+            stage['wall_time'] += end - start
+            stage['allocated_bytes'] += allocated
+            if _TRACE:
+                _TRACE_EVENTS.append({'name': stage_name, 'ph': 'X', 'pid': os.getpid(),
+                                      'tid': threading.current_thread().ident,
+                                      'ts': (start - _START_TIME) * 1e6, 'dur': (end - start) * 1e6})
+
+def instrument(stage_name):
+    '''
+    Decorator recording wall time, call count and allocated bytes of a function under stage_name while profiling is
+    enabled.
+
+    :param stage_name: Name of stage (Ex: 'preprocess.band_pass_filter')
+    :return: decorator
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return function(*args, **kwargs)
+            return _profiled_call(stage_name, function, args, kwargs)
+        return wrapper
+    return decorator
+
+def report():
+    '''
+    :return: Dictionary with total profiled wall time and a dictionary of statistics per stage
+    '''
+    with _LOCK:
+        stages = dict((name, dict(stats)) for name, stats in _STAGES.items())
+    return {'enabled': _ENABLED,
+            'track_memory': _TRACK_MEMORY,
+            'elapsed': timeit.default_timer() - _START_TIME if _START_TIME else 0.0,
+            'stages': stages}
+
+def write_report(filepath, trace_filepath=None):
+    '''
+    Write the report as JSON and, optionally, the trace events in Chrome trace-event format.
+
+    :param filepath: Path of JSON report
+    :param trace_filepath: Path of trace-event file (requires enable(trace=True))
+    '''
+    with open(filepath, 'w') as report_file:
+        json.dump(report(), report_file, indent=1, sort_keys=True)
+
+    if trace_filepath is not None:
+        with _LOCK:
+            events = list(_TRACE_EVENTS)
+        with open(trace_filepath, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
@@ -0,0 +1,143 @@
+'''
+This file houses a columnar store for sensor signal channels with explicit lifetimes.
+
+Pipelines are written as a list of stages. Each stage declares the channels it reads and the channels it produces.
+run_stages() runs the stages in order and frees every channel as soon as no later stage reads it, so the memory held
+by the store follows the working set of the pipeline instead of the total number of channels ever created.
+'''
+
+from collections import OrderedDict
+import numpy as np
+
+class Stage(object):
+    '''
+    One step of a channel pipeline.
+    '''
+
+    def __init__(self, name, reads, produces, function):
+        '''
+        :param name: name of stage
+        :param reads: channel names passed (in order) as numpy arrays to function
+        :param produces: channel names of the arrays returned by function (in order). If empty, the return value of
+        function is kept as the stage result instead.
+        :param function: callable taking one numpy array per channel in reads
+        '''
+        self.name = name
+        self.reads = list(reads)
+        self.produces = list(produces)
+        self.function = function
+
+class ChannelStore(object):
+    '''
+    Named 1-D signal channels held as separate numpy arrays, with an optional memory ceiling.
+    '''
+
+    def __init__(self, memory_limit_bytes=None):
+        '''
+        :param memory_limit_bytes: Maximum number of bytes the store may hold at once (None = no limit)
+        '''
+        self.memory_limit_bytes = memory_limit_bytes
+        self.peak_bytes = 0
+        self._channels = OrderedDict()
+
+    @classmethod
+    def from_dataframe(cls, data_df, channels, memory_limit_bytes=None):
+        '''
+        Create a store holding the given DataFrame columns. Columns are not copied, so the store adds no memory for
+        them; other columns (e.g. 'ts') are not loaded.
+
+        :param data_df: dataframe housing sensor signals
+        :param channels: columns to load
+        :param memory_limit_bytes: Maximum number of bytes the store may hold at once (None = no limit)
+        :return: ChannelStore
+        '''
+        store = cls(memory_limit_bytes=memory_limit_bytes)
+        for channel in channels:
+            store.put(channel, data_df[channel].values)
+        return store
+
+    @property
+    def nbytes(self):
+        '''
+        Number of bytes currently held by the store.
+        '''
+        return sum(values.nbytes for values in self._channels.values())
+
+    @property
+    def names(self):
+        '''
+        Names of channels currently held by the store.
+        '''
+        return list(self._channels.keys())
+
+    def put(self, name, values):
+        '''
+        Add (or replace) a channel.
+
+        :param name: channel name
+        :param values: 1-D numpy array
+        '''
+        values = np.asarray(values)
+        current = self._channels.pop(name, None)
+        new_total = self.nbytes + values.nbytes
+        if self.memory_limit_bytes is not None and new_total > self.memory_limit_bytes:
+            if current is not None:
+                self._channels[name] = current
+            raise MemoryError('Channel store limit of %d bytes exceeded adding %s (%d bytes held by %s)'
+                              % (self.memory_limit_bytes, name, self.nbytes, ', '.join(self.names)))
+        self._channels[name] = values
+        self.peak_bytes = max(self.peak_bytes, new_total)
+
+    def get(self, name):
+        '''
+        :param name: channel name
+        :return: 1-D numpy array of channel
+        '''
+        return self._channels[name]
+
+    def get_matrix(self, names):
+        '''
+        :param names: channel names
+        :return: 2-D numpy array with one column per channel
+        '''
+        return np.column_stack([self._channels[name] for name in names])
+
+    def drop(self, names):
+        '''
+        Free channels.
+
+        :param names: channel names to remove from the store
+        '''
+        for name in names:
+            self._channels.pop(name, None)
+
+def run_stages(store, stages, keep=()):
+    '''
+    Run pipeline stages in order, freeing each channel once no later stage reads it.
+
+    :param store: ChannelStore with the input channels of the first stage
+    :param stages: list of Stage
+    :param keep: channel names that should never be freed
+    :return: dictionary of stage name -> result for stages that produce no channels
+    '''
+    last_use = {}
+    for idx, stage in enumerate(stages):
+        for name in stage.reads:
+            last_use[name] = idx
+
+    results = {}
+    for idx, stage in enumerate(stages):
+        output = stage.function(*[store.get(name) for name in stage.reads])
+
+        if stage.produces:
+            if len(stage.produces) == 1:
+                output = [output]
+            for name, values in zip(stage.produces, output):
+                store.put(name, values)
+        else:
+            results[stage.name] = output
+
+        # Free channels that are not read by any later stage
+        store.drop([name for name in store.names if last_use.get(name, -1) <= idx and name not in keep])
+
+    return results
@@ -2,49 +2,321 @@
 This file houses functions used for pre-processing accelerometer sensor signals.
 '''
 
+from collections import namedtuple
+from fractions import Fraction
 from scipy import signal
+import numpy as np
 import pandas as pd
 from sklearn.decomposition import PCA
+from instrumentation import profiler
 
-def band_pass_filter(data_df, sampling_rate, bp_cutoff, order, channels=['X', 'Y', 'Z']):
+# Canonical sampling rate used by resample_to_canonical_rate()
+CANONICAL_SAMPLING_RATE = 100.0
+
+# Filter designs, keyed by (output, btype, cutoff, order, sampling rate)
+_FILTER_CACHE = {}
+
+# Polyphase resamplers (up, down, FIR taps), keyed by (input sampling rate, output sampling rate)
+_RESAMPLER_CACHE = {}
+
+# FFT plans, keyed by (samples, sampling rate, frequency cutoff)
+_FFT_PLAN_CACHE = {}
+
+# Window plans, keyed by (sampling rate, window length, frequency cutoff)
+_WINDOW_PLAN_CACHE = {}
+
+FftPlan = namedtuple('FftPlan', ['nfft', 'cutoff_indices', 'frequencies'])
+
+WindowPlan = namedtuple('WindowPlan', ['sampling_rate', 'window_length', 'window_samples', 'fft_plan'])
+
+@profiler.instrument('preprocess.load_accelerometer_data')
+def load_accelerometer_data(filepath, dtype=np.float64, channels=['x', 'y', 'z']):
     '''
-    Band-pass filter a given sensor signal.
+    Load raw accelerometer data from a .CSV file with columns 'ts','x','y','z'.
+
+    :param filepath: path to .CSV file
+    :param dtype: dtype of the sensor channels. Use np.float32 to run the pipeline in single precision.
+    :param channels: sensor channels to load with the given dtype
+    :return: Pandas DataFrame of raw accelerometer data
+    '''
+    return pd.read_csv(filepath, dtype=dict((channel, dtype) for channel in channels))
+
+def _design_butter(sampling_rate, cutoff, order, btype, output):
+    cutoff = [float(c) for c in np.atleast_1d(cutoff)]
+    key = (output, btype, tuple(cutoff), order, float(sampling_rate))
+    if key not in _FILTER_CACHE:
+        # Calculate the critical frequency (radians/sample) based on cutoff frequency (Hz) and sampling rate (Hz)
+        critical_frequency = [c * 2.0 / sampling_rate for c in cutoff]
+        if len(critical_frequency) == 1:
+            critical_frequency = critical_frequency[0]
+        _FILTER_CACHE[key] = signal.butter(N=order, Wn=critical_frequency, btype=btype, analog=False, output=output)
+    return _FILTER_CACHE[key]
+
+def design_butter_sos(sampling_rate, cutoff, order, btype='bandpass'):
+    '''
+    Design a Butterworth filter in second-order-section form. Designs are cached per (btype, cutoff, order, fs).
+
+    :param sampling_rate: sampling rate of signal
+    :param cutoff: filter cutoff(s) in Hz. [low, high] for band-pass, single value for low-pass/high-pass
+    :param order: filter order
+    :param btype: filter type ('bandpass', 'lowpass' or 'highpass')
+    :return: numpy array of second-order sections
+    '''
+    return _design_butter(sampling_rate, cutoff, order, btype, 'sos')
+
+def design_butter_ba(sampling_rate, cutoff, order, btype='bandpass'):
+    '''
+    Design a Butterworth filter as numerator/denominator coefficients. Designs are cached per (btype, cutoff, order, fs).
+
+    :param sampling_rate: sampling rate of signal
+    :param cutoff: filter cutoff(s) in Hz. [low, high] for band-pass, single value for low-pass/high-pass
+    :param order: filter order
+    :param btype: filter type ('bandpass', 'lowpass' or 'highpass')
+    :return: numerator (b), denominator (a) of the IIR filter
+    '''
+    return _design_butter(sampling_rate, cutoff, order, btype, 'ba')
+
+def get_resampler(input_sampling_rate, output_sampling_rate):
+    '''
+    Get the polyphase resampler converting between two sampling rates. Resamplers are cached per (fs_in, fs_out).
+
+    :param input_sampling_rate: sampling rate of input signal
+    :param output_sampling_rate: desired sampling rate
+    :return: up-sampling factor, down-sampling factor, anti-aliasing FIR filter taps
+    '''
+    key = (float(input_sampling_rate), float(output_sampling_rate))
+    if key not in _RESAMPLER_CACHE:
+        ratio = Fraction(float(output_sampling_rate) / float(input_sampling_rate)).limit_denominator(1000)
+        up, down = ratio.numerator, ratio.denominator
+        max_rate = max(up, down)
+
+        # Same Kaiser-window anti-aliasing filter that signal.resample_poly designs by default
+        taps = signal.firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+        _RESAMPLER_CACHE[key] = (up, down, taps)
+    return _RESAMPLER_CACHE[key]
+
+@profiler.instrument('preprocess.resample_to_canonical_rate')
+def resample_to_canonical_rate(data_df, sampling_rate, target_sampling_rate=CANONICAL_SAMPLING_RATE,
+                               channels=['x', 'y', 'z']):
+    '''
+    Resample sensor signals to a canonical sampling rate so that downstream filter designs, window lengths and FFT
+    plans are the same for every device.
 
     :param data_df: dataframe housing sensor signals
     :param sampling_rate: sampling rate of signal
+    :param target_sampling_rate: canonical sampling rate
+    :param channels: channels of signal to resample. Other columns (e.g. 'ts') are dropped when resampling.
+    :return: dataframe of resampled channels, canonical sampling rate
+    '''
+    if float(sampling_rate) == float(target_sampling_rate):
+        return data_df, sampling_rate
+
+    up, down, taps = get_resampler(sampling_rate, target_sampling_rate)
+
+    resampled_data = signal.resample_poly(data_df[channels].values, up, down, axis=0, window=taps)
+
+    return pd.DataFrame(resampled_data, columns=channels), float(target_sampling_rate)
+
+def get_fft_plan(n_samples, sampling_rate, cutoff):
+    '''
+    Get the FFT length and frequency bins used to compute the spectrum of a window. Plans are cached per
+    (samples, fs, cutoff).
+
+    :param n_samples: number of samples in window
+    :param sampling_rate: sampling rate of signal
+    :param cutoff: highest frequency (Hz) kept from the spectrum
+    :return: FftPlan (FFT length, indices of bins at or below cutoff, frequencies of those bins)
+    '''
+    key = (int(n_samples), float(sampling_rate), float(cutoff))
+    if key not in _FFT_PLAN_CACHE:
+        nfft = 2 ** (int(n_samples).bit_length())
+
+        freq_hat = np.fft.fftfreq(nfft) * sampling_rate
+        freq = freq_hat[0:nfft // 2]
+
+        cutoff_indices = np.argwhere(freq <= cutoff)
+        _FFT_PLAN_CACHE[key] = FftPlan(nfft, cutoff_indices, freq[cutoff_indices])
+    return _FFT_PLAN_CACHE[key]
+
+def get_window_plan(sampling_rate, window_length=3.0, cutoff=12.0):
+    '''
+    Get the window length and FFT plan of the classification windows for a given sampling rate. Plans are cached per
+    (fs, window length, cutoff).
+
+    :param sampling_rate: sampling rate of signal
+    :param window_length: length of window in seconds
+    :param cutoff: highest frequency (Hz) kept from the spectrum
+    :return: WindowPlan (window samples and FFT plan of a full window)
+    '''
+    key = (float(sampling_rate), float(window_length), float(cutoff))
+    if key not in _WINDOW_PLAN_CACHE:
+        window_samples = sampling_rate * window_length
+        fft_plan = get_fft_plan(int(window_samples), sampling_rate, cutoff)
+        _WINDOW_PLAN_CACHE[key] = WindowPlan(sampling_rate, window_length, window_samples, fft_plan)
+    return _WINDOW_PLAN_CACHE[key]
+
+def window_bounds(total_samples, sampling_rate, window_length=3.0):
+    '''
+    Positional bounds of the non-overlapping windows used by the classifiers.
+
+    :param total_samples: number of samples in signal
+    :param sampling_rate: sampling rate of signal
+    :param window_length: length of window in seconds
+    :return: list of (start, stop) positions; window i covers samples start:stop
+    '''
+    window_samples = get_window_plan(sampling_rate, window_length).window_samples
+    total_windows = round(total_samples / float(window_samples))
+
+    bounds = []
+    for win in range(int(total_windows)):
+        current_win_start = int(window_samples * win + 1)
+        current_win_end = int(current_win_start + window_samples - 1)
+        bounds.append((current_win_start, min(current_win_end + 1, total_samples)))
+
+    return bounds
+
+def sliding_window_bounds(total_samples, sampling_rate, window_length=3.0, hop=0.5):
+    '''
+    Positional bounds of overlapping windows advanced by hop seconds. Windows start at the same sample as
+    window_bounds() and every window is complete; with hop == window_length the windows are those of window_bounds()
+    without a trailing partial window.
+
+    :param total_samples: number of samples in signal
+    :param sampling_rate: sampling rate of signal
+    :param window_length: length of window in seconds
+    :param hop: time (seconds) between the starts of consecutive windows
+    :return: numpy arrays of start and stop positions; window i covers samples starts[i]:stops[i]
+    '''
+    window_samples = int(get_window_plan(sampling_rate, window_length).window_samples)
+    hop_samples = hop * sampling_rate
+    if hop_samples < 1:
+        raise ValueError('hop must be at least one sample (%s s at %s Hz)' % (hop, sampling_rate))
+
+    total_windows = max(int(np.floor((total_samples - 1 - window_samples) / hop_samples)) + 1, 0)
+    starts = (hop_samples * np.arange(total_windows) + 1).astype(int)
+    starts = starts[starts + window_samples <= total_samples]
+
+    return starts, starts + window_samples
+
+def sosfiltfilt_float32(sos, data, padlen, max_chunk_samples=2 ** 16):
+    '''
+    Forward-backward filter of single precision signals along the first axis with second-order sections. Same result
+    as signal.sosfiltfilt(sos, data, padlen=padlen, axis=0) (odd extension) up to single precision rounding: the
+    coefficients and filter state stay in double precision, the signal and the forward pass are held in single
+    precision and only chunks of max_chunk_samples are converted to double precision at a time.
+
+    :param sos: second-order sections (see design_butter_sos)
+    :param data: float32 numpy array of shape (samples,) or (samples, channels)
+    :param padlen: number of samples of odd extension at both ends
+    :param max_chunk_samples: number of samples filtered at once (bounds the double precision temporaries)
+    :return: float32 numpy array of filtered data
+    '''
+    n = data.shape[0]
+    if n <= padlen:
+        raise ValueError('The length of the input vector must be greater than padlen (%d)' % padlen)
+
+    # Odd extension of both ends (signal.sosfiltfilt padtype='odd')
+    first = data[0].astype(np.float64)
+    last = data[-1].astype(np.float64)
+    left = 2 * first - data[padlen:0:-1].astype(np.float64)
+    right = 2 * last - data[-2:-padlen - 2:-1].astype(np.float64)
+
+    zi_shape = (sos.shape[0], 2) + (1,) * (data.ndim - 1)
+    zi = signal.sosfilt_zi(sos).reshape(zi_shape)
+    chunks = [slice(start, min(start + max_chunk_samples, n)) for start in range(0, n, max_chunk_samples)]
+    filtered = np.empty(data.shape, dtype=np.float32)
+
+    # Forward pass over left extension, signal and right extension
+    forward_left, state = signal.sosfilt(sos, left, axis=0, zi=zi * left[0])
+    for chunk in chunks:
+        forward, state = signal.sosfilt(sos, data[chunk].astype(np.float64), axis=0, zi=state)
+        filtered[chunk] = forward
+    forward_right, _ = signal.sosfilt(sos, right, axis=0, zi=state)
+
+    # Backward pass from the end of the right extension; the left extension is filtered only for the trimmed output
+    _, state = signal.sosfilt(sos, forward_right[::-1], axis=0, zi=zi * forward_right[-1])
+    for chunk in reversed(chunks):
+        backward, state = signal.sosfilt(sos, filtered[chunk][::-1].astype(np.float64), axis=0, zi=state)
+        filtered[chunk] = backward[::-1]
+    return filtered
+
+@profiler.instrument('preprocess.band_pass_filter_array')
+def band_pass_filter_array(data, sampling_rate, bp_cutoff, order):
+    '''
+    Band-pass filter a numpy array of sensor signals along the first axis.
+
+    :param data: numpy array of shape (samples,) or (samples, channels)
+    :param sampling_rate: sampling rate of signal
     :param bp_cutoff: filter cutoffs
     :param order: filter order
-    :param channels: channels of signal to filter
-    :return: dataframe of raw and filtered data
+    :return: numpy array of filtered data. float32 if data is float32.
     '''
-    data = data_df[channels].values
-
-    # Calculate the critical frequency (radians/sample) based on cutoff frequency (Hz) and sampling rate (Hz)
-    critical_frequency = [bp_cutoff[0]* 2.0 / sampling_rate, bp_cutoff[1]* 2.0 / sampling_rate]
+    if data.dtype == np.float32:
+        # Single precision input: second-order sections with double precision coefficients (the (b, a) form is not
+        # stable in single precision for the narrow/low frequency bands used here) and the same padding, with the
+        # signal kept in single precision (see precision_report.compare_filter_forms for the difference of forms)
+        sos = design_butter_sos(sampling_rate, bp_cutoff, order, btype='bandpass')
+        return sosfiltfilt_float32(sos, data, padlen=10)
 
     # Get the numerator (b) and denominator (a) of the IIR filter
-    [b, a] = signal.butter(N=order, Wn=critical_frequency, btype='bandpass', analog=False)
+    [b, a] = design_butter_ba(sampling_rate, bp_cutoff, order, btype='bandpass')
 
     # Apply filter to raw data
-    bp_filtered_data = signal.filtfilt(b, a, data, padlen=10, axis=0)
+    return signal.filtfilt(b, a, data, padlen=10, axis=0)
 
-    new_channel_labels = [ax + '_bp_filt_' + str(bp_cutoff) for ax in channels]
+@profiler.instrument('preprocess.band_pass_filter')
+def band_pass_filter(data_df, sampling_rate, bp_cutoff, order, channels=['X', 'Y', 'Z']):
+    '''
+    Band-pass filter a given sensor signal.
+
+    :param data_df: dataframe housing sensor signals
+    :param sampling_rate: sampling rate of signal
+    :param bp_cutoff: filter cutoffs
+    :param order: filter order
+    :param channels: channels of signal to filter
+    :return: dataframe of raw and filtered data. Filtered channels are float32 if the input channels are float32.
+    '''
+    bp_filtered_data = band_pass_filter_array(data_df[channels].values, sampling_rate, bp_cutoff, order)
+
+    new_channel_labels = band_pass_channel_labels(channels, bp_cutoff)
 
     data_df[new_channel_labels] = pd.DataFrame(bp_filtered_data)
 
     return data_df
 
+def band_pass_channel_labels(channels, bp_cutoff):
+    '''
+    Names given to band-pass filtered channels.
+
+    :param channels: channels of signal that were filtered
+    :param bp_cutoff: filter cutoffs
+    :return: list of filtered channel names (Ex: 'x_bp_filt_[0.25, 3.0]')
+    '''
+    return [ax + '_bp_filt_' + str(bp_cutoff) for ax in channels]
+
+@profiler.instrument('preprocess.principal_component_array')
+def principal_component_array(data, n_components=1):
+    '''
+    Compute principal components of a numpy array of sensor signals.
+
+    :param data: numpy array of shape (samples, channels)
+    :param n_components: number of principal components
+    :return: numpy array of shape (samples, n_components) with the dtype of data
+    '''
+    pca = PCA(n_components=n_components, svd_solver='arpack')
+
+    return pca.fit_transform(data).astype(data.dtype, copy=False)
+
+@profiler.instrument('preprocess.get_principal_component')
 def get_principal_component(data_df, channels=['X', 'Y', 'Z'], n_components=1):
     '''
     Compute principal components of sensor signal.
 
     :param data_df: dataframe housing sensor signals
     :param channels: channels of sensor signal to compute principal component analysis on
-    :return: dataframe of raw data and principal components
+    :return: dataframe of raw data and principal components. Principal components keep the dtype of the channels.
     '''
-    pca = PCA(n_components=n_components, svd_solver='arpack')
-
-    principal_component = pca.fit_transform(data_df[channels])
+    principal_component = principal_component_array(data_df[channels].values, n_components=n_components)
 
     principal_component_df = pd.DataFrame(principal_component)
     cols = ['PC'+str(i+1) for i in range(0,n_components)]
@@ -52,4 +324,67 @@ def get_principal_component(data_df, channels=['X', 'Y', 'Z'], n_components=1):
 
     data_df = pd.concat([data_df, principal_component_df], axis=1)
 
-    return data_df
\ No newline at end of file
+    return data_df
+
+def decimation_factor(sampling_rate, min_sampling_rate):
+    '''
+    Largest integer decimation factor that keeps the decimated sampling rate at or above a minimum rate.
+
+    :param sampling_rate: sampling rate of signal
+    :param min_sampling_rate: lowest acceptable sampling rate after decimation
+    :return: decimation factor (int, >= 1)
+    '''
+    return max(1, int(np.floor(sampling_rate / float(min_sampling_rate))))
+
+def design_decimation_sos(q):
+    '''
+    Anti-aliasing low-pass filter for decimation by q: 8th order Chebyshev type I filter (0.05 dB ripple) with its
+    cutoff at 0.8 times the decimated Nyquist frequency, the IIR filter of signal.decimate(). Designs are cached per q.
+
+    :param q: decimation factor (int, >= 2)
+    :return: numpy array of second-order sections
+    '''
+    key = ('decimate', int(q))
+    if key not in _FILTER_CACHE:
+        _FILTER_CACHE[key] = signal.cheby1(8, 0.05, 0.8 / q, output='sos')
+    return _FILTER_CACHE[key]
+
+@profiler.instrument('preprocess.decimate_array')
+def decimate_array(data, q):
+    '''
+    Decimate sensor signals along the first axis: zero phase anti-aliasing low-pass filter (design_decimation_sos) and
+    every q-th sample. Same as signal.decimate(data, q, ftype='iir', zero_phase=True, axis=0) with second-order
+    sections.
+
+    :param data: numpy array of shape (samples,) or (samples, channels)
+    :param q: decimation factor (int, >= 1)
+    :return: numpy array of decimated data (a copy). float32 if data is float32.
+    '''
+    if q == 1:
+        return data.copy()
+
+    sos = design_decimation_sos(q)
+    padlen = 3 * (2 * len(sos) + 1)
+    if data.dtype == np.float32:
+        filtered_data = sosfiltfilt_float32(sos, data, padlen=padlen)
+    else:
+        filtered_data = signal.sosfiltfilt(sos, data, padlen=padlen, axis=0)
+    return filtered_data[::q].copy()
+
+@profiler.instrument('preprocess.decimate_channels')
+def decimate_channels(data_df, sampling_rate, channels, min_sampling_rate):
+    '''
+    Decimate sensor signals to at least min_sampling_rate with decimate_array() (anti-aliasing filter, then every
+    q-th sample).
+
+    :param data_df: dataframe housing sensor signals
+    :param sampling_rate: sampling rate of signal
+    :param channels: channels of signal to decimate
+    :param min_sampling_rate: lowest acceptable sampling rate after decimation
+    :return: dataframe of decimated channels (index reset), decimated sampling rate
+    '''
+    q = decimation_factor(sampling_rate, min_sampling_rate)
+
+    decimated_df = pd.DataFrame(decimate_array(data_df[channels].values, q), columns=channels)
+
+    return decimated_df, sampling_rate / float(q)
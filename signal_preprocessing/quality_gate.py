@@ -0,0 +1,147 @@
+'''
+This file houses a low-cost signal-quality gate that runs on raw x/y/z accelerometer data before feature extraction
+and flags the 3 second classifier windows (see preprocess.window_bounds) that should not be analyzed:
+
+non_wear:   device off the wrist. Standard deviation below 13 mG or range below 50 mG on at least two axes over the
+            surrounding 30 minutes (van Hees et al. 2013)
+clipping:   at least 1% of samples at the sensor dynamic range on any axis
+flat_line:  all axes constant within the window (stuck sensor, padded data)
+gap:        missing samples within the window (NaN values or a timestamp step of more than twice the median step)
+
+All statistics are computed per window on a decimated copy of the raw signal (every q-th sample,
+q = floor(fs / min_sampling_rate)) with cumulative sums, so the gate costs a small fraction of the feature
+extraction. Pass quality_df.excluded.values as excluded_windows to the classifier builders and amplitude functions to
+skip the flagged windows, and quality_df.excluded as the 'excluded' column of the predictions given to
+filter_classifier_predictions.filter_predictions_by_tree() to report them as excluded.
+'''
+import numpy as np
+import pandas as pd
+from signal_preprocessing import preprocess
+from instrumentation import profiler
+
+QUALITY_FLAGS = ['non_wear', 'clipping', 'flat_line', 'gap']
+
+# Thresholds of the quality flags (G's and seconds)
+QUALITY_THRESHOLDS = {'non_wear_duration': 1800.0,
+                      'non_wear_std': 0.013,
+                      'non_wear_range': 0.05,
+                      'non_wear_axes': 2,
+                      'dynamic_range': 8.0,
+                      'clipping_margin': 0.05,
+                      'clipping_fraction': 0.01,
+                      'flat_line_range': 1e-6,
+                      'gap_factor': 2.0}
+
+def _rolling_window_sum(values, half_width):
+    # Sum over windows i - half_width ... i + half_width (clipped at the edges)
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    idx = np.arange(len(values))
+    return csum[np.minimum(idx + half_width + 1, len(values))] - csum[np.maximum(idx - half_width, 0)]
+
+def _timestamp_steps(ts):
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        return np.diff(ts.values.astype(np.int64)).astype(float)
+    if pd.api.types.is_numeric_dtype(ts):
+        return np.diff(ts.values.astype(float))
+    return None
+
+@profiler.instrument('quality_gate.assess_window_quality')
+def assess_window_quality(raw_accelerometer_data_df, fs, window_length=3.0, min_sampling_rate=10.0, thresholds=None,
+                          channels=['x', 'y', 'z']):
+    '''
+    Flag non-wear, clipping, flat-line and gap windows of raw accelerometer data.
+
+    :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts','x','y','z'] ('ts' is
+    optional and only used for gap detection)
+    :param fs: Sampling rate of raw accelerometer data (float)
+    :param window_length: Length (in seconds) of the classifier windows
+    :param min_sampling_rate: Lowest sampling rate of the decimated signal used for the statistics
+    :param thresholds: Dictionary overriding entries of QUALITY_THRESHOLDS
+    :param channels: Accelerometer channels
+    :return: Pandas DataFrame indexed by window number with columns ['start', 'stop'] (sample positions),
+    one boolean column per quality flag and 'excluded' (any flag set)
+    '''
+    limits = dict(QUALITY_THRESHOLDS)
+    if thresholds is not None:
+        limits.update(thresholds)
+
+    total_samples = raw_accelerometer_data_df.shape[0]
+    bounds = preprocess.window_bounds(total_samples, fs, window_length)
+    columns = ['start', 'stop'] + QUALITY_FLAGS + ['excluded']
+    if not bounds:
+        return pd.DataFrame(columns=columns)
+
+    starts = np.array([start for start, _ in bounds])
+    stops = np.array([stop for _, stop in bounds])
+
+    # Decimated signal; decimated sample positions of the window edges (windows are contiguous)
+    q = preprocess.decimation_factor(fs, min_sampling_rate)
+    positions = np.arange(0, total_samples, q)
+    first = np.searchsorted(positions, starts)
+    last = np.searchsorted(positions, stops[-1])
+    data = raw_accelerometer_data_df[channels].values[::q][:last].astype(np.float64)
+
+    missing = np.isnan(data)
+    valid_counts = np.add.reduceat((~missing).astype(float), first, axis=0)
+
+    # Per window sums of the mean removed signal (NaN's left out), minimum and maximum per axis
+    centered = np.where(missing, 0.0, data - np.nanmean(data, axis=0))
+    sums = np.add.reduceat(centered, first, axis=0)
+    sums_squared = np.add.reduceat(centered ** 2, first, axis=0)
+    minimum = np.fmin.reduceat(data, first, axis=0)
+    maximum = np.fmax.reduceat(data, first, axis=0)
+
+    # Non-wear: statistics over the surrounding non_wear_duration seconds
+    half_width = int(round(limits['non_wear_duration'] / (2.0 * window_length)))
+    context_counts = np.column_stack([_rolling_window_sum(valid_counts[:, axis], half_width)
+                                      for axis in range(len(channels))])
+    context_mean = np.column_stack([_rolling_window_sum(sums[:, axis], half_width)
+                                    for axis in range(len(channels))]) / context_counts
+    context_mean_squared = np.column_stack([_rolling_window_sum(sums_squared[:, axis], half_width)
+                                            for axis in range(len(channels))]) / context_counts
+    context_std = np.sqrt(np.maximum(context_mean_squared - context_mean ** 2, 0.0))
+    context_range = (pd.DataFrame(maximum).rolling(2 * half_width + 1, center=True, min_periods=1).max().values -
+                     pd.DataFrame(minimum).rolling(2 * half_width + 1, center=True, min_periods=1).min().values)
+    low_std_axes = np.sum(context_std < limits['non_wear_std'], axis=1)
+    low_range_axes = np.sum(context_range < limits['non_wear_range'], axis=1)
+    non_wear = (low_std_axes >= limits['non_wear_axes']) | (low_range_axes >= limits['non_wear_axes'])
+
+    # Clipping: fraction of samples at the dynamic range on any axis
+    at_range = np.any(np.abs(np.where(missing, 0.0, data)) >= limits['dynamic_range'] - limits['clipping_margin'],
+                      axis=1)
+    window_counts = np.add.reduceat(np.ones(len(data)), first)
+    clipped_fraction = np.add.reduceat(at_range.astype(float), first) / window_counts
+    clipping = clipped_fraction >= limits['clipping_fraction']
+
+    # Flat line: every axis constant
+    flat_line = np.all((maximum - minimum) <= limits['flat_line_range'], axis=1)
+
+    # Gap: missing values or a large timestamp step
+    gap = np.add.reduceat(np.any(missing, axis=1).astype(float), first) > 0
+    if 'ts' in raw_accelerometer_data_df.columns:
+        steps = _timestamp_steps(raw_accelerometer_data_df['ts'].iloc[::q].iloc[:last])
+        if steps is not None and len(steps) > 0:
+            large_steps = np.where(steps > limits['gap_factor'] * np.median(steps))[0] + 1
+            gap_windows = np.searchsorted(first, large_steps, side='right') - 1
+            gap[np.unique(gap_windows[gap_windows >= 0])] = True
+
+    quality_df = pd.DataFrame({'start': starts, 'stop': stops, 'non_wear': non_wear, 'clipping': clipping,
+                               'flat_line': flat_line, 'gap': gap}, columns=columns[:-1])
+    quality_df['excluded'] = quality_df[QUALITY_FLAGS].any(axis=1)
+
+    profiler.record_windows('quality_gate.assess_window_quality', processed=len(bounds))
+    return quality_df
+
+def excluded_window_mask(excluded_windows, number_of_windows):
+    '''
+    Boolean mask of excluded windows for a classifier that produces number_of_windows windows.
+
+    :param excluded_windows: boolean array-like indexed by window number (Ex: quality_df.excluded.values) or None
+    :param number_of_windows: number of windows of the classifier
+    :return: numpy array of booleans (windows beyond the end of excluded_windows are not excluded)
+    '''
+    mask = np.zeros(number_of_windows, dtype=bool)
+    if excluded_windows is not None:
+        excluded_windows = np.asarray(excluded_windows, dtype=bool)[:number_of_windows]
+        mask[:len(excluded_windows)] = excluded_windows
+    return mask
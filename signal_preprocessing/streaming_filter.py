@@ -0,0 +1,164 @@
+'''
+This file houses a streaming (chunk-by-chunk) version of the Butterworth filters used in pre-processing. The offline
+pipeline filters with signal.filtfilt, which is zero-phase but needs the whole recording. The streaming filter carries
+second-order-section state between chunks so it can run on live or chunked data in one of two modes:
+
+causal:     single forward pass, no added delay (non-zero phase)
+lookahead:  forward pass plus a backward pass over a fixed number of future samples. Approximates filtfilt with an
+            output delay of exactly `lookahead` seconds.
+'''
+
+from scipy import signal
+import numpy as np
+from signal_preprocessing import preprocess
+
+class StreamingFilter(object):
+    '''
+    Butterworth filter that processes a signal in consecutive chunks while keeping filter state between chunks.
+    '''
+
+    def __init__(self, sampling_rate, cutoff, order, btype='bandpass', mode='causal', lookahead=3.0):
+        '''
+        :param sampling_rate: sampling rate of signal
+        :param cutoff: filter cutoff(s) in Hz. [low, high] for band-pass, single value for low-pass/high-pass
+        :param order: filter order
+        :param btype: filter type ('bandpass', 'lowpass' or 'highpass')
+        :param mode: 'causal' or 'lookahead'
+        :param lookahead: length (in seconds) of future signal used by the backward pass in 'lookahead' mode
+        '''
+        if mode not in ('causal', 'lookahead'):
+            raise ValueError("mode should be 'causal' or 'lookahead'")
+
+        self.sampling_rate = sampling_rate
+        self.mode = mode
+        self.sos = preprocess.design_butter_sos(sampling_rate, cutoff, order, btype=btype)
+        self.lookahead_samples = int(round(lookahead * sampling_rate)) if mode == 'lookahead' else 0
+
+        self._zi_unit = signal.sosfilt_zi(self.sos)
+        self.reset()
+
+    @property
+    def delay_samples(self):
+        '''
+        Number of samples between a sample entering the filter and its filtered value being returned.
+        '''
+        return self.lookahead_samples
+
+    def reset(self):
+        '''
+        Clear filter state so the next chunk is treated as the start of a new signal.
+        '''
+        self._zi = None
+        self._pending = None
+
+    def _steady_state(self, sample):
+        # Filter state for a signal that has been constant at `sample` forever (matches the filtfilt start-up)
+        return self._zi_unit.reshape(self._zi_unit.shape + (1,) * sample.ndim) * sample
+
+    def _backward(self, forward_filtered):
+        reversed_data = forward_filtered[::-1]
+        backward_filtered, _ = signal.sosfilt(self.sos, reversed_data, axis=0,
+                                              zi=self._steady_state(reversed_data[0]))
+        return backward_filtered[::-1]
+
+    def process(self, chunk):
+        '''
+        Filter the next chunk of signal.
+
+        :param chunk: numpy array of shape (samples,) or (samples, channels)
+        :return: numpy array of filtered samples. In 'causal' mode it has the same length as chunk. In 'lookahead' mode
+        samples are returned once `lookahead` seconds of future signal are available, so the output lags the input by
+        delay_samples.
+        '''
+        chunk = np.asarray(chunk, dtype=float)
+        if chunk.shape[0] == 0:
+            return chunk
+
+        if self._zi is None:
+            self._zi = self._steady_state(chunk[0])
+
+        forward_filtered, self._zi = signal.sosfilt(self.sos, chunk, axis=0, zi=self._zi)
+
+        if self.mode == 'causal':
+            return forward_filtered
+
+        if self._pending is None:
+            self._pending = forward_filtered
+        else:
+            self._pending = np.concatenate([self._pending, forward_filtered], axis=0)
+
+        n_ready = self._pending.shape[0] - self.lookahead_samples
+        if n_ready <= 0:
+            return self._pending[:0]
+
+        filtered = self._backward(self._pending)[:n_ready]
+        self._pending = self._pending[n_ready:]
+
+        return filtered
+
+    def flush(self):
+        '''
+        Return the samples still held back in 'lookahead' mode (end of signal) and reset the filter.
+
+        :return: numpy array of remaining filtered samples
+        '''
+        if self._pending is None or self._pending.shape[0] == 0:
+            remaining = np.zeros((0,))
+        else:
+            remaining = self._backward(self._pending)
+        self.reset()
+        return remaining
+
+    def filter_chunks(self, chunks):
+        '''
+        Filter an iterable of chunks and return the complete filtered signal (including the flushed tail).
+
+        :param chunks: iterable of numpy arrays of shape (samples,) or (samples, channels)
+        :return: numpy array of filtered signal
+        '''
+        outputs = [self.process(chunk) for chunk in chunks]
+        tail = self.flush()
+        if tail.shape[0] > 0:
+            outputs.append(tail)
+        return np.concatenate(outputs, axis=0)
+
+def compare_with_filtfilt(reference_data, sampling_rate, cutoff, order, btype='bandpass', mode='causal',
+                          lookahead=3.0, chunk_size=None, padlen=10):
+    '''
+    Measure how far the streaming filter output deviates from the offline filtfilt output on reference data.
+
+    :param reference_data: numpy array of shape (samples,) or (samples, channels)
+    :param sampling_rate: sampling rate of signal
+    :param cutoff: filter cutoff(s) in Hz
+    :param order: filter order
+    :param btype: filter type ('bandpass', 'lowpass' or 'highpass')
+    :param mode: streaming mode to evaluate ('causal' or 'lookahead')
+    :param lookahead: lookahead (in seconds) for 'lookahead' mode
+    :param chunk_size: number of samples per chunk fed to the streaming filter (default: 1 second of signal)
+    :param padlen: padlen passed to filtfilt. band_pass_filter uses 10, detect_hand_movement uses the scipy default (None)
+    :return: dictionary with max absolute error, RMS error and RMS error relative to the RMS of the filtfilt output
+    '''
+    reference_data = np.asarray(reference_data, dtype=float)
+
+    critical_frequency = [c * 2.0 / sampling_rate for c in np.atleast_1d(cutoff)]
+    if len(critical_frequency) == 1:
+        critical_frequency = critical_frequency[0]
+    [b, a] = signal.butter(N=order, Wn=critical_frequency, btype=btype, analog=False)
+    offline = signal.filtfilt(b, a, reference_data, padlen=padlen, axis=0)
+
+    if chunk_size is None:
+        chunk_size = int(sampling_rate)
+    chunks = [reference_data[i:i + chunk_size] for i in range(0, reference_data.shape[0], chunk_size)]
+
+    streaming_filter = StreamingFilter(sampling_rate, cutoff, order, btype=btype, mode=mode, lookahead=lookahead)
+    streamed = streaming_filter.filter_chunks(chunks)
+
+    error = streamed - offline
+    rms_error = np.sqrt(np.mean(np.square(error)))
+    rms_offline = np.sqrt(np.mean(np.square(offline)))
+
+    return {'mode': mode,
+            'delay_samples': streaming_filter.delay_samples,
+            'max_abs_error': np.max(np.abs(error)),
+            'rms_error': rms_error,
+            'relative_rms_error': rms_error / rms_offline if rms_offline > 0 else np.nan}
@@ -0,0 +1,129 @@
+'''
+This file contains the conformance check of the feature kernel backends (features/backends.py). Every kernel of every
+available backend is run on the same inputs and compared with the original per-sample loops of signal_entropy(),
+mean_cross_rate(), compute_rolling_mean() and compute_rolling_std():
+
+|Kernel | Tolerance |
+| --- | --- |
+| histogram_entropy | rtol 1e-9 (summation order) |
+| sign_change_count | exact |
+| rolling_mean, rolling_std | atol 1e-9 relative to the signal scale (running sums instead of per-window sums) |
+
+Run with: python -m validation.backend_conformance
+'''
+import numpy as np
+import pandas as pd
+from features import backends
+
+def _reference_histogram_entropy(h, lowerbound, upperbound):
+    ncell = len(h)
+    estimate = 0
+    count = 0
+    for n in range(ncell):
+        if h[n] != 0:
+            logf = np.log(h[n])
+        else:
+            logf = 0
+        count = count + h[n]
+        estimate = estimate - h[n] * logf
+
+    nbias = -(float(ncell) - 1) / (2 * count)
+    estimate = estimate / count
+    estimate = estimate + np.log(count) + np.log((upperbound - lowerbound) / ncell) - nbias
+    return np.exp(estimate ** 2) - np.exp(0) - 1
+
+def _reference_sign_change_count(x):
+    changes = 0
+    for i in range(len(x) - 1):
+        if np.sign(x[i]) != np.sign(x[i + 1]):
+            changes += 1
+    return changes
+
+def _reference_rolling(x, window_length, statistic):
+    half = window_length // 2
+    y = np.zeros(len(x))
+    for i in range(len(x)):
+        if i < half:
+            y[i] = statistic(x[0:i + half])
+        elif len(x) - i < half:
+            y[i] = statistic(x[i - half:])
+        else:
+            y[i] = statistic(x[i - half: i + half])
+    return y
+
+def _test_signals(random_state):
+    n = 3000
+    t = np.arange(n) / 100.0
+    signals = {'noise': random_state.normal(size=n),
+               'vector_magnitude': 1.0 + 0.05 * np.sin(2 * np.pi * 1.5 * t) + 0.005 * random_state.normal(size=n),
+               'constant': np.ones(n),
+               'zeros_and_steps': np.repeat([0.0, 1.0, 0.0, -1.0, 0.0], n // 5),
+               'short': random_state.normal(size=7)}
+    with_nan = random_state.normal(size=n)
+    with_nan[random_state.choice(n, 20, replace=False)] = np.nan
+    signals['with_nan'] = with_nan
+    return signals
+
+def _compare(backend_name, kernel, signal_name, reference, candidate, rtol, atol):
+    reference = np.atleast_1d(np.asarray(reference, dtype=float))
+    candidate = np.atleast_1d(np.asarray(candidate, dtype=float))
+    same_shape = reference.shape == candidate.shape
+    finite = np.isfinite(reference) & np.isfinite(candidate) if same_shape else np.zeros(0, dtype=bool)
+    max_abs_error = np.max(np.abs(reference[finite] - candidate[finite])) if finite.any() else 0.0
+    passed = same_shape and bool(np.allclose(reference, candidate, rtol=rtol, atol=atol, equal_nan=True))
+    return {'backend': backend_name, 'kernel': kernel, 'signal': signal_name, 'max_abs_error': max_abs_error,
+            'passed': passed}
+
+def check_backend_conformance(backend_names=None, window_lengths=(3, 11, 101), random_state=0):
+    '''
+    Run every kernel on every backend and compare with the reference loops.
+
+    :param backend_names: backends to check (default: all available backends)
+    :param window_lengths: odd rolling window lengths to check
+    :param random_state: seed of the test signals
+    :return: Pandas DataFrame with one row per backend, kernel and test signal (max absolute error, passed)
+    '''
+    if backend_names is None:
+        backend_names = backends.available_backends()
+    signals = _test_signals(np.random.RandomState(random_state))
+
+    rows = []
+    for backend_name in backend_names:
+        backend = backends.get_backend(backend_name)
+        for signal_name in sorted(signals):
+            x = signals[signal_name]
+
+            rows.append(_compare(backend_name, 'sign_change_count', signal_name, _reference_sign_change_count(x),
+                                 backend.sign_change_count(x), rtol=0.0, atol=0.0))
+
+            finite = x[np.isfinite(x)]
+            if np.std(finite) > 0:
+                data_norm = finite / np.std(finite)
+                ncell = int(np.ceil(np.sqrt(len(data_norm))))
+                h = np.histogram(data_norm, ncell, range=(data_norm.min(), data_norm.max()))[0]
+                delta = (data_norm.max() - data_norm.min()) / (len(data_norm) - 1)
+                lowerbound, upperbound = data_norm.min() - delta / 2, data_norm.max() + delta / 2
+                rows.append(_compare(backend_name, 'histogram_entropy', signal_name,
+                                     _reference_histogram_entropy(h, lowerbound, upperbound),
+                                     backend.histogram_entropy(h, lowerbound, upperbound), rtol=1e-9, atol=0.0))
+
+            if np.isfinite(x).all():
+                atol = 1e-9 * max(np.max(np.abs(x)), 1.0)
+                for window_length in window_lengths:
+                    rows.append(_compare(backend_name, 'rolling_mean_%d' % window_length, signal_name,
+                                         _reference_rolling(x, window_length, np.mean),
+                                         backend.rolling_mean(x, window_length), rtol=0.0, atol=atol))
+                    rows.append(_compare(backend_name, 'rolling_std_%d' % window_length, signal_name,
+                                         _reference_rolling(x, window_length, np.std),
+                                         backend.rolling_std(x, window_length), rtol=0.0, atol=atol))
+
+    return pd.DataFrame(rows, columns=['backend', 'kernel', 'signal', 'max_abs_error', 'passed'])
+
+if __name__ == "__main__":
+    '''
+    Main runner of the backend conformance check.
+    '''
+    conformance_df = check_backend_conformance()
+    print(conformance_df.to_string())
+    if not conformance_df.passed.all():
+        raise SystemExit('Feature backend conformance check failed')
@@ -0,0 +1,209 @@
+'''
+This file contains code to check the vectorized endpoint engines against the per-recording endpoint functions of
+resting_tremor_endpoints and bradykinesia_endpoints:
+
+1. check_bout_estimators(): bootstrap.no_hand_movement_bouts() against
+   bradykinesia_endpoints.compute_aggregate_length_of_no_hand_movement_bouts() on random prediction sequences with
+   'NA' and excluded windows (point estimate), and the per-block bout sums of the bootstrap replicates against
+   calculate_hand_movement_bout_lengths() run on every block on its own (replicate statistic).
+2. compare_cohort_with_per_recording(): every endpoint of cohort_endpoints.compute_cohort_endpoints() group by group
+   against the per-recording functions.
+
+Both run on random filtered predictions (filter_predictions_by_tree() of random classifier outputs), so 'NA' windows
+appear wherever gait was detected during hand movement. Run with: python -m validation.endpoint_equivalence
+'''
+import numpy as np
+import pandas as pd
+from endpoints import filter_classifier_predictions
+from endpoints import resting_tremor_endpoints
+from endpoints import bradykinesia_endpoints
+from endpoints import bootstrap
+from endpoints import cohort_endpoints
+
+# Largest absolute difference accepted between an engine and the per-recording functions
+ENDPOINT_TOLERANCE = 1e-9
+
+def random_filtered_predictions(n_windows, random_state=None, switch_probability=0.2, gait_probability=0.3,
+                                excluded_probability=0.05):
+    '''
+    Random filtered predictions of one recording.
+
+    :param n_windows: Number of windows
+    :param random_state: Seed (int) or numpy RandomState
+    :param switch_probability: Probability that the hand movement prediction changes from one window to the next
+    :param gait_probability: Probability of gait in a window (hand movement during gait becomes 'NA')
+    :param excluded_probability: Probability of a window excluded by the quality gate
+    :return: Pandas DataFrame as returned by filter_classifier_predictions.filter_predictions_by_tree()
+    '''
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+    switches = random_state.uniform(size=n_windows) < switch_probability
+    hand_movement = (np.cumsum(switches) + random_state.randint(2)) % 2
+    algorithm_predictions = pd.DataFrame({
+        'hand_movement': hand_movement,
+        'gait': (random_state.uniform(size=n_windows) < gait_probability).astype(int),
+        'tremor_constancy': random_state.randint(2, size=n_windows),
+        'tremor_amplitude': random_state.gamma(2.0, size=n_windows),
+        'hand_movement_amplitude': random_state.gamma(2.0, size=n_windows),
+        'hand_movement_jerk': random_state.gamma(2.0, size=n_windows),
+        'excluded': random_state.uniform(size=n_windows) < excluded_probability})
+    return filter_classifier_predictions.filter_predictions_by_tree(algorithm_predictions)
+
+def _with_excluded_markers(hand_movement, break_before, indices):
+    # Windows indices of a sequence without excluded windows, with an excluded marker at every break inside
+    sequence = []
+    for position, index in enumerate(indices):
+        if position > 0 and break_before[index]:
+            sequence.append(filter_classifier_predictions.EXCLUDED)
+        sequence.append(hand_movement[index])
+    return sequence
+
+def check_bout_estimators(n_sequences=500, max_windows=40, random_state=0):
+    '''
+    Compare the vectorized bout statistics with calculate_hand_movement_bout_lengths() on random sequences.
+
+    :param n_sequences: Number of random prediction sequences
+    :param max_windows: Largest number of windows per sequence
+    :param random_state: Seed (int) or numpy RandomState
+    :return: Pandas DataFrame with one row per check (comparisons, mismatches, max absolute difference)
+    '''
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+
+    estimate_differences = []
+    block_differences = []
+    for _ in range(n_sequences):
+        predictions = random_filtered_predictions(random_state.randint(1, max_windows + 1), random_state,
+                                                  switch_probability=random_state.uniform(0.1, 0.6),
+                                                  gait_probability=random_state.uniform(0, 0.6),
+                                                  excluded_probability=random_state.uniform(0, 0.2))
+        sequence = predictions.hand_movement_predictions.tolist()
+
+        # Same preparation as bootstrap_endpoint_confidence_intervals(): excluded windows removed, break after them
+        excluded = np.array([filter_classifier_predictions.is_excluded(value) for value in sequence], dtype=bool)
+        hand_movement = [value for value in sequence if not filter_classifier_predictions.is_excluded(value)]
+        if not len(hand_movement):
+            continue
+        numeric = pd.to_numeric(pd.Series(hand_movement), errors='coerce').values
+        break_before = np.concatenate(([False], excluded[:-1]))[~excluded]
+        bout_starts, bout_windows = bootstrap.no_hand_movement_bouts(numeric == 0, ~np.isnan(numeric), break_before)
+
+        # Point estimate
+        reference_bouts, _ = bradykinesia_endpoints.calculate_hand_movement_bout_lengths(sequence)
+        reference = np.mean(reference_bouts) if reference_bouts else np.nan
+        estimate = bout_windows.sum() / bout_starts.sum() if bout_starts.sum() else np.nan
+        estimate_differences.append(0.0 if np.isnan(reference) and np.isnan(estimate) else abs(estimate - reference))
+
+        # Replicate statistic: every block on its own
+        block_length = random_state.randint(1, len(hand_movement) + 1)
+        block_bouts, block_bout_windows = bootstrap._block_bout_sums(numeric == 0, ~np.isnan(numeric), break_before,
+                                                                     block_length)
+        for start in range(len(hand_movement) - block_length + 1):
+            block = _with_excluded_markers(hand_movement, break_before, range(start, start + block_length))
+            reference_bouts, _ = bradykinesia_endpoints.calculate_hand_movement_bout_lengths(block)
+            block_differences.append(abs(block_bouts[start] - len(reference_bouts)) +
+                                     abs(block_bout_windows[start] - sum(reference_bouts)))
+
+    rows = []
+    for check, differences in [('length_of_no_hand_movement_bouts estimate', estimate_differences),
+                               ('bootstrap block bouts and bout windows', block_differences)]:
+        differences = np.asarray(differences, dtype=float)
+        rows.append({'check': check,
+                     'comparisons': len(differences),
+                     'mismatches': int(np.sum(differences > ENDPOINT_TOLERANCE)),
+                     'max_absolute_difference': differences.max() if len(differences) else np.nan})
+    return pd.DataFrame(rows, columns=['check', 'comparisons', 'mismatches', 'max_absolute_difference'])
+
+def _numeric_endpoint(endpoint_function, values):
+    values = pd.to_numeric(pd.Series(list(values)), errors='coerce').dropna().tolist()
+    return endpoint_function(values) if len(values) else np.nan
+
+def per_recording_endpoints(predictions_df):
+    '''
+    Endpoints of one recording with the per-recording endpoint functions, in the layout of
+    cohort_endpoints.ENDPOINT_COLUMNS.
+
+    :param predictions_df: Pandas DataFrame of filtered predictions of one recording (in time order)
+    :return: dictionary endpoint -> value
+    '''
+    hand_movement = predictions_df.hand_movement_predictions.tolist()
+    excluded_windows = sum(filter_classifier_predictions.is_excluded(value) for value in hand_movement)
+    no_hand_movement_bouts, _ = bradykinesia_endpoints.calculate_hand_movement_bout_lengths(hand_movement)
+    included = predictions_df.shape[0] > excluded_windows
+
+    return {'windows': predictions_df.shape[0],
+            'excluded_windows': excluded_windows,
+            'tremor_constancy': resting_tremor_endpoints.compute_tremor_constancy(
+                predictions_df.tremor_classifier_predictions.tolist()) if included else np.nan,
+            'aggregate_tremor_amplitude': _numeric_endpoint(
+                resting_tremor_endpoints.compute_aggregate_tremor_amplitude,
+                predictions_df.tremor_amplitude_predictions),
+            'aggregate_hand_movement_amplitude': _numeric_endpoint(
+                bradykinesia_endpoints.compute_aggregate_hand_movement_amplitude,
+                predictions_df.hand_movement_amplitude),
+            'aggregate_smoothness_of_hand_movement': _numeric_endpoint(
+                bradykinesia_endpoints.compute_aggregate_smoothness_of_hand_movement,
+                predictions_df.hand_movement_jerk),
+            'percentage_of_no_hand_movement': bradykinesia_endpoints.compute_aggregate_percentage_of_no_hand_movement(
+                hand_movement) if included else np.nan,
+            'length_of_no_hand_movement_bouts': np.mean(no_hand_movement_bouts) if no_hand_movement_bouts else np.nan,
+            'number_of_no_hand_movement_bouts': len(no_hand_movement_bouts),
+            'max_length_of_no_hand_movement_bouts': max(no_hand_movement_bouts) if no_hand_movement_bouts else np.nan}
+
+def compare_cohort_with_per_recording(predictions_df, group_columns=['subject', 'visit'], time_column='window_time',
+                                      chunksize=None):
+    '''
+    Compare compute_cohort_endpoints() with the per-recording endpoint functions group by group.
+
+    :param predictions_df: Pandas DataFrame of filtered predictions of many groups (see cohort_endpoints.py)
+    :param group_columns: Columns identifying a group
+    :param time_column: Column ordering the windows of a group
+    :param chunksize: If given, pass the table to compute_cohort_endpoints() in chunks of this many rows
+    :return: Pandas DataFrame with one row per endpoint (groups, mismatching groups, max absolute difference)
+    '''
+    predictions_df = predictions_df.sort_values(group_columns + [time_column], kind='mergesort')
+    if chunksize is None:
+        cohort_df = cohort_endpoints.compute_cohort_endpoints(predictions_df, group_columns, time_column)
+    else:
+        chunks = [predictions_df.iloc[start:start + chunksize] for start in range(0, predictions_df.shape[0],
+                                                                                  chunksize)]
+        cohort_df = cohort_endpoints.compute_cohort_endpoints(chunks, group_columns, time_column)
+    cohort_df = cohort_df.set_index(group_columns)
+
+    differences = dict((endpoint, []) for endpoint in cohort_endpoints.ENDPOINT_COLUMNS)
+    for key, group_df in predictions_df.groupby(group_columns, sort=False):
+        reference = per_recording_endpoints(group_df)
+        for endpoint in cohort_endpoints.ENDPOINT_COLUMNS:
+            value = float(cohort_df.loc[key, endpoint])
+            expected = float(reference[endpoint])
+            both_nan = np.isnan(value) and np.isnan(expected)
+            differences[endpoint].append(0.0 if both_nan else abs(value - expected))
+
+    rows = []
+    for endpoint in cohort_endpoints.ENDPOINT_COLUMNS:
+        endpoint_differences = np.asarray(differences[endpoint])
+        endpoint_differences = np.where(np.isnan(endpoint_differences), np.inf, endpoint_differences)
+        rows.append({'endpoint': endpoint,
+                     'groups': len(endpoint_differences),
+                     'mismatching_groups': int(np.sum(endpoint_differences > ENDPOINT_TOLERANCE)),
+                     'max_absolute_difference': endpoint_differences.max() if len(endpoint_differences) else np.nan})
+    return pd.DataFrame(rows, columns=['endpoint', 'groups', 'mismatching_groups', 'max_absolute_difference'])
+
+if __name__ == "__main__":
+    '''
+    Main runner of both checks on random predictions.
+    '''
+    print(check_bout_estimators().to_string())
+
+    random_state = np.random.RandomState(1)
+    recordings = []
+    for subject in range(20):
+        for visit in range(3):
+            recording_df = random_filtered_predictions(random_state.randint(1, 400), random_state,
+                                                       gait_probability=random_state.uniform(0, 0.6))
+            recording_df.insert(0, 'window_time', np.arange(recording_df.shape[0]) * 3.0)
+            recording_df.insert(0, 'visit', visit)
+            recording_df.insert(0, 'subject', subject)
+            recordings.append(recording_df)
+    cohort_predictions_df = pd.concat(recordings, ignore_index=True)
+    print(compare_cohort_with_per_recording(cohort_predictions_df, chunksize=5000).to_string())
@@ -0,0 +1,89 @@
+'''
+This file contains code to compare the multi-rate mode of the low-frequency branches against the full-rate outputs.
+
+In multi-rate mode each branch is decimated after its own filter (q = floor(fs / min_sampling_rate)). The hand movement
+branches keep every q-th sample, so the retained samples are exactly the full-rate filtered values: their filters (6th
+order 3 Hz low-pass, 4th order 0.25-3.5 Hz band-pass) already attenuate strongly below the decimated Nyquist frequency.
+The gait branch only has a 1st order 0.25-3 Hz band-pass (about 25 dB at 12.5 Hz after filtfilt), so it is decimated
+with an anti-aliasing filter (preprocess.decimate_array: zero phase 8th order Chebyshev I at 0.8 x the decimated
+Nyquist frequency, passband ripple up to 0.1 dB). Otherwise differences come from evaluating the same signal on a
+coarser sample grid:
+
+|Output | Default min rate | Expected tolerance vs. full rate |
+| --- | --- | --- |
+| detect_hand_movement labels | 10 Hz | Identical except windows whose fraction of above-threshold samples lies within about one decimated sample of 0.5 (the rolling window edges move by up to q-1 samples) |
+| Hand movement amplitude (RMS) | 25 Hz | Sampling error of a 3.5 Hz band-limited signal, small relative to amplitude; window edges shift by up to q-1 samples |
+| Hand movement jerk ratio | 25 Hz | The first difference underestimates the derivative power by (sin(pi*f/fs)/(pi*f/fs))^2: about 0.5% at 1 Hz, 1.2% at 1.5 Hz and 6% at the 3.5 Hz band edge. The peak amplitude used for scaling can also be slightly lower on the coarser grid |
+| Gait RMS, range, correlation, range count, dominant frequency | 25 Hz | Small; the anti-aliasing filter removes the residual content above 10 Hz (which slicing folded into 0-12 Hz) and the FFT grid below 12 Hz is unchanged when fs is a multiple of the decimated rate (nfft scales with the window) |
+| Gait signal entropy, mean cross rate, IQR of autocovariance | 25 Hz | Rate dependent (histogram bin count, per-sample normalisation and lag axis follow the sample count). Train and run gait models in the same mode |
+
+compare_multirate_outputs() measures these differences on a given recording.
+'''
+import numpy as np
+import pandas as pd
+from classifiers import hand_movement_classifier
+from classifiers import hand_movement_features
+from classifiers import gait_classifier
+from classifiers import constants
+
+def relative_error(reference, candidate):
+    '''
+    Element-wise relative error of candidate against reference.
+
+    :param reference: numpy array of reference values
+    :param candidate: numpy array of values to compare
+    :return: numpy array of relative errors (absolute error where the reference is 0)
+    '''
+    reference = np.asarray(reference, dtype=float)
+    candidate = np.asarray(candidate, dtype=float)
+    scale = np.where(reference == 0, 1.0, np.abs(reference))
+    return np.abs(candidate - reference) / scale
+
+def _summarize(output_name, reference, candidate):
+    n = min(len(reference), len(candidate))
+    rel_err = relative_error(np.asarray(reference)[:n], np.asarray(candidate)[:n])
+    return {'output': output_name,
+            'windows_full_rate': len(reference),
+            'windows_multirate': len(candidate),
+            'median_relative_error': np.nanmedian(rel_err) if n else np.nan,
+            'max_relative_error': np.nanmax(rel_err) if n else np.nan}
+
+def compare_multirate_outputs(raw_accelerometer_data_df, fs, include_gait=True):
+    '''
+    Run the hand movement, hand movement feature and gait branches at full rate and in multi-rate mode and report how
+    far the multi-rate outputs deviate.
+
+    :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts','x','y','z']
+    :param fs: Sampling rate of raw accelerometer data (float)
+    :param include_gait: Also compare the selected gait classification features
+    :return: Pandas DataFrame with one row per output (window counts, median and max relative error). For hand
+    movement labels the error columns hold the fraction of windows with a different label.
+    '''
+    rows = []
+
+    labels_full = hand_movement_classifier.detect_hand_movement(raw_accelerometer_data_df.copy(), fs)
+    labels_multi = hand_movement_classifier.detect_hand_movement(raw_accelerometer_data_df.copy(), fs, multirate=True)
+    n = min(len(labels_full), len(labels_multi))
+    disagreement = np.mean(labels_full[:n] != labels_multi[:n]) if n else np.nan
+    rows.append({'output': 'hand_movement_labels',
+                 'windows_full_rate': len(labels_full),
+                 'windows_multirate': len(labels_multi),
+                 'median_relative_error': disagreement,
+                 'max_relative_error': disagreement})
+
+    amplitude_full, jerk_full = hand_movement_features.calculate_amplitude_and_smoothness_features(
+        raw_accelerometer_data_df.copy(), fs)
+    amplitude_multi, jerk_multi = hand_movement_features.calculate_amplitude_and_smoothness_features(
+        raw_accelerometer_data_df.copy(), fs, multirate=True)
+    rows.append(_summarize('hand_movement_amplitude', amplitude_full, amplitude_multi))
+    rows.append(_summarize('hand_movement_jerk', jerk_full, jerk_multi))
+
+    if include_gait:
+        gait_full = gait_classifier.build_gait_classification_feature_set(raw_accelerometer_data_df.copy(), fs)
+        gait_multi = gait_classifier.build_gait_classification_feature_set(raw_accelerometer_data_df.copy(), fs,
+                                                                           multirate=True)
+        for feature in constants.GAIT_FEATURE_SELECTION:
+            rows.append(_summarize(feature, gait_full[feature].values, gait_multi[feature].values))
+
+    return pd.DataFrame(rows, columns=['output', 'windows_full_rate', 'windows_multirate', 'median_relative_error',
+                                       'max_relative_error'])
@@ -0,0 +1,164 @@
+'''
+This file contains code to validate the single precision (float32) mode against the default double precision (float64)
+pipeline.
+
+Float32 mode is selected by loading the raw channels as float32 (preprocess.load_accelerometer_data(filepath,
+dtype=np.float32) or raw_data_df.astype). Filtering then runs on second-order sections (double precision coefficients
+and state, preprocess.sosfiltfilt_float32) with the same padding as the (b, a) filtfilt of the double precision
+pipeline, and every filtered channel, principal component and window feature stays in single precision.
+
+compare_float32_with_float64() therefore measures single precision together with the change of filter form;
+compare_filter_forms() records the difference of forms on its own (both forms in double precision).
+
+Declared accuracy budget (FLOAT32_ACCURACY_BUDGET):
+* Continuous features and endpoints: 99th percentile of the per-window relative error <= 1e-3
+* Discrete outputs (dominant frequency bin, hand movement labels): <= 1% of windows may differ, since values close to a
+  bin edge or to the movement threshold can fall on either side
+'''
+import numpy as np
+import pandas as pd
+from scipy import signal
+from signal_preprocessing import preprocess
+from classifiers import constants
+from classifiers import gait_classifier
+from classifiers import resting_tremor_classifier
+from classifiers import resting_tremor_amplitude_classifier
+from classifiers import hand_movement_classifier
+from classifiers import hand_movement_features
+from endpoints import resting_tremor_endpoints
+from endpoints import bradykinesia_endpoints
+from validation.multirate_equivalence import relative_error
+from benchmarks import synthetic_data
+
+FLOAT32_ACCURACY_BUDGET = {'relative_error_p99': 1e-3,
+                           'window_mismatch_fraction': 0.01}
+
+# Filters of the pipeline: (btype, cutoff, order, padlen)
+PIPELINE_FILTERS = [('bandpass', [0.25, 3.0], 1, 10),
+                    ('bandpass', [3.5, 7.5], 1, 10),
+                    ('bandpass', [0.25, 3.5], 1, 10),
+                    ('bandpass', [0.25, 3.5], 4, 10),
+                    ('bandpass', [3.5, 7.5], 3, 10),
+                    ('lowpass', 3, 6, 21)]
+
+# Outputs that take values from a discrete set and are compared by mismatch fraction
+DISCRETE_OUTPUT_SUFFIXES = ('_dom_freq_value', 'hand_movement_labels')
+
+def _compare(output_name, reference, candidate):
+    reference = np.asarray(reference, dtype=float)
+    candidate = np.asarray(candidate, dtype=float)
+    n = min(len(reference), len(candidate))
+    reference = reference[:n]
+    candidate = candidate[:n]
+
+    rel_err = relative_error(reference, candidate)
+    mismatch = np.mean(reference != candidate) if n else np.nan
+    rel_err_p99 = np.nanpercentile(rel_err, 99) if n else np.nan
+
+    if output_name.endswith(DISCRETE_OUTPUT_SUFFIXES):
+        within_budget = mismatch <= FLOAT32_ACCURACY_BUDGET['window_mismatch_fraction']
+    else:
+        within_budget = rel_err_p99 <= FLOAT32_ACCURACY_BUDGET['relative_error_p99']
+
+    return {'output': output_name,
+            'windows': n,
+            'max_relative_error': np.nanmax(rel_err) if n else np.nan,
+            'relative_error_p99': rel_err_p99,
+            'window_mismatch_fraction': mismatch,
+            'within_budget': bool(within_budget)}
+
+def _endpoints(tremor_amplitudes, hand_movement_labels, hand_movement_amplitudes, hand_movement_jerk):
+    hand_movement_labels = list(hand_movement_labels)
+    return {'aggregate_tremor_amplitude': resting_tremor_endpoints.compute_aggregate_tremor_amplitude(tremor_amplitudes),
+            'aggregate_hand_movement_amplitude':
+                bradykinesia_endpoints.compute_aggregate_hand_movement_amplitude(hand_movement_amplitudes),
+            'aggregate_smoothness_of_hand_movement':
+                bradykinesia_endpoints.compute_aggregate_smoothness_of_hand_movement(hand_movement_jerk),
+            'percentage_of_no_hand_movement':
+                bradykinesia_endpoints.compute_aggregate_percentage_of_no_hand_movement(hand_movement_labels),
+            'length_of_no_hand_movement_bouts':
+                bradykinesia_endpoints.compute_aggregate_length_of_no_hand_movement_bouts(hand_movement_labels)}
+
+def _run_pipeline(raw_accelerometer_data_df, fs):
+    outputs = {}
+    outputs['gait_features'] = gait_classifier.build_gait_classification_feature_set(
+        raw_accelerometer_data_df.copy(), fs)
+    outputs['tremor_features'] = resting_tremor_classifier.build_rest_tremor_classification_feature_set(
+        raw_accelerometer_data_df.copy(), fs)
+    outputs['tremor_amplitude'] = resting_tremor_amplitude_classifier.calculate_tremor_amplitude(
+        raw_accelerometer_data_df.copy(), fs)
+    outputs['hand_movement_labels'] = hand_movement_classifier.detect_hand_movement(raw_accelerometer_data_df.copy(), fs)
+    outputs['hand_movement_amplitude'], outputs['hand_movement_jerk'] = \
+        hand_movement_features.calculate_amplitude_and_smoothness_features(raw_accelerometer_data_df.copy(), fs)
+    outputs['endpoints'] = _endpoints(outputs['tremor_amplitude'], outputs['hand_movement_labels'],
+                                      outputs['hand_movement_amplitude'], outputs['hand_movement_jerk'])
+    return outputs
+
+def compare_float32_with_float64(raw_accelerometer_data_df, fs, channels=['x', 'y', 'z']):
+    '''
+    Run the full pipeline in float64 and float32 and compare every selected feature, per-window output and endpoint.
+    Endpoints are computed over all windows (no filtering by the prediction tree), since no trained models are needed.
+
+    :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts','x','y','z']
+    :param fs: Sampling rate of raw accelerometer data (float)
+    :param channels: Sensor channels to cast
+    :return: Pandas DataFrame with one row per output (max and 99th percentile relative error, fraction of windows
+    that differ and whether the output is within FLOAT32_ACCURACY_BUDGET)
+    '''
+    raw_float64 = raw_accelerometer_data_df.copy()
+    raw_float32 = raw_accelerometer_data_df.copy()
+    for channel in channels:
+        raw_float64[channel] = raw_float64[channel].astype(np.float64)
+        raw_float32[channel] = raw_float32[channel].astype(np.float32)
+
+    reference = _run_pipeline(raw_float64, fs)
+    candidate = _run_pipeline(raw_float32, fs)
+
+    rows = []
+    for feature in constants.GAIT_FEATURE_SELECTION:
+        rows.append(_compare('gait_' + feature, reference['gait_features'][feature].values,
+                             candidate['gait_features'][feature].values))
+    for feature in constants.TREMOR_FEATURE_SELECTION:
+        rows.append(_compare('tremor_' + feature, reference['tremor_features'][feature].values,
+                             candidate['tremor_features'][feature].values))
+    for output in ['tremor_amplitude', 'hand_movement_labels', 'hand_movement_amplitude', 'hand_movement_jerk']:
+        rows.append(_compare(output, reference[output], candidate[output]))
+    for endpoint in sorted(reference['endpoints']):
+        rows.append(_compare('endpoint_' + endpoint, [reference['endpoints'][endpoint]],
+                             [candidate['endpoints'][endpoint]]))
+
+    return pd.DataFrame(rows, columns=['output', 'windows', 'max_relative_error', 'relative_error_p99',
+                                       'window_mismatch_fraction', 'within_budget'])
+
+def compare_filter_forms(raw_accelerometer_data_df, fs, channels=['x', 'y', 'z']):
+    '''
+    Difference between the second-order section form (single precision mode) and the (b, a) form (double precision
+    mode) of every pipeline filter, both run in double precision with the same padding.
+
+    :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts','x','y','z']
+    :param fs: Sampling rate of raw accelerometer data (float)
+    :param channels: Sensor channels to filter
+    :return: Pandas DataFrame with one row per filter (relative RMS difference and max absolute difference over the
+    channels)
+    '''
+    data = raw_accelerometer_data_df[channels].values.astype(np.float64)
+    rows = []
+    for btype, cutoff, order, padlen in PIPELINE_FILTERS:
+        [b, a] = preprocess.design_butter_ba(fs, cutoff, order, btype=btype)
+        sos = preprocess.design_butter_sos(fs, cutoff, order, btype=btype)
+        reference = signal.filtfilt(b, a, data, padlen=padlen, axis=0)
+        candidate = signal.sosfiltfilt(sos, data, padlen=padlen, axis=0)
+        rows.append({'filter': '%s_%s_order_%d' % (btype, cutoff, order),
+                     'relative_rms_difference': np.sqrt(np.mean((candidate - reference) ** 2) /
+                                                        np.mean(reference ** 2)),
+                     'max_absolute_difference': np.max(np.abs(candidate - reference))})
+    return pd.DataFrame(rows, columns=['filter', 'relative_rms_difference', 'max_absolute_difference'])
+
+if __name__ == "__main__":
+    '''
+    Main runner of both reports on 10 minutes of synthetic wrist accelerometer data.
+    '''
+    sampling_rate = 100.0
+    raw_data_df, _ = synthetic_data.generate_wrist_accelerometer_data(600.0, sampling_rate, random_state=0)
+    print(compare_filter_forms(raw_data_df, sampling_rate).to_string())
+    print(compare_float32_with_float64(raw_data_df, sampling_rate).to_string())
@@ -0,0 +1,70 @@
+'''
+This file contains code to check the sliding window path of the gait and tremor feature builders against the
+non-overlapping windows.
+
+With hop == window_length the sliding windows are the non-overlapping windows (without a trailing partial window),
+so build_*_feature_set(hop=3.0) must give the selected features of build_*_feature_set() on every common window. The
+features are computed by different code (stacks of windows in features/sliding_window_features.py, one window at a time
+in features/signal_features.py), so they agree to rounding error. A window whose spectrum or histogram is degenerate
+(Ex: constant signal) can be NaN in one path and dropped by the gait builder.
+
+compare_sliding_with_non_overlapping() reports the differences on a given recording.
+'''
+import numpy as np
+import pandas as pd
+from classifiers import gait_classifier
+from classifiers import resting_tremor_classifier
+from classifiers import constants
+from benchmarks import synthetic_data
+
+# Largest relative error (absolute error where the feature is 0) accepted for a feature
+SLIDING_TOLERANCE = 1e-6
+
+def _compare(output_name, reference_df, candidate_df, feature):
+    windows = reference_df.index.intersection(candidate_df.index)
+    reference = reference_df.loc[windows, feature].values.astype(float)
+    candidate = candidate_df.loc[windows, feature].values.astype(float)
+    scale = np.where(reference == 0, 1.0, np.abs(reference))
+    rel_err = np.abs(candidate - reference) / scale
+    both_nan = np.isnan(reference) & np.isnan(candidate)
+    rel_err = np.where(both_nan, 0.0, rel_err)
+    max_relative_error = np.nanmax(np.where(np.isnan(rel_err), np.inf, rel_err)) if len(windows) else np.nan
+    return {'output': output_name,
+            'windows_non_overlapping': reference_df.shape[0],
+            'windows_sliding': candidate_df.shape[0],
+            'windows_compared': len(windows),
+            'max_relative_error': max_relative_error,
+            'within_tolerance': bool(max_relative_error <= SLIDING_TOLERANCE) if len(windows) else True}
+
+def compare_sliding_with_non_overlapping(raw_accelerometer_data_df, fs, window_length=3.0):
+    '''
+    Build the gait and tremor feature sets with non-overlapping windows and with the sliding window path at
+    hop == window_length and compare every selected feature on the common windows.
+
+    :param raw_accelerometer_data_df: Pandas DataFrame of raw accelerometer data. Columns = ['ts','x','y','z']
+    :param fs: Sampling rate of raw accelerometer data (float). fs * window_length must be a whole number of samples.
+    :param window_length: Length (in seconds) of the classifier windows
+    :return: Pandas DataFrame with one row per feature (window counts, max relative error and whether it is within
+    SLIDING_TOLERANCE)
+    '''
+    rows = []
+    builders = [('gait', gait_classifier.build_gait_classification_feature_set, constants.GAIT_FEATURE_SELECTION),
+                ('tremor', resting_tremor_classifier.build_rest_tremor_classification_feature_set,
+                 constants.TREMOR_FEATURE_SELECTION)]
+    for model_type, build_feature_set, feature_selection in builders:
+        reference_df = build_feature_set(raw_accelerometer_data_df, fs)
+        candidate_df = build_feature_set(raw_accelerometer_data_df, fs, hop=window_length)
+        for feature in feature_selection:
+            rows.append(_compare(model_type + '_' + feature, reference_df, candidate_df, feature))
+
+    return pd.DataFrame(rows, columns=['output', 'windows_non_overlapping', 'windows_sliding', 'windows_compared',
+                                       'max_relative_error', 'within_tolerance'])
+
+if __name__ == "__main__":
+    '''
+    Main runner comparing both paths on 10 minutes of synthetic wrist accelerometer data.
+    '''
+    sampling_rate = 100.0
+    raw_data_df, _ = synthetic_data.generate_wrist_accelerometer_data(600.0, sampling_rate, random_state=0)
+    report_df = compare_sliding_with_non_overlapping(raw_data_df, sampling_rate)
+    print(report_df.to_string())